@@ -52,7 +52,7 @@ def pytest_runtest_setup(item):
     """
     Per-test setup.
     - Add an option to run those tests marked as 'slow'
-    - Clear the django cache between runs
+    - Clear the django cache and the reference data cache between runs
     """
 
     if 'slow' in item.keywords and not item.config.getoption("--runslow"):
@@ -60,7 +60,10 @@ def pytest_runtest_setup(item):
 
     from django.core.cache import cache
 
+    from treeherder.etl.jobs import reference_data_cache
+
     cache.clear()
+    reference_data_cache.clear()
 
 
 @pytest.fixture(scope="session", autouse=True)
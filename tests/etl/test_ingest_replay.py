@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from treeherder.etl.management.commands.ingest import load_replay_data
+from treeherder.etl.taskcluster_pulse.handler import artifactNamesCacheKey
+from treeherder.model.models import Job
+
+
+@pytest.fixture
+def replay(test_base_dir, test_repository, failure_classifications, mock_log_parser):
+    def _replay(**options):
+        call_command(
+            'ingest',
+            'replay',
+            project=test_repository.name,
+            replay_dir=replay_dir(test_base_dir),
+            concurrency=1,
+            **options,
+        )
+
+    return _replay
+
+
+def replay_dir(test_base_dir):
+    return os.path.join(test_base_dir, 'sample_data', 'pulse_consumer')
+
+
+def test_replay_pulse_messages(replay, push_stored):
+    """Recorded messages are stored against the latest push, repeated ones as new tasks"""
+    replay()
+    num_jobs = Job.objects.count()
+    assert num_jobs > 0
+    assert set(Job.objects.values_list('push__revision', flat=True)) == {
+        push_stored[-1]['revision']
+    }
+
+    # every repetition replays the messages as new tasks
+    replay(repeat=2)
+    assert Job.objects.count() == 3 * num_jobs
+
+
+def test_replay_pulse_messages_as_new_tasks(replay, push_stored, test_base_dir):
+    """The recorded tasks are neither stored nor given cached artifact names"""
+    messages, _, _ = load_replay_data(replay_dir(test_base_dir))
+    replay()
+
+    recorded_task_ids = {message["payload"]["status"]["taskId"] for message in messages}
+    assert not Job.objects.filter(taskcluster_metadata__task_id__in=recorded_task_ids).exists()
+    for message in messages:
+        key = artifactNamesCacheKey(
+            message["root_url"],
+            message["payload"]["status"]["taskId"],
+            message["payload"]["runId"],
+        )
+        assert cache.get(key) is None
+
+
+def test_replay_pulse_messages_without_push(replay):
+    with pytest.raises(CommandError):
+        replay()
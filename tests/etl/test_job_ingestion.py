@@ -1,12 +1,31 @@
 import copy
+import re
 
 import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
 
 from tests import test_utils
 from tests.sample_data_generator import job_data
+from treeherder.etl import jobs
 from treeherder.etl.jobs import _remove_existing_jobs, store_job_data
 from treeherder.etl.push import store_push_data
-from treeherder.model.models import Job, JobLog
+from treeherder.model.models import (
+    BuildPlatform,
+    FailureClassification,
+    Job,
+    JobGroup,
+    JobLog,
+    JobType,
+    Machine,
+    MachinePlatform,
+    OptionCollection,
+    Product,
+    ReferenceDataSignatures,
+)
+from treeherder.services import queue_depth
 
 
 def test_ingest_single_sample_job(
@@ -254,6 +273,47 @@ def test_remove_existing_jobs_one_existing_one_new(
     assert Job.objects.count() == 1
 
 
+def test_remove_existing_jobs_cached_state(
+    test_repository,
+    failure_classifications,
+    sample_data,
+    sample_push,
+    mock_log_parser,
+    django_assert_num_queries,
+):
+    """Jobs are discarded using their cached state, then using the db when it's not cached"""
+    job_data = sample_data.job_data[:1]
+    test_utils.do_job_ingestion(test_repository, job_data, sample_push)
+
+    with django_assert_num_queries(0):
+        assert _remove_existing_jobs(job_data) == []
+
+    cache.clear()
+    with django_assert_num_queries(1):
+        assert _remove_existing_jobs(job_data) == []
+
+
+def test_remove_existing_jobs_retry_frees_root_guid(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser
+):
+    """The cached state of a job is dropped once a retry has taken over its guid"""
+    store_push_data(test_repository, sample_push)
+    running = copy.deepcopy(sample_data.job_data[0])
+    running['revision'] = sample_push[0]['revision']
+    running['job']['state'] = 'running'
+    store_job_data(test_repository, [running])
+
+    retry = copy.deepcopy(running)
+    retry['job'].update(
+        {'state': 'completed', 'result': 'retry', 'job_guid': running['job']['job_guid'] + '_12345'}
+    )
+    store_job_data(test_repository, [retry])
+
+    pending = copy.deepcopy(running)
+    pending['job']['state'] = 'pending'
+    assert _remove_existing_jobs([pending]) == [pending]
+
+
 def test_ingest_job_default_tier(
     test_repository, sample_data, sample_push, failure_classifications, mock_log_parser
 ):
@@ -265,6 +325,105 @@ def test_ingest_job_default_tier(
     assert job.tier == 1
 
 
+def test_ingest_tier_3_logs_shed(
+    test_repository, failure_classifications, sample_data, sample_push, settings, monkeypatch
+):
+    """The logs of tier 3 jobs are skipped while the log parsers are behind"""
+    from celery import task
+
+    from treeherder.log_parser import tasks
+
+    parsed = []
+
+    @task
+    def parse_logs(job_id, job_log_ids, priority):
+        parsed.append(job_id)
+
+    monkeypatch.setattr(tasks, 'parse_logs', parse_logs)
+    monkeypatch.setattr(queue_depth, 'get_queue_depths', lambda: {'log_parser': 6000})
+    settings.LOG_PARSER_SHED_QUEUE_DEPTH = 5000
+
+    job_data = sample_data.job_data[:2]
+    job_data[0]['job']['tier'] = 3
+    test_utils.do_job_ingestion(test_repository, job_data, sample_push, verify_data=False)
+
+    tier_3_job = Job.objects.get(tier=3)
+    assert parsed == [Job.objects.get(tier=1).id]
+    assert JobLog.objects.get(job=tier_3_job).status == JobLog.SKIPPED_LOAD
+    assert JobLog.objects.exclude(job=tier_3_job).get().status == JobLog.PENDING
+
+
+def test_ingest_state_change_uses_cached_reference_data(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser
+):
+    """Only the job tables are queried when a job we've already seen changes state"""
+    job_data = sample_data.job_data[:1]
+    job_data[0]['job']['state'] = 'running'
+    test_utils.do_job_ingestion(test_repository, job_data, sample_push)
+
+    job_data[0]['job']['state'] = 'completed'
+    with CaptureQueriesContext(connection) as queries:
+        store_job_data(test_repository, job_data)
+
+    reference_data_tables = [
+        model._meta.db_table
+        for model in (
+            BuildPlatform,
+            FailureClassification,
+            JobGroup,
+            JobType,
+            Machine,
+            MachinePlatform,
+            OptionCollection,
+            Product,
+            ReferenceDataSignatures,
+        )
+    ]
+    table_re = re.compile(r'(?:FROM|INTO|UPDATE) [`"]?(\w+)[`"]?')
+    queried_tables = {table for query in queries for table in table_re.findall(query['sql'])}
+    assert Job.objects.get().state == 'completed'
+    assert not queried_tables.intersection(reference_data_tables)
+
+
+def test_ingest_batch_query_count(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser
+):
+    """The number of queries needed to store a batch of jobs doesn't depend on its size"""
+    store_push_data(test_repository, sample_push)
+    job_data = copy.deepcopy(sample_data.job_data[:10])
+    for datum in job_data:
+        datum['revision'] = sample_push[0]['revision']
+        datum['job']['state'] = 'running'
+        datum.pop('superseded', None)
+    store_job_data(test_repository, job_data)
+
+    query_counts = []
+    for batch in (job_data[:2], job_data[2:]):
+        for datum in batch:
+            datum['job']['state'] = 'completed'
+        with CaptureQueriesContext(connection) as queries:
+            store_job_data(test_repository, batch)
+        query_counts.append(len(queries))
+
+    assert query_counts[0] == query_counts[1]
+    assert Job.objects.filter(state='completed').count() == 10
+
+
+def test_ingest_batch_out_of_order_states(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser
+):
+    """A job doesn't go back from completed to pending within a single batch either"""
+    store_push_data(test_repository, sample_push)
+    completed = copy.deepcopy(sample_data.job_data[0])
+    completed['revision'] = sample_push[0]['revision']
+    pending = copy.deepcopy(completed)
+    pending['job']['state'] = 'pending'
+
+    store_job_data(test_repository, [completed, pending])
+
+    assert Job.objects.get().state == 'completed'
+
+
 def test_ingesting_skip_existing(
     test_repository, failure_classifications, sample_data, sample_push, mock_log_parser
 ):
@@ -307,3 +466,53 @@ def test_ingest_job_with_updated_job_group(
 
     assert second_job.job_group.name == second_job_datum["job"]["group_name"]
     assert first_job.job_group.name == first_job_datum["job"]["group_name"]
+
+
+def test_ingest_retried_after_integrity_error(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser, monkeypatch
+):
+    """A batch failing to store is rolled back as a whole before being stored again"""
+    store_push_data(test_repository, sample_push)
+    job_data = copy.deepcopy(sample_data.job_data[:3])
+    for datum in job_data:
+        datum['revision'] = sample_push[0]['revision']
+        datum.pop('superseded', None)
+
+    store_jobs = jobs._store_jobs
+    attempts = []
+
+    def flaky_store_jobs(job_fields):
+        attempts.append(len(job_fields))
+        stored_jobs = store_jobs(job_fields)
+        if len(attempts) == 1:
+            # as if another worker had stored one of the jobs meanwhile
+            raise IntegrityError()
+        return stored_jobs
+
+    monkeypatch.setattr(jobs, '_store_jobs', flaky_store_jobs)
+    store_job_data(test_repository, job_data)
+
+    assert attempts == [3, 3]
+    assert Job.objects.count() == 3
+    assert JobLog.objects.count() == sum(len(datum['job']['log_references']) for datum in job_data)
+
+
+def test_ingest_batch_with_bad_job(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser, monkeypatch
+):
+    """A job failing to store doesn't stop the rest of its batch from being stored"""
+    monkeypatch.setenv('DYNO', 'web.1')
+    store_push_data(test_repository, sample_push)
+    job_data = copy.deepcopy(sample_data.job_data[:3])
+    for datum in job_data:
+        datum['revision'] = sample_push[0]['revision']
+        datum.pop('superseded', None)
+    # only fails once the job itself is stored
+    job_data[1]['job']['log_references'] = ['not a log reference']
+
+    store_job_data(test_repository, job_data)
+
+    assert set(Job.objects.values_list('guid', flat=True)) == {
+        job_data[0]['job']['job_guid'],
+        job_data[2]['job']['job_guid'],
+    }
@@ -1,7 +1,7 @@
 import jsonschema
 import pytest
 
-from treeherder.etl.schema import get_json_schema
+from treeherder.etl.schema import get_json_schema, get_json_schema_validator, validate
 
 # The test data in this file are a representative sample-set from
 # production Treeherder
@@ -29,3 +29,20 @@ def test_job_symbols(sample_data, job_symbol):
     job["origin"]["revision"] = "1234567890123456789012345678901234567890"
     job["display"]["jobSymbol"] = job_symbol
     jsonschema.validate(job, get_json_schema("pulse-job.yml"))
+
+
+def test_validator_cached():
+    assert get_json_schema_validator("pulse-job.yml") is get_json_schema_validator("pulse-job.yml")
+
+
+def test_validate_errors(sample_data):
+    """The cached validators raise the same errors as jsonschema itself"""
+    job = sample_data.pulse_jobs[0]
+    job["display"]["jobSymbol"] = ""
+
+    with pytest.raises(jsonschema.ValidationError) as expected:
+        jsonschema.validate(job, get_json_schema("pulse-job.yml"))
+    with pytest.raises(jsonschema.ValidationError) as e:
+        validate(job, "pulse-job.yml")
+
+    assert e.value.message == expected.value.message
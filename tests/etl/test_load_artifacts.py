@@ -1,6 +1,8 @@
 import json
 
-from treeherder.etl.artifact import store_job_artifacts
+from django.core.cache import cache
+
+from treeherder.etl.artifact import store_job_artifacts, store_text_log_summary_artifact
 from treeherder.model.models import TextLogError
 
 
@@ -55,3 +57,22 @@ def test_load_non_ascii_textlog_errors(test_job):
     assert TextLogError.objects.count() == 2
     assert TextLogError.objects.get(line_number=1587).line == '07:51:28  WARNING - \U000000c3'
     assert TextLogError.objects.get(line_number=1588).line == '07:51:29  WARNING - <U+01D400>'
+
+
+def test_load_textlog_summary_bulk(test_job, django_assert_max_num_queries):
+    errors = [{"line": 'WARNING - foobar', "linenumber": i} for i in range(1, 51)]
+    text_log_summary_artifact = {
+        'type': 'json',
+        'name': 'text_log_summary',
+        'blob': json.dumps({'errors': errors}),
+        'job_guid': test_job.guid,
+    }
+
+    # the number of queries shouldn't depend on the number of error lines
+    with django_assert_max_num_queries(5):
+        store_text_log_summary_artifact(test_job, text_log_summary_artifact)
+
+    assert TextLogError.objects.filter(job=test_job).count() == 50
+    # the bug suggestions cache is warmed from the stored errors
+    error_summary = cache.get('error-summary-{}'.format(test_job.id))
+    assert [line['line_number'] for line in error_summary] == list(range(1, 51))
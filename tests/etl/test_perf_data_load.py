@@ -12,6 +12,7 @@ from django.db import IntegrityError
 
 from tests.etl.test_perf_data_adapters import _verify_signature
 from tests.test_utils import create_generic_job
+from treeherder.etl import perf
 from treeherder.etl.perf import store_performance_artifact
 from treeherder.model.models import Push
 from treeherder.perf.models import (
@@ -236,6 +237,80 @@ def test_default_ingest_workflow(
             _verify_datum(suite['name'], subtest['name'], subtest['value'], perf_push.time)
 
 
+@pytest.mark.parametrize(('validated', 'validations'), [(False, 1), (True, 0)])
+def test_validated_perf_data_not_validated_again(
+    test_repository, perf_job, sample_perf_artifact, monkeypatch, validated, validations
+):
+    calls = []
+    monkeypatch.setattr(perf, 'validate_perf_data', calls.append)
+    _, submit_datum = _prepare_test_data(sample_perf_artifact)
+
+    store_performance_artifact(perf_job, submit_datum, validated=validated)
+
+    assert len(calls) == validations
+    assert DATA_PER_ARTIFACT == PerformanceSignature.objects.all().count()
+
+
+@pytest.mark.parametrize('subtests', [1, 40])
+def test_ingest_workflow_query_count(
+    test_repository,
+    perf_job,
+    sample_perf_artifact,
+    monkeypatch,
+    django_assert_max_num_queries,
+    subtests,
+):
+    """The signatures & datums of a perf artifact are stored in bulk, however many there are"""
+    alerted = []
+    monkeypatch.setattr(perf, 'schedule_alerts', alerted.extend)
+    suite = sample_perf_artifact['blob']['suites'][0]
+    suite['subtests'] = [
+        {'name': 'subtest %s' % i, 'value': float(i), 'unit': MEASUREMENT_UNIT}
+        for i in range(subtests)
+    ]
+    sample_perf_artifact['blob']['suites'] = [suite]
+    _, submit_datum = _prepare_test_data(sample_perf_artifact)
+
+    with django_assert_max_num_queries(14):
+        store_performance_artifact(perf_job, submit_datum)
+
+    assert PerformanceSignature.objects.count() == subtests + 1
+    assert PerformanceDatum.objects.count() == subtests + 1
+    summary_signature = PerformanceSignature.objects.get(test='')
+    assert alerted == [summary_signature.id]
+    assert summary_signature.subtests.count() == subtests
+
+    # storing the same data again only looks it up
+    with django_assert_max_num_queries(5):
+        store_performance_artifact(perf_job, submit_datum)
+
+    assert PerformanceSignature.objects.count() == subtests + 1
+    assert PerformanceDatum.objects.count() == subtests + 1
+    assert len(alerted) == 1
+
+
+@pytest.mark.parametrize('model', [PerformanceSignature, PerformanceDatum])
+def test_ingest_concurrently_stored_data(
+    test_repository, perf_job, sample_perf_artifact, monkeypatch, model
+):
+    """Signatures & datums which another worker stores meanwhile aren't stored twice"""
+    bulk_create = model.objects.bulk_create
+
+    def concurrent_bulk_create(objs, **kwargs):
+        objs = list(objs)
+        # as if another worker stored them after they were looked up
+        bulk_create([copy.copy(obj) for obj in objs])
+        return bulk_create(objs, **kwargs)
+
+    monkeypatch.setattr(model.objects, 'bulk_create', concurrent_bulk_create)
+    _, submit_datum = _prepare_test_data(sample_perf_artifact)
+
+    store_performance_artifact(perf_job, submit_datum)
+
+    assert PerformanceSignature.objects.count() == DATA_PER_ARTIFACT
+    assert PerformanceDatum.objects.count() == DATA_PER_ARTIFACT
+
+
 def test_hash_remains_unchanged_for_default_ingestion_workflow(
     test_repository, perf_job, sample_perf_artifact
 ):
@@ -4,7 +4,11 @@ import os
 
 import pytest
 import responses
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from treeherder.etl import push as push_module
+from treeherder.etl.push import store_push, store_pushes
 from treeherder.etl.push_loader import (
     GithubPullRequestTransformer,
     GithubPushTransformer,
@@ -12,7 +16,7 @@ from treeherder.etl.push_loader import (
     PulsePushError,
     PushLoader,
 )
-from treeherder.model.models import Push
+from treeherder.model.models import Commit, Push
 
 
 @pytest.fixture
@@ -221,3 +225,59 @@ def test_ingest_github_push_comma_separated_branches(
         "https://firefox-ci-tc.services.mozilla.com",
     )
     assert Push.objects.count() == expected_pushes
+
+
+@pytest.mark.parametrize("num_commits", [1, 200])
+def test_store_push_bulk_commits(test_repository, django_assert_max_num_queries, num_commits):
+    """The commits of a push are stored with the same number of queries, however many there are"""
+    push = {
+        "revision": "{:040x}".format(num_commits - 1),
+        "author": "foo@bar.com",
+        "push_timestamp": 1384353511,
+        "revisions": [
+            {"revision": "{:040x}".format(i), "author": "Foo <foo@bar.com>", "comment": str(i)}
+            for i in range(num_commits)
+        ],
+    }
+    with django_assert_max_num_queries(9):
+        store_push(test_repository, push)
+
+    # storing it again updates the commits which changed
+    push["revisions"][0]["comment"] = "Backed out"
+    with django_assert_max_num_queries(9):
+        store_push(test_repository, push)
+
+    assert Commit.objects.count() == num_commits
+    assert Commit.objects.get(revision="{:040x}".format(0)).comments == "Backed out"
+
+
+def test_store_pushes_in_batches(test_repository, monkeypatch):
+    """New pushes and their commits are inserted a limited number of rows at a time"""
+    monkeypatch.setattr(push_module, "BULK_BATCH_SIZE", 10)
+    pushes = [
+        {
+            "revision": "{:040x}".format(i * 100 + 99),
+            "author": "foo@bar.com",
+            "push_timestamp": 1384353511 + i,
+            "revisions": [
+                {
+                    "revision": "{:040x}".format(i * 100 + j),
+                    "author": "Foo <foo@bar.com>",
+                    "comment": str(j),
+                }
+                for j in range(20)
+            ],
+        }
+        for i in range(15)
+    ]
+    with CaptureQueriesContext(connection) as queries:
+        store_pushes(test_repository, pushes)
+
+    def count_inserts(model):
+        prefix = "INSERT INTO {}".format(connection.ops.quote_name(model._meta.db_table))
+        return len([query for query in queries if query["sql"].startswith(prefix)])
+
+    assert count_inserts(Push) == 2
+    assert count_inserts(Commit) == 30
+    assert Push.objects.count() == 15
+    assert Commit.objects.count() == 300
@@ -1,10 +1,15 @@
+import asyncio
 import json
 import os
 
+import pytest
 import responses
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from django.core.cache import cache
 
-from treeherder.etl.pushlog import HgPushlogProcess
+from treeherder.etl.exceptions import CollectionNotStoredException
+from treeherder.etl.pushlog import HgPushlogPoller, HgPushlogProcess
 from treeherder.model.models import Commit, Push
 
 
@@ -133,3 +138,76 @@ def test_empty_json_pushes(test_repository, test_base_dir, activate_responses):
     process.run(pushlog_fake_url, test_repository.name)
 
     assert Push.objects.count() == 0
+
+
+@pytest.fixture
+def pushlog_server(test_base_dir):
+    """
+    Serve the sample pushlog as the json-pushes of any repository, recording
+    the requests made and answering the conditional ones with a 304
+    """
+    with open(os.path.join(test_base_dir, 'sample_data', 'hg_pushlog.json')) as f:
+        pushlog_json = json.load(f)
+    requests_made = []
+
+    async def json_pushes(request):
+        requests_made.append(request)
+        if request.match_info['repo'] == 'broken':
+            return web.Response(status=500)
+        etag = '"{}"'.format(request.query.get('startID'))
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        if 'startID' in request.query:
+            body = {"lastpushid": pushlog_json['lastpushid'], "pushes": {}}
+        else:
+            body = pushlog_json
+        return web.json_response(body, headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/{repo}/json-pushes/', json_pushes)
+    server = TestServer(app)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start_server())
+    server.requests_made = requests_made
+    yield server
+    loop.run_until_complete(server.close())
+
+
+def test_poll_hg_pushlogs(test_repository, test_repository_2, pushlog_server):
+    """pushes of every repository are stored, and only fetched again once changed"""
+    repositories = [test_repository, test_repository_2]
+    for repository in repositories:
+        repository.url = str(pushlog_server.make_url('/' + repository.name))
+        repository.save()
+
+    HgPushlogPoller().run(repositories)
+
+    # should be 10 pushes, 15 revisions for each repository
+    assert Push.objects.filter(repository=test_repository).count() == 10
+    assert Push.objects.filter(repository=test_repository_2).count() == 10
+    assert Commit.objects.count() == 30
+    for repository in repositories:
+        assert cache.get("{}:last_push_id".format(repository.name)) == 33277
+
+    # the first poll for new pushes records the response, which is then
+    # only fetched again if it changed
+    HgPushlogPoller().run(repositories)
+    HgPushlogPoller().run(repositories)
+
+    assert Push.objects.count() == 20
+    conditional_requests = [
+        request for request in pushlog_server.requests_made if 'If-None-Match' in request.headers
+    ]
+    assert len(pushlog_server.requests_made) == 6
+    assert len(conditional_requests) == 2
+
+
+def test_poll_hg_pushlogs_error(test_repository, test_repository_2, pushlog_server):
+    """a repository that can't be fetched doesn't stop the others from being stored"""
+    test_repository.url = str(pushlog_server.make_url('/broken'))
+    test_repository_2.url = str(pushlog_server.make_url('/' + test_repository_2.name))
+
+    with pytest.raises(CollectionNotStoredException):
+        HgPushlogPoller().run([test_repository, test_repository_2])
+
+    assert Push.objects.filter(repository=test_repository_2).count() == 10
@@ -0,0 +1,169 @@
+import asyncio
+import copy
+
+import pytest
+
+from treeherder.etl.taskcluster_pulse import handler
+
+
+@pytest.fixture
+def fetched_tasks(sample_data, monkeypatch):
+    """Serve task definitions from the sample data, recording which were fetched"""
+    tasks = sample_data.taskcluster_tasks
+    fetched = []
+
+    class MockQueue:
+        def __init__(self, options, session=None):
+            pass
+
+        async def task(self, taskId):
+            fetched.append(taskId)
+            return copy.deepcopy(tasks[taskId])
+
+    monkeypatch.setattr(handler.taskcluster.aio, "Queue", MockQueue)
+    return fetched
+
+
+@pytest.mark.asyncio
+async def test_task_definition_cached(sample_data, fetched_tasks):
+    taskId, task = next(iter(sample_data.taskcluster_tasks.items()))
+    root_url = "https://firefox-ci-tc.services.mozilla.com"
+
+    first = await handler.fetchTaskDefinition(
+        root_url, taskId, "exchange/taskcluster-queue/v1/task-pending"
+    )
+    second = await handler.fetchTaskDefinition(
+        root_url, taskId, "exchange/taskcluster-queue/v1/task-running"
+    )
+
+    assert first == second == handler.slimTaskDefinition(task)
+    assert fetched_tasks == [taskId]
+
+
+@pytest.mark.asyncio
+async def test_task_definition_cache_skip_exchanges(sample_data, fetched_tasks, monkeypatch):
+    exchange = "exchange/taskcluster-queue/v1/task-completed"
+    monkeypatch.setattr(handler, "taskDefinitionCacheSkipExchanges", [exchange])
+    taskId, task = next(iter(sample_data.taskcluster_tasks.items()))
+    root_url = "https://firefox-ci-tc.services.mozilla.com"
+
+    for _ in range(2):
+        assert await handler.fetchTaskDefinition(root_url, taskId, exchange) == task
+
+    assert fetched_tasks == [taskId, taskId]
+
+
+@pytest.fixture
+def broken_cache(monkeypatch):
+    """Fail every cache access, as when Redis is unavailable"""
+
+    def fail(*args, **kwargs):
+        raise ConnectionError()
+
+    monkeypatch.setattr(handler.cache, "get", fail)
+    monkeypatch.setattr(handler.cache, "set", fail)
+
+
+@pytest.mark.asyncio
+async def test_task_definition_cache_unavailable(sample_data, fetched_tasks, broken_cache):
+    taskId, task = next(iter(sample_data.taskcluster_tasks.items()))
+    root_url = "https://firefox-ci-tc.services.mozilla.com"
+
+    assert await handler.fetchTaskDefinition(
+        root_url, taskId, "exchange/taskcluster-queue/v1/task-pending"
+    ) == handler.slimTaskDefinition(task)
+    assert fetched_tasks == [taskId]
+
+
+@pytest.mark.asyncio
+async def test_slim_task_definition_is_sufficient(sample_data, monkeypatch):
+    """The cached parts of a task definition are all that's needed to handle its messages"""
+
+    async def mock_fetch_artifacts(root_url, taskId, runId):
+        return []
+
+    monkeypatch.setattr(handler, "fetchArtifacts", mock_fetch_artifacts)
+    for taskId, message in sample_data.taskcluster_pulse_messages.items():
+        task = sample_data.taskcluster_tasks[taskId]
+        assert await handler.handleMessage(
+            message, handler.slimTaskDefinition(task)
+        ) == await handler.handleMessage(message, task)
+
+
+@pytest.fixture
+def listed_artifacts(monkeypatch):
+    """Serve two pages of artifacts, recording the continuation tokens requested"""
+    pages = {
+        None: {
+            "artifacts": [{"name": "public/logs/live_backing.log"}],
+            "continuationToken": "page-2",
+        },
+        "page-2": {"artifacts": [{"name": "public/test_info/wpt_errorsummary.log"}]},
+    }
+    requested = []
+
+    class MockQueue:
+        def __init__(self, options, session=None):
+            pass
+
+        async def listArtifacts(self, taskId, runId, query=None):
+            token = (query or {}).get("continuationToken")
+            requested.append(token)
+            return copy.deepcopy(pages[token])
+
+    monkeypatch.setattr(handler.taskcluster.aio, "Queue", MockQueue)
+    return requested
+
+
+@pytest.mark.asyncio
+async def test_fetch_artifacts_continuation(listed_artifacts):
+    artifacts = await handler.fetchArtifacts("https://tc.example.com", "taskId", 0)
+
+    assert [a["name"] for a in artifacts] == [
+        "public/logs/live_backing.log",
+        "public/test_info/wpt_errorsummary.log",
+    ]
+    assert listed_artifacts == [None, "page-2"]
+
+
+@pytest.mark.asyncio
+async def test_artifact_names_cached(listed_artifacts):
+    for _ in range(2):
+        names = await handler.fetchArtifactNames("https://tc.example.com", "taskId", 0)
+        assert len(names) == 2
+
+    assert listed_artifacts == [None, "page-2"]
+
+
+@pytest.mark.asyncio
+async def test_artifact_names_cache_unavailable(listed_artifacts, broken_cache):
+    names = await handler.fetchArtifactNames("https://tc.example.com", "taskId", 0)
+
+    assert len(names) == 2
+    assert listed_artifacts == [None, "page-2"]
+
+
+@pytest.mark.asyncio
+async def test_artifact_uploaded_links(listed_artifacts):
+    job = {"jobInfo": {"links": []}}
+
+    job = await handler.addArtifactUploadedLinks("https://tc.example.com", "taskId", 0, job)
+
+    assert [link["linkText"] for link in job["jobInfo"]["links"]] == [
+        "live_backing.log",
+        "wpt_errorsummary.log",
+    ]
+
+
+def test_artifacts_semaphore_per_event_loop():
+    async def getSemaphore():
+        return handler.getArtifactsSemaphore()
+
+    loops = [asyncio.new_event_loop() for _ in range(2)]
+    try:
+        semaphores = [loop.run_until_complete(getSemaphore()) for loop in loops]
+        assert semaphores[0] is not semaphores[1]
+        assert loops[0].run_until_complete(getSemaphore()) is semaphores[0]
+    finally:
+        for loop in loops:
+            loop.close()
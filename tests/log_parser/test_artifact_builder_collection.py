@@ -1,9 +1,11 @@
+import billiard
 import pytest
 import responses
 
 from tests.test_utils import add_log_response
+from treeherder.log_parser import artifactbuildercollection
 from treeherder.log_parser.artifactbuildercollection import (
-    MAX_DOWNLOAD_SIZE_IN_BYTES,
+    MAX_CHUNKED_DOWNLOAD_SIZE_IN_BYTES,
     ArtifactBuilderCollection,
     LogSizeException,
 )
@@ -64,10 +66,88 @@ def test_log_download_size_limit():
         body='',
         adding_headers={
             'Content-Encoding': 'gzip',
-            'Content-Length': str(MAX_DOWNLOAD_SIZE_IN_BYTES + 1),
+            'Content-Length': str(MAX_CHUNKED_DOWNLOAD_SIZE_IN_BYTES + 1),
         },
     )
     lpc = ArtifactBuilderCollection(url)
 
     with pytest.raises(LogSizeException):
         lpc.parse()
+
+
+def test_parse_lines_only_decodes_candidates():
+    """test that lines skipped at the byte level still count towards line numbers"""
+    lpc = ArtifactBuilderCollection("foo-url")
+    lpc.parse_lines(
+        [
+            b"10:00:00     INFO - TEST-PASS | foo | bar",
+            b"",
+            b"\xff\xfe not valid utf-8",
+            b"10:00:01     INFO - 1 INFO TEST-UNEXPECTED-FAIL | foo | \xe2\x9c\x97",
+        ]
+    )
+    for builder in lpc.builders:
+        builder.finish_parse()
+
+    log_viewer, performance_data = lpc.builders
+    assert log_viewer.get_artifact()["errors"] == [
+        {"linenumber": 3, "line": "10:00:01     INFO - 1 INFO TEST-UNEXPECTED-FAIL | foo | ✗"}
+    ]
+    assert performance_data.lineno == 4
+
+
+@responses.activate
+@pytest.mark.parametrize('processes', [1, 2])
+def test_large_log_parsed_in_chunks(monkeypatch, settings, processes):
+    """test that parsing a log in chunks gives the same artifacts as streaming it"""
+    url = add_log_response("large-number-of-error-lines.txt.gz")
+    lpc = ArtifactBuilderCollection(url)
+    lpc.parse()
+
+    # Force the chunked mode, with many small chunks.
+    monkeypatch.setattr(artifactbuildercollection, 'MAX_DOWNLOAD_SIZE_IN_BYTES', 0)
+    monkeypatch.setattr(artifactbuildercollection, 'CHUNK_SIZE_IN_BYTES', 10000)
+    settings.LOG_PARSER_CHUNK_PROCESSES = processes
+    chunked_lpc = ArtifactBuilderCollection(url)
+    chunked_lpc.parse()
+
+    assert len(lpc.artifacts["text_log_summary"]["errors"]) == settings.MAX_ERROR_LINES
+    assert chunked_lpc.artifacts == lpc.artifacts
+
+
+def _parse_artifacts(url, artifacts):
+    lpc = ArtifactBuilderCollection(url)
+    lpc.parse()
+    artifacts.put(lpc.artifacts)
+
+
+@responses.activate
+def test_large_log_parsed_in_chunks_in_daemonic_process(monkeypatch, settings):
+    """test that logs are parsed in chunks in parallel from Celery's (daemonic) worker processes"""
+    url = add_log_response("large-number-of-error-lines.txt.gz")
+    lpc = ArtifactBuilderCollection(url)
+    lpc.parse()
+
+    monkeypatch.setattr(artifactbuildercollection, 'MAX_DOWNLOAD_SIZE_IN_BYTES', 0)
+    monkeypatch.setattr(artifactbuildercollection, 'CHUNK_SIZE_IN_BYTES', 10000)
+    settings.LOG_PARSER_CHUNK_PROCESSES = 2
+    artifacts = billiard.Queue()
+    worker = billiard.Process(target=_parse_artifacts, args=(url, artifacts), daemon=True)
+    worker.start()
+    chunked_artifacts = artifacts.get(timeout=60)
+    worker.join()
+
+    assert worker.exitcode == 0
+    assert chunked_artifacts == lpc.artifacts
+
+
+@responses.activate
+def test_large_log_decompressed_size_limit(monkeypatch):
+    """test that logs parsed in chunks are only decompressed up to a size limit"""
+    url = add_log_response("large-number-of-error-lines.txt.gz")
+    monkeypatch.setattr(artifactbuildercollection, 'MAX_DOWNLOAD_SIZE_IN_BYTES', 0)
+    monkeypatch.setattr(artifactbuildercollection, 'MAX_CHUNKED_LOG_SIZE_IN_BYTES', 10000)
+    lpc = ArtifactBuilderCollection(url)
+
+    with pytest.raises(LogSizeException):
+        lpc.parse()
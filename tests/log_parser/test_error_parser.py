@@ -108,6 +108,16 @@ def test_error_lines_matched(line):
     assert len(parser.artifact) == 1
 
 
+@pytest.mark.parametrize("line", ERROR_TEST_CASES)
+def test_error_lines_are_candidates(line):
+    # The combined prefilter must never reject a line the full checks accept.
+    assert (
+        ErrorParser.RE_ERR_1_MATCH.match(line)
+        or ErrorParser.RE_ERR_CANDIDATE_MATCH.match(line)
+        or ErrorParser.RE_ERR_CANDIDATE_SEARCH.search(line)
+    )
+
+
 @pytest.mark.parametrize("line", ERROR_TEST_CASES)
 def test_error_lines_taskcluster(line):
     parser = ErrorParser()
@@ -30,3 +30,10 @@ def test_performance_log_parsing_malformed_perfherder_data():
     parser.parse_line('PERFHERDER_DATA: {}'.format(json.dumps(valid_perfherder_data)), 3)
 
     assert parser.get_artifact() == [valid_perfherder_data]
+
+
+def test_performance_parser_candidate_lines():
+    parser = PerformanceParser()
+
+    assert parser.is_candidate(b'10:00:00 INFO - PERFHERDER_DATA: {"framework": {}}')
+    assert not parser.is_candidate(b'10:00:00 INFO - TEST-PASS | foo | bar')
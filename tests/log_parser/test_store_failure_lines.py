@@ -1,4 +1,5 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 import responses
@@ -6,6 +7,7 @@ from django.conf import settings
 from requests.exceptions import HTTPError
 
 from treeherder.log_parser.failureline import (
+    download_log,
     store_failure_lines,
     write_failure_lines,
     get_group_results,
@@ -35,6 +37,24 @@ def test_store_error_summary(activate_responses, test_repository, test_job):
     assert failure.repository == test_repository
 
 
+def test_store_error_summary_downloaded_in_background(
+    activate_responses, test_repository, test_job
+):
+    log_path = SampleData().get_log_path("plain-chunked_errorsummary.log")
+    log_url = 'http://my-log.mozilla.org'
+
+    with open(log_path) as log_handler:
+        responses.add(responses.GET, log_url, body=log_handler.read(), status=200)
+
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json", url=log_url)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        store_failure_lines(log_obj, executor.submit(download_log, log_url))
+
+    assert FailureLine.objects.count() == 1
+    assert FailureLine.objects.get(pk=1).job_guid == test_job.guid
+
+
 def test_store_error_summary_default_group(activate_responses, test_repository, test_job):
     log_path = SampleData().get_log_path("plain-chunked_errorsummary.log")
     log_url = 'http://my-log.mozilla.org'
@@ -74,6 +94,23 @@ def test_store_error_summary_truncated(activate_responses, test_repository, test
     assert failure.repository == test_repository
 
 
+@responses.activate
+def test_download_log_stops_at_cutoff(monkeypatch):
+    log_path = SampleData().get_log_path("plain-chunked_errorsummary_10_lines.log")
+    log_url = 'http://my-log.mozilla.org'
+
+    monkeypatch.setattr(settings, 'FAILURE_LINES_CUTOFF', 5)
+
+    # Anything past the cutoff is never read, so doesn't even need to be valid JSON.
+    with open(log_path) as log_handler:
+        responses.add(responses.GET, log_url, body=log_handler.read() + "not json\n", status=200)
+
+    log_items = download_log(log_url)
+
+    assert len(log_items) == 5 + 1
+    assert all(item["action"] for item in log_items)
+
+
 def test_store_error_summary_astral(activate_responses, test_repository, test_job):
     log_path = SampleData().get_log_path("plain-chunked_errorsummary_astral.log")
     log_url = 'http://my-log.mozilla.org'
@@ -183,6 +220,23 @@ def test_store_error_summary_group_status(activate_responses, test_repository, t
     assert error_groups.first().name == "toolkit/components/pictureinpicture/tests/browser.ini"
 
 
+def test_store_error_summary_existing_groups(activate_responses, test_repository, test_job):
+    log_path = SampleData().get_log_path("mochitest-browser-chrome_errorsummary.log")
+    log_url = 'http://my-log.mozilla.org'
+
+    with open(log_path) as log_handler:
+        responses.add(responses.GET, log_url, body=log_handler.read(), status=200)
+
+    existing_group = Group.objects.create(name="dom/base/test/browser.ini")
+
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json", url=log_url)
+    store_failure_lines(log_obj)
+
+    assert Group.objects.count() == 29
+    assert log_obj.groups.count() == 29
+    assert GroupStatus.objects.get(job_log=log_obj, group=existing_group).status == GroupStatus.OK
+
+
 def test_get_group_results(activate_responses, test_repository, test_job):
     log_path = SampleData().get_log_path("mochitest-browser-chrome_errorsummary.log")
     log_url = 'http://my-log.mozilla.org'
@@ -0,0 +1,107 @@
+import pytest
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from treeherder.perf import tasks
+
+
+@pytest.fixture
+def scheduled_alerts(settings, monkeypatch):
+    """Defer alert generation, recording the signatures it was scheduled for"""
+    settings.PERFHERDER_ALERTS_SCHEDULING_WINDOW = 60
+    scheduled = []
+
+    def mock_apply_async(args, queue):
+        scheduled.append(args[0])
+
+    monkeypatch.setattr(tasks.generate_alerts, 'apply_async', mock_apply_async)
+    redis = get_redis_connection()
+    keys = [tasks.PENDING_ALERTS_KEY, tasks.COALESCED_ALERTS_KEY]
+    redis.delete(*[cache.make_key(key) for key in keys])
+    yield scheduled
+    redis.delete(*[cache.make_key(key) for key in keys])
+
+
+def test_schedule_alerts_immediately(scheduled_alerts, settings):
+    settings.PERFHERDER_ALERTS_SCHEDULING_WINDOW = 0
+
+    tasks.schedule_alerts([1, 2])
+
+    assert scheduled_alerts == [1, 2]
+
+
+def test_schedule_alerts_coalesced(scheduled_alerts, settings, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(tasks.time, 'time', lambda: now)
+    tasks.schedule_alerts([1, 2])
+    tasks.schedule_alerts([2])
+    now += 30
+    tasks.schedule_alerts([1, 3])
+    assert scheduled_alerts == []
+
+    # only the signatures which have waited for the whole window are picked up
+    now += 30
+    tasks.generate_pending_alerts()
+    assert sorted(scheduled_alerts) == [1, 2]
+
+    now += 30
+    tasks.generate_pending_alerts()
+    assert sorted(scheduled_alerts) == [1, 2, 3]
+
+
+def test_generate_pending_alerts_reports_coalesced(scheduled_alerts, monkeypatch):
+    metrics = {}
+    monkeypatch.setattr(
+        tasks.newrelic.agent,
+        'record_custom_metric',
+        lambda name, value: metrics.__setitem__(name, value),
+    )
+    monkeypatch.setattr(tasks.time, 'time', lambda: 1000.0)
+    for _ in range(3):
+        tasks.schedule_alerts([1, 2])
+
+    tasks.generate_pending_alerts()
+    assert metrics['Custom/Perfherder/CoalescedAlertGenerations'] == 4
+    tasks.generate_pending_alerts()
+    assert metrics['Custom/Perfherder/CoalescedAlertGenerations'] == 0
+
+
+def test_generate_pending_alerts_backlog_in_batches(scheduled_alerts, monkeypatch):
+    batches = []
+
+    def mock_apply_async(args, queue):
+        batches.append(args[0])
+
+    monkeypatch.setattr(tasks.generate_alerts_in_batch, 'apply_async', mock_apply_async)
+    now = 1000.0
+    monkeypatch.setattr(tasks.time, 'time', lambda: now)
+    tasks.schedule_alerts(list(range(1, 251)))
+
+    now += 60
+    tasks.generate_pending_alerts()
+    assert scheduled_alerts == []
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert sorted(sum(batches, [])) == list(range(1, 251))
+
+
+def test_generate_pending_alerts_enqueue_failure(scheduled_alerts, monkeypatch):
+    """Signatures which couldn't be enqueued are generated on the next run"""
+    now = 1000.0
+    monkeypatch.setattr(tasks.time, 'time', lambda: now)
+    tasks.schedule_alerts([1, 2, 3])
+    mock_apply_async = tasks.generate_alerts.apply_async
+
+    def failing_apply_async(args, queue):
+        if len(scheduled_alerts) == 1:
+            raise ConnectionError()
+        mock_apply_async(args, queue)
+
+    monkeypatch.setattr(tasks.generate_alerts, 'apply_async', failing_apply_async)
+    now += 60
+    with pytest.raises(ConnectionError):
+        tasks.generate_pending_alerts()
+    assert scheduled_alerts == [1]
+
+    monkeypatch.setattr(tasks.generate_alerts, 'apply_async', mock_apply_async)
+    tasks.generate_pending_alerts()
+    assert scheduled_alerts == [1, 2, 3]
@@ -2,9 +2,14 @@ import datetime
 import time
 
 import pytest
+from django.core.cache import cache
 
 from treeherder.model.models import Push
-from treeherder.perf.alerts import generate_new_alerts_in_series
+from treeherder.perf import alerts
+from treeherder.perf.alerts import (
+    generate_new_alerts_in_series,
+    generate_new_alerts_in_signatures,
+)
 from treeherder.perf.models import (
     PerformanceAlert,
     PerformanceAlertSummary,
@@ -362,3 +367,207 @@ def test_alert_change_type_absolute(
 
     assert PerformanceAlert.objects.count() == expected_num_alerts
     assert PerformanceAlertSummary.objects.count() == expected_num_alerts
+
+
+@pytest.mark.parametrize('incremental', [True, False])
+def test_detect_alerts_in_growing_series(
+    test_repository,
+    test_issue_tracker,
+    failure_classifications,
+    generic_reference_data,
+    test_perf_signature,
+    monkeypatch,
+    incremental,
+):
+    analyzed = []
+    analyze = alerts.detect_changes
+
+    def detect_changes(data, **kwargs):
+        analyzed_series = analyze(data, **kwargs)
+        analyzed.append((len(analyzed_series), kwargs['start']))
+        return analyzed_series
+
+    monkeypatch.setattr(alerts, 'detect_changes', detect_changes)
+
+    base_time = time.time()  # generate it based off current time
+    for push_id in range(1, 101):
+        value = 0.5 if push_id <= 40 else 1.0 if push_id <= 70 else 2.0
+        _generate_performance_data(
+            test_repository,
+            test_perf_signature,
+            test_issue_tracker,
+            generic_reference_data,
+            base_time,
+            push_id,
+            value,
+            1,
+        )
+        if not incremental:
+            # forget the previous analysis of the series
+            cache.clear()
+        generate_new_alerts_in_series(test_perf_signature)
+    # retrigger a recent push
+    _generate_performance_data(
+        test_repository,
+        test_perf_signature,
+        test_issue_tracker,
+        generic_reference_data,
+        base_time,
+        95,
+        2.0,
+        1,
+    )
+    generate_new_alerts_in_series(test_perf_signature)
+
+    assert [
+        (alert.summary.push_id, alert.prev_value, alert.new_value)
+        for alert in PerformanceAlert.objects.order_by('id')
+    ] == [(41, 0.5, 1.0), (71, 1.0, 2.0)]
+    if incremental:
+        # only the latest revisions are reanalyzed, or the whole series while
+        # it's no longer than that
+        assert max(length for (length, _) in analyzed) <= 24 + 12 + 2
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_detect_alerts_in_signatures(
+    test_repository,
+    test_issue_tracker,
+    failure_classifications,
+    generic_reference_data,
+    test_perf_signature,
+    test_perf_signature_2,
+    processes,
+):
+    base_time = time.time()  # generate it based off current time
+    INTERVAL = 30
+    for (signature, new_value) in [(test_perf_signature, 1.0), (test_perf_signature_2, 0.25)]:
+        _generate_performance_data(
+            test_repository,
+            signature,
+            test_issue_tracker,
+            generic_reference_data,
+            base_time,
+            1,
+            0.5,
+            int(INTERVAL / 2),
+        )
+        _generate_performance_data(
+            test_repository,
+            signature,
+            test_issue_tracker,
+            generic_reference_data,
+            base_time,
+            int(INTERVAL / 2) + 1,
+            new_value,
+            int(INTERVAL / 2),
+        )
+
+    generate_new_alerts_in_signatures(
+        [test_perf_signature, test_perf_signature_2], processes=processes
+    )
+
+    assert PerformanceAlertSummary.objects.count() == 1
+    assert [
+        (alert.series_signature, alert.prev_value, alert.new_value, alert.is_regression)
+        for alert in PerformanceAlert.objects.order_by('series_signature_id')
+    ] == [(test_perf_signature, 0.5, 1.0, True), (test_perf_signature_2, 0.5, 0.25, False)]
+
+    # the series are carried on from where they were analyzed
+    generate_new_alerts_in_series(test_perf_signature)
+    assert PerformanceAlert.objects.count() == 2
+
+
+def test_detect_alerts_in_signatures_resumed(
+    test_repository,
+    test_issue_tracker,
+    failure_classifications,
+    generic_reference_data,
+    test_perf_signature,
+    test_perf_signature_2,
+    monkeypatch,
+):
+    analyzed = []
+    analyze = alerts.detect_changes
+
+    def detect_changes(data, **kwargs):
+        analyzed_series = analyze(data, **kwargs)
+        analyzed.append((len(analyzed_series), kwargs['start']))
+        return analyzed_series
+
+    monkeypatch.setattr(alerts, 'detect_changes', detect_changes)
+    base_time = time.time()  # generate it based off current time
+    for signature in (test_perf_signature, test_perf_signature_2):
+        _generate_performance_data(
+            test_repository,
+            signature,
+            test_issue_tracker,
+            generic_reference_data,
+            base_time,
+            1,
+            0.5,
+            60,
+        )
+    generate_new_alerts_in_signatures([test_perf_signature, test_perf_signature_2])
+    assert analyzed == [(60, 1), (60, 1)]
+
+    # only the latest revisions of the series which got new data are reanalyzed
+    _generate_performance_data(
+        test_repository,
+        test_perf_signature,
+        test_issue_tracker,
+        generic_reference_data,
+        base_time,
+        61,
+        1.0,
+        20,
+    )
+    generate_new_alerts_in_signatures([test_perf_signature, test_perf_signature_2])
+    assert analyzed[2:] == [(24 + 12 + 20, 24)]
+    assert [
+        (alert.series_signature, alert.summary.push_id, alert.prev_value, alert.new_value)
+        for alert in PerformanceAlert.objects.all()
+    ] == [(test_perf_signature, 61, 0.5, 1.0)]
+
+
+def test_detect_alerts_in_signatures_in_batches(
+    test_repository,
+    test_issue_tracker,
+    failure_classifications,
+    generic_reference_data,
+    test_perf_signature,
+    test_perf_signature_2,
+    monkeypatch,
+):
+    """The series are loaded, analyzed and stored a batch at a time"""
+    events = []
+    get_revision_data = alerts._get_revision_data
+    store_alerts = alerts._store_alerts
+
+    def mock_get_revision_data(series):
+        events.append('load')
+        return get_revision_data(series)
+
+    def mock_store_alerts(signature, *args):
+        events.append('store')
+        return store_alerts(signature, *args)
+
+    monkeypatch.setattr(alerts, '_get_revision_data', mock_get_revision_data)
+    monkeypatch.setattr(alerts, '_store_alerts', mock_store_alerts)
+    monkeypatch.setattr(alerts, 'ALERTS_BATCH_SIZE', 1)
+    base_time = time.time()  # generate it based off current time
+    for signature in (test_perf_signature, test_perf_signature_2):
+        _generate_performance_data(
+            test_repository,
+            signature,
+            test_issue_tracker,
+            generic_reference_data,
+            base_time,
+            1,
+            0.5,
+            10,
+        )
+
+    generate_new_alerts_in_signatures([test_perf_signature, test_perf_signature_2])
+
+    assert events == ['load', 'store', 'load', 'store']
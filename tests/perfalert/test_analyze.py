@@ -1,4 +1,5 @@
 import os
+import random
 
 import pytest
 
@@ -141,3 +142,194 @@ def test_detect_changes_historical_data(filename, expected_timestamps):
     )
     regression_timestamps = [d.push_timestamp for d in results if d.change_detected]
     assert regression_timestamps == expected_timestamps
+
+
+def detect_changes_reference(
+    data, min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7
+):
+    """The original implementation of `detect_changes`, analyzing each window from its values"""
+    # Use T-Tests
+    # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
+    data = sorted(data)
+
+    last_seen_regression = 0
+    for i in range(1, len(data)):
+        di = data[i]
+
+        # keep on getting previous data until we've either got at least 12
+        # data points *or* we've hit the maximum back window
+        jw = []
+        di.amount_prev_data = 0
+        prev_indice = i - 1
+        while (
+            di.amount_prev_data < max_back_window
+            and prev_indice >= 0
+            and (
+                (i - prev_indice)
+                <= min(max(last_seen_regression, min_back_window), max_back_window)
+            )
+        ):
+            jw.append(data[prev_indice])
+            di.amount_prev_data += len(jw[-1].values)
+            prev_indice -= 1
+
+        # accumulate present + future data until we've got at least 12 values
+        kw = []
+        di.amount_next_data = 0
+        next_indice = i
+        while di.amount_next_data < fore_window and next_indice < len(data):
+            kw.append(data[next_indice])
+            di.amount_next_data += len(kw[-1].values)
+            next_indice += 1
+
+        di.historical_stats = analyze(jw)
+        di.forward_stats = analyze(kw)
+
+        di.t = abs(calc_t(jw, kw, linear_weights))
+        # add additional historical data points next time if we
+        # haven't detected a likely regression
+        if di.t > t_threshold:
+            last_seen_regression = 0
+        else:
+            last_seen_regression += 1
+
+    # Now that the t-test scores are calculated, go back through the data to
+    # find where changes most likely happened.
+    for i in range(1, len(data)):
+        di = data[i]
+
+        # if we don't have enough data yet, skip for now (until more comes
+        # in)
+        if di.amount_prev_data < min_back_window or di.amount_next_data < fore_window:
+            continue
+
+        if di.t <= t_threshold:
+            continue
+
+        # Check the adjacent points
+        prev = data[i - 1]
+        if prev.t > di.t:
+            continue
+        # next may or may not exist if it's the last in the series
+        if (i + 1) < len(data):
+            next = data[i + 1]
+            if next.t > di.t:
+                continue
+
+        # This datapoint has a t value higher than the threshold and higher
+        # than either neighbor.  Mark it as the cause of a regression.
+        di.change_detected = True
+
+    return data
+
+
+def _assert_same_changes(make_data, **kwargs):
+    results = detect_changes(make_data(), **kwargs)
+    expected = detect_changes_reference(make_data(), **kwargs)
+
+    assert [d.push_timestamp for d in results] == [d.push_timestamp for d in expected]
+    assert [d.change_detected for d in results] == [d.change_detected for d in expected]
+    for result, reference in zip(results[1:], expected[1:]):
+        assert result.amount_prev_data == reference.amount_prev_data
+        assert result.amount_next_data == reference.amount_next_data
+        assert result.historical_stats == pytest.approx(reference.historical_stats, nan_ok=True)
+        assert result.forward_stats == pytest.approx(reference.forward_stats, nan_ok=True)
+        if result.t != pytest.approx(reference.t, nan_ok=True):
+            # the reference only gets a t value for constant windows from
+            # rounding errors
+            assert result.t == 0
+            assert result.historical_stats["variance"] == result.forward_stats["variance"] == 0
+
+
+@pytest.mark.parametrize(
+    "filename",
+    [
+        'runs1.json',
+        'runs2.json',
+        'runs3.json',
+        'runs4.json',
+        'runs5.json',
+        'a11y.json',
+        'tp5rss.json',
+    ],
+)
+def test_detect_changes_matches_reference(filename):
+    runs = SampleData.get_perf_data(os.path.join('graphs', filename))['test_runs']
+
+    _assert_same_changes(lambda: [RevisionDatum(r[2], r[2], [r[3]]) for r in runs])
+
+
+@pytest.mark.parametrize(
+    ("min_back_window", "max_back_window", "fore_window", "t_threshold"),
+    [(12, 24, 12, 7), (5, 10, 5, 2), (1, 3, 1, 1), (0, 0, 0, 7)],
+)
+def test_detect_changes_random_matches_reference(
+    min_back_window, max_back_window, fore_window, t_threshold
+):
+    rng = random.Random(1)
+    series = [
+        (
+            rng.randint(0, 50),
+            [
+                rng.gauss(100 if i < 40 else 120, 5) if rng.random() < 0.9 else rng.randint(0, 200)
+                for _ in range(rng.randint(1, 6))
+            ],
+        )
+        for i in range(80)
+    ]
+
+    _assert_same_changes(
+        lambda: [
+            RevisionDatum(i, timestamp, values) for (i, (timestamp, values)) in enumerate(series)
+        ],
+        min_back_window=min_back_window,
+        max_back_window=max_back_window,
+        fore_window=fore_window,
+        t_threshold=t_threshold,
+    )
+
+
+def test_detect_changes_tied_neighbours():
+    """Neighbours with equal t-test scores are both changes"""
+    series = [[3.0, 0.0], [3.0], [3.0], [3.0], [2.0, 1.0], [0.0]]
+
+    def make_data():
+        return [RevisionDatum(i, i, values) for (i, values) in enumerate(series)]
+
+    kwargs = dict(min_back_window=1, max_back_window=3, fore_window=1, t_threshold=1)
+    results = detect_changes(make_data(), **kwargs)
+    assert [d.t for d in results][-2:] == [3.0, 3.0]
+    assert [d.change_detected for d in results] == [False, False, False, False, True, True]
+
+    # the reference's rounding breaks the tie (3.000000000000001 and 3.0)
+    expected = detect_changes_reference(make_data(), **kwargs)
+    assert [d.t for d in expected][-2:] == pytest.approx([3.0, 3.0])
+    assert [d.change_detected for d in expected] == [False, False, False, False, True, False]
+
+
+def test_detect_changes_non_finite_values():
+    data = [RevisionDatum(i, i, [0.0]) for i in range(20)] + [
+        RevisionDatum(i, i, [float('inf')]) for i in range(20, 40)
+    ]
+
+    _assert_same_changes(
+        lambda: [RevisionDatum(d.push_timestamp, d.push_id, list(d.values)) for d in data]
+    )
+
+
+def test_detect_changes_from_start():
+    runs = SampleData.get_perf_data(os.path.join('graphs', 'runs2.json'))['test_runs']
+    expected = detect_changes([RevisionDatum(r[2], r[2], [r[3]]) for r in runs])
+
+    # analyze the latest revisions again, on top of the ones before them
+    start = len(runs) - 20
+    data = [RevisionDatum(r[2], r[2], [r[3]]) for r in runs]
+    for (d, analyzed) in zip(sorted(data)[:start], expected):
+        d.t = analyzed.t
+        d.amount_prev_data = analyzed.amount_prev_data
+        d.amount_next_data = analyzed.amount_next_data
+        d.last_seen_regression = analyzed.last_seen_regression
+    results = detect_changes(data, start=start)
+
+    assert [d.change_detected for d in results] == [d.change_detected for d in expected]
+    assert [d.t for d in results] == [d.t for d in expected]
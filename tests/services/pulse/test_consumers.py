@@ -1,8 +1,20 @@
+import asyncio
+
 import pytest
 from django.conf import settings
+from kombu.exceptions import OperationalError
 
 from tests.conftest import IS_WINDOWS
-from treeherder.services.pulse.consumers import Consumers, PulseConsumer
+from treeherder.services import queue_depth
+from treeherder.services.pulse import consumers
+from treeherder.services.pulse.consumers import (
+    AsyncConsumers,
+    Consumers,
+    PulseConsumer,
+    PushConsumer,
+    TaskConsumer,
+    prepare_consumers,
+)
 
 from .utils import create_and_destroy_exchange
 
@@ -47,3 +59,213 @@ def test_PulseConsumer(pulse_connection):
             None,
         )
         cons.prepare()
+
+
+class FakeMessage:
+    """A task message delivered on a channel shared with the other fake messages"""
+
+    delivery_info = {
+        "exchange": "exchange/taskcluster-queue/v1/task-completed",
+        "routing_key": "primary.foo",
+    }
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.acked = False
+        channel.append(self)
+
+    def ack(self, multiple=False):
+        acked = self.channel[: self.channel.index(self) + 1] if multiple else [self]
+        for message in acked:
+            message.acked = True
+
+
+@pytest.fixture
+def pulse_batches(settings, monkeypatch):
+    batches = []
+
+    def mock_apply_async(args, queue):
+        batches.append(args[0])
+
+    monkeypatch.setattr(consumers.store_pulse_tasks_batch, "apply_async", mock_apply_async)
+    settings.PULSE_TASKS_BATCH_SIZE = 2
+    settings.PULSE_TASKS_BATCH_INTERVAL = 60
+    return batches
+
+
+def test_TaskConsumer_batches_messages(settings, pulse_batches):
+    batches = pulse_batches
+    cons = TaskConsumer(
+        {
+            "root_url": "https://firefox-ci-tc.services.mozilla.com",
+            "pulse_url": settings.CELERY_BROKER_URL,
+        },
+        None,
+    )
+    channel = []
+    messages = [FakeMessage(channel) for _ in range(3)]
+    for i, message in enumerate(messages):
+        cons.on_message({"id": i}, message)
+
+    # a full batch is passed on straight away, and only then acknowledged
+    assert [[body["id"] for body, _, _ in batch] for batch in batches] == [[0, 1]]
+    assert [message.acked for message in messages] == [True, True, False]
+
+    # the rest is passed on once the batch interval has passed
+    cons.on_iteration()
+    assert len(batches) == 1
+    settings.PULSE_TASKS_BATCH_INTERVAL = 0
+    cons.on_iteration()
+    assert [[body["id"] for body, _, _ in batch] for batch in batches] == [[0, 1], [2]]
+    assert all(message.acked for message in messages)
+
+
+def test_TaskConsumer_reconnect_drops_messages(settings, pulse_batches):
+    """The task messages of a lost connection are left for Pulse to deliver again"""
+    batches = pulse_batches
+    cons = TaskConsumer(
+        {
+            "root_url": "https://firefox-ci-tc.services.mozilla.com",
+            "pulse_url": settings.CELERY_BROKER_URL,
+        },
+        None,
+    )
+
+    class ClosedChannelMessage(FakeMessage):
+        def ack(self, multiple=False):
+            raise ConnectionResetError()
+
+    cons.on_message({"id": 0}, ClosedChannelMessage([]))
+    # as ConsumerMixin.run does when reconnecting
+    cons.on_connection_revived()
+
+    channel = []
+    messages = [FakeMessage(channel) for _ in range(2)]
+    for i, message in enumerate(messages, 1):
+        cons.on_message({"id": i}, message)
+
+    assert [[body["id"] for body, _, _ in batch] for batch in batches] == [[1, 2]]
+    assert all(message.acked for message in messages)
+    settings.PULSE_TASKS_BATCH_INTERVAL = 0
+    cons.on_iteration()
+    assert len(batches) == 1
+
+
+def test_TaskConsumer_backpressure(settings, pulse_batches, monkeypatch):
+    """Task messages are held on to while too many are waiting to be stored"""
+    depths = {"store_pulse_tasks": 20}
+    monkeypatch.setattr(queue_depth, "get_queue_depths", lambda: depths)
+    settings.PULSE_BACKPRESSURE_QUEUE_DEPTH = 10
+    cons = TaskConsumer(
+        {
+            "root_url": "https://firefox-ci-tc.services.mozilla.com",
+            "pulse_url": settings.CELERY_BROKER_URL,
+        },
+        None,
+    )
+    settings.PULSE_TASKS_BATCH_INTERVAL = 0
+    channel = []
+    messages = [FakeMessage(channel) for _ in range(5)]
+    for i, message in enumerate(messages):
+        cons.on_message({"id": i}, message)
+
+    assert cons.paused
+    assert pulse_batches == []
+    assert not any(message.acked for message in messages)
+
+    depths["store_pulse_tasks"] = 5
+    cons.on_iteration()
+    assert not cons.paused
+    assert [[body["id"] for body, _, _ in batch] for batch in pulse_batches] == [
+        [0, 1],
+        [2, 3],
+        [4],
+    ]
+    assert all(message.acked for message in messages)
+
+
+def test_prepare_consumers_async(settings):
+    settings.PULSE_ASYNC_CONSUMERS = True
+    consumers = prepare_consumers(
+        TaskConsumer,
+        [
+            {
+                "root_url": "https://firefox-ci-tc.services.mozilla.com",
+                "pulse_url": settings.CELERY_BROKER_URL,
+            }
+        ],
+    )
+
+    assert isinstance(consumers, AsyncConsumers)
+
+
+@pytest.mark.parametrize(
+    "consumer_class, async_consumers, batch_size, prefetch_count",
+    [
+        (TaskConsumer, False, 2, 100),
+        (TaskConsumer, False, 1, None),
+        (PushConsumer, False, 2, None),
+        (PushConsumer, True, 1, 100),
+    ],
+)
+def test_get_consumers_prefetch_count(
+    settings, consumer_class, async_consumers, batch_size, prefetch_count
+):
+    """Messages are prefetched to be acknowledged in batches, or to run on an event loop"""
+    settings.PULSE_ASYNC_CONSUMERS = async_consumers
+    settings.PULSE_TASKS_BATCH_SIZE = batch_size
+    settings.PULSE_PREFETCH_COUNT = 100
+    cons = consumer_class(
+        {
+            "root_url": "https://firefox-ci-tc.services.mozilla.com",
+            "pulse_url": settings.CELERY_BROKER_URL,
+        },
+        None,
+    )
+    cons.consumers = [dict(queues=None, callbacks=[cons.on_message])]
+
+    (kombu_consumer,) = cons.get_consumers(dict, None)
+    assert kombu_consumer.get("prefetch_count") == prefetch_count
+
+
+def test_AsyncConsumers_reconnects():
+    """A consumer which loses its connection reconnects, and drops its unacknowledged messages"""
+
+    class Stop(Exception):
+        pass
+
+    class TestConnection:
+        connection_errors = (ConnectionError,)
+
+        def __init__(self):
+            self.attempts = 0
+
+        def ensure_connection(self, max_retries):
+            self.attempts += 1
+            if self.attempts == 1:
+                raise OperationalError("unreachable")
+            if self.attempts == 2:
+                raise ConnectionError("reset")
+            raise Stop()
+
+    class TestConsumer:
+        def __init__(self):
+            self.connection = TestConnection()
+            self.task_messages = ["message"]
+
+        def prepare(self):
+            pass
+
+        def drop_task_messages(self):
+            self.task_messages = []
+
+    cons = TestConsumer()
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(Stop):
+            loop.run_until_complete(AsyncConsumers([cons]).consume(cons))
+    finally:
+        loop.close()
+
+    assert cons.connection.attempts == 3
+    assert cons.task_messages == []
@@ -0,0 +1,60 @@
+import pytest
+from django.core.cache import cache
+
+from treeherder.services import queue_depth
+
+
+@pytest.fixture
+def fetched_depths(settings, monkeypatch):
+    """Serve queue depths as if from a broker, recording when they were fetched"""
+    settings.CELERY_TASK_ALWAYS_EAGER = False
+    fetched = []
+
+    def mock_fetch_queue_depths(queue_names):
+        fetched.append(queue_names)
+        return {queue_name: 10 for queue_name in queue_names}
+
+    monkeypatch.setattr(queue_depth, "fetch_queue_depths", mock_fetch_queue_depths)
+    cache.delete(queue_depth.QUEUE_DEPTHS_CACHE_KEY)
+    yield fetched
+    cache.delete(queue_depth.QUEUE_DEPTHS_CACHE_KEY)
+
+
+def test_queue_depths_eager(fetched_depths, settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+
+    assert queue_depth.get_queue_depths() == {}
+    assert fetched_depths == []
+
+
+def test_queue_depths_cached(fetched_depths, settings):
+    for _ in range(2):
+        assert queue_depth.get_queue_depth("store_pulse_tasks") == 10
+
+    assert fetched_depths == [[queue.name for queue in settings.CELERY_TASK_QUEUES]]
+
+
+def test_is_overloaded(fetched_depths):
+    assert queue_depth.is_overloaded("log_parser", 5)
+    assert not queue_depth.is_overloaded("log_parser", 10)
+    # the depth of unknown queues can't be fetched
+    assert not queue_depth.is_overloaded("unknown", 5)
+
+
+def test_fetch_queue_depths_broker_unavailable(monkeypatch):
+    def connection_for_read():
+        raise ConnectionRefusedError()
+
+    monkeypatch.setattr(queue_depth.celery_app, "connection_for_read", connection_for_read)
+
+    assert queue_depth.fetch_queue_depths(["log_parser"]) == {}
+
+
+def test_queue_depths_cache_unavailable(fetched_depths, monkeypatch):
+    def cache_get(key):
+        raise ConnectionError()
+
+    monkeypatch.setattr(queue_depth.cache, "get", cache_get)
+
+    assert queue_depth.get_queue_depths() == {}
+    assert not queue_depth.is_overloaded("log_parser", 5)
@@ -9,6 +9,9 @@ TREEHERDER_TEST_REPOSITORY_NAME = 'test_treeherder_jobs'
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# generate perf alerts as soon as there's new data, rather than periodically
+PERFHERDER_ALERTS_SCHEDULING_WINDOW = 0
+
 # Make WhiteNoise look for static assets inside registered Django apps, rather
 # than only inside the generated staticfiles directory. This means we don't
 # have to run collectstatic for `test_content_security_policy_header` to pass.
@@ -1,13 +1,24 @@
+import copy
 from threading import local
 
 import pytest
 
 from treeherder.etl.exceptions import MissingPushException
 from treeherder.etl.push import store_push_data
-from treeherder.etl.tasks.pulse_tasks import store_pulse_tasks
+from treeherder.etl.tasks.pulse_tasks import store_pulse_tasks, store_pulse_tasks_batch
 from treeherder.model.models import Job
 
 
+@pytest.fixture
+def pulse_jobs(sample_data, test_repository, push_stored):
+    revision = push_stored[0]["revisions"][0]["revision"]
+    jobs = copy.deepcopy(sample_data.pulse_jobs)
+    for job in jobs:
+        job["origin"]["project"] = test_repository.name
+        job["origin"]["revision"] = revision
+    return jobs
+
+
 @pytest.mark.skip("Test needs fixing in bug: 1307289 (plus upgrade from jobs to tasks)")
 def test_retry_missing_revision_succeeds(
     sample_data, sample_push, test_repository, mock_log_parser, monkeypatch
@@ -37,3 +48,34 @@ def test_retry_missing_revision_succeeds(
     assert Job.objects.count() == 1
     assert Job.objects.values()[0]["guid"] == job["taskId"]
     assert thread_data.retries == 1
+
+
+def test_store_pulse_tasks_batch(
+    pulse_jobs, test_repository, failure_classifications, mock_log_parser, monkeypatch
+):
+    """
+    The jobs of a batch of messages are stored together, while messages that
+    can't be stored yet are passed on to be retried individually.
+    """
+    from treeherder.etl import job_loader
+    from treeherder.etl.tasks import pulse_tasks
+
+    async def mock_handle_message(message):
+        return [message["payload"]]
+
+    retried = []
+
+    def mock_apply_async(args, queue):
+        retried.append(args[0]["taskId"])
+
+    monkeypatch.setattr(pulse_tasks, "handleMessage", mock_handle_message)
+    monkeypatch.setattr(job_loader, "get_task_definition", lambda root_url, task_id: {})
+    monkeypatch.setattr(job_loader, "ignore_task", lambda *args: False)
+    monkeypatch.setattr(store_pulse_tasks, "apply_async", mock_apply_async)
+
+    # the push of the last job hasn't been ingested yet
+    pulse_jobs[-1]["origin"]["revision"] = "1" * 40
+    store_pulse_tasks_batch([[job, "foo", "bar"] for job in pulse_jobs])
+
+    assert Job.objects.count() == len(pulse_jobs) - 1
+    assert retried == [pulse_jobs[-1]["taskId"]]
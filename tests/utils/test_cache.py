@@ -0,0 +1,48 @@
+from treeherder.utils.cache import LRUCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_expires_entries():
+    timer = FakeTimer()
+    cache = LRUCache(maxsize=10, ttl=60, timer=timer)
+    cache.set('foo', 'bar')
+
+    timer.now = 59
+    assert cache.get('foo') == 'bar'
+
+    timer.now = 60
+    assert cache.get('foo') is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # reading 'a' makes 'b' the least recently used entry
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_lru_cache_get_or_set():
+    cache = LRUCache(maxsize=10, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'value'
+
+    assert cache.get_or_set('key', compute) == 'value'
+    assert cache.get_or_set('key', compute) == 'value'
+    assert len(calls) == 1
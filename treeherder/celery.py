@@ -1,6 +1,10 @@
+import logging
 import os
 
 from celery import Celery
+from celery.signals import celeryd_after_setup, worker_process_init
+
+logger = logging.getLogger(__name__)
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'treeherder.config.settings')
@@ -15,3 +19,30 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+
+
+# Whether the worker consumes the queues of the tasks ingesting jobs, whose
+# processes use the reference data cache.
+warm_reference_data = False
+
+
+@celeryd_after_setup.connect
+def check_queues(sender, instance, **kwargs):
+    global warm_reference_data
+    warm_reference_data = 'store_pulse_tasks' in instance.app.amqp.queues.consume_from
+
+
+@worker_process_init.connect
+def warm_caches(**kwargs):
+    """Preload the per-process caches used during ingestion."""
+    if not warm_reference_data:
+        return
+
+    # importing here since Django isn't set up when this module is loaded
+    from treeherder.etl.jobs import warm_reference_data_cache
+
+    try:
+        warm_reference_data_cache()
+    except Exception:
+        # the caches fill on demand anyway, so this shouldn't stop the worker
+        logger.exception('Failed to warm the reference data cache')
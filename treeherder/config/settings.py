@@ -39,6 +39,23 @@ PULSE_AUTO_DELETE_QUEUES = env.bool("PULSE_AUTO_DELETE_QUEUES", default=False)
 if os.environ.get("VIRTUAL_ENV"):
     PULSE_AUTO_DELETE_QUEUES = True
 
+# Taskcluster task messages are passed on from the Pulse listener to the
+# `store_pulse_tasks` workers in batches of up to this many messages, or of
+# however many have arrived after this many seconds.
+PULSE_TASKS_BATCH_SIZE = env.int("PULSE_TASKS_BATCH_SIZE", default=50)
+PULSE_TASKS_BATCH_INTERVAL = env.int("PULSE_TASKS_BATCH_INTERVAL", default=1)
+# The number of messages Pulse delivers to a listener before it has acknowledged them.
+PULSE_PREFETCH_COUNT = env.int("PULSE_PREFETCH_COUNT", default=1000)
+# Run all the Pulse consumers of a listener on a single event loop rather than
+# a thread each (see `AsyncConsumers`).
+PULSE_ASYNC_CONSUMERS = env.bool("PULSE_ASYNC_CONSUMERS", default=False)
+# Task messages are held on to while more than this many are waiting in the
+# `store_pulse_tasks` queue.
+PULSE_BACKPRESSURE_QUEUE_DEPTH = env.int("PULSE_BACKPRESSURE_QUEUE_DEPTH", default=10000)
+# The logs of tier 3 jobs aren't parsed while more than this many tasks are
+# waiting in the log parser queue they would go to.
+LOG_PARSER_SHED_QUEUE_DEPTH = env.int("LOG_PARSER_SHED_QUEUE_DEPTH", default=5000)
+
 # Hosts
 SITE_URL = env("SITE_URL", default='http://localhost:8000')
 
@@ -378,6 +395,12 @@ CELERY_BEAT_SCHEDULE = {
         'relative': True,
         'options': {'queue': "seta_analyze_failures"},
     },
+    'generate-pending-perf-alerts': {
+        'task': 'generate-pending-alerts',
+        'schedule': timedelta(seconds=30),
+        'relative': True,
+        'options': {'queue': "generate_perf_alerts"},
+    },
 }
 
 # CORS Headers
@@ -438,6 +461,9 @@ COMMENTER_API_KEY = env("BUG_COMMENTER_API_KEY", default=None)
 # Log Parsing
 MAX_ERROR_LINES = 100
 FAILURE_LINES_CUTOFF = 35
+# Number of processes used to parse logs too large to be streamed through the
+# parsers within the task time limit (see `ArtifactBuilderCollection.parse_chunked`).
+LOG_PARSER_CHUNK_PROCESSES = env.int("LOG_PARSER_CHUNK_PROCESSES", default=2)
 
 # Perfherder
 # Default minimum regression threshold for perfherder is 2% (otherwise
@@ -454,6 +480,9 @@ BUG_COOLDOWN_TIME = timedelta(weeks=2)  # time after bug is ready for assessment
 
 # Only generate alerts for data newer than this time in seconds in perfherder
 PERFHERDER_ALERTS_MAX_AGE = timedelta(weeks=2)
+# Generate the alerts of a signature at most once per this many seconds,
+# however often it gets new data (0 generates them for every new datum)
+PERFHERDER_ALERTS_SCHEDULING_WINDOW = env.int("PERFHERDER_ALERTS_SCHEDULING_WINDOW", default=60)
 # From the same job's log, ingest (or not) multiple PERFHERDER_DATA dumps
 # pertaining to the same performance signature
 PERFHERDER_ENABLE_MULTIDATA_INGESTION = env.bool(
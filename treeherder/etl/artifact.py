@@ -19,20 +19,32 @@ def store_text_log_summary_artifact(job, text_log_summary_artifact):
     errors = json.loads(text_log_summary_artifact['blob'])['errors']
 
     with transaction.atomic():
+        # look up any previously stored errors for this job in a single query,
+        # so that re-processing a log doesn't create duplicate error lines
+        existing = {
+            (obj.line_number, obj.line): obj for obj in TextLogError.objects.filter(job=job)
+        }
+        text_log_errors = []
+        new_errors = []
         for error in errors:
-            obj, created = TextLogError.objects.get_or_create(
-                job=job,
-                line_number=error['linenumber'],
-                line=astral_filter(error['line']),
-            )
-            if not created:
+            key = (error['linenumber'], astral_filter(error['line']))
+            obj = existing.get(key)
+            if obj is None:
+                obj = TextLogError(job=job, line_number=key[0], line=key[1])
+                existing[key] = obj
+                new_errors.append(obj)
+            else:
                 logger.warning('duplicate error lines processed for job %s', job.id)
+            text_log_errors.append(obj)
+
+        TextLogError.objects.bulk_create(new_errors)
 
-    # get error summary immediately (to warm the cache)
-    error_summary.get_error_summary(job)
+    # get error summary immediately (to warm the cache), reusing the rows
+    # we already have in memory rather than querying for them again
+    error_summary.get_error_summary(job, errors=text_log_errors)
 
 
-def store_job_artifacts(artifact_data):
+def store_job_artifacts(artifact_data, validated=False):
     """
     Store a list of job artifacts. All of the datums in artifact_data need
     to be in the following format:
@@ -45,6 +57,8 @@ def store_job_artifacts(artifact_data):
             'job_guid': 'd22c74d4aa6d2a1dcba96d95dccbd5fdca70cf33'
         }
 
+    ``validated`` is set when the artifacts were generated by the log parser,
+    which has already validated their performance data.
     """
     for artifact in artifact_data:
         # Determine what type of artifact we have received
@@ -68,7 +82,7 @@ def store_job_artifacts(artifact_data):
                 continue
 
             if artifact_name == 'performance_data':
-                store_performance_artifact(job, artifact)
+                store_performance_artifact(job, artifact, validated)
             elif artifact_name == 'text_log_summary':
                 try:
                     store_text_log_summary_artifact(job, artifact)
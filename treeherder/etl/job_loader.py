@@ -9,7 +9,7 @@ from treeherder.etl.taskcluster_pulse.handler import ignore_task
 from treeherder.etl.common import to_timestamp
 from treeherder.etl.exceptions import MissingPushException
 from treeherder.etl.jobs import store_job_data
-from treeherder.etl.schema import get_json_schema
+from treeherder.etl.schema import validate
 from treeherder.model.models import Push, Repository
 from treeherder.utils.taskcluster import get_task_definition
 
@@ -58,6 +58,23 @@ class JobLoader:
     PLATFORM_FIELD_MAP = {"build_platform": "buildMachine", "machine_platform": "runMachine"}
 
     def process_job(self, pulse_job, root_url):
+        prepared_job = self.prepare_job(pulse_job)
+        if prepared_job:
+            repository, transformed_job = prepared_job
+            try:
+                store_job_data(repository, [transformed_job])
+                # Returning the transformed_job is only for testing purposes
+                return transformed_job
+            except AttributeError:
+                logger.warning("Skipping job due to bad attribute", exc_info=1)
+
+    def prepare_job(self, pulse_job):
+        """
+        Validate and transform a job without storing it.
+
+        Returns a tuple of the job's repository and the transformed job, or None
+        if the job isn't to be stored.
+        """
         if self._is_valid_job(pulse_job):
             try:
                 project = pulse_job["origin"]["project"]
@@ -74,10 +91,7 @@ class JobLoader:
                 if pulse_job["state"] != "unscheduled":
                     try:
                         self.validate_revision(repository, pulse_job)
-                        transformed_job = self.transform(pulse_job)
-                        store_job_data(repository, [transformed_job])
-                        # Returning the transformed_job is only for testing purposes
-                        return transformed_job
+                        return repository, self.transform(pulse_job)
                     except AttributeError:
                         logger.warning("Skipping job due to bad attribute", exc_info=1)
             except Repository.DoesNotExist:
@@ -241,7 +255,7 @@ class JobLoader:
             # Changing the pulse schema will also require a schema change
             if len(pulse_job["owner"]) > 50:
                 pulse_job["owner"] = pulse_job["owner"][0:49]
-            jsonschema.validate(pulse_job, get_json_schema("pulse-job.yml"))
+            validate(pulse_job, "pulse-job.yml")
         except (jsonschema.ValidationError, jsonschema.SchemaError) as e:
             logger.error("JSON Schema validation error during job ingestion: %s", e)
             return False
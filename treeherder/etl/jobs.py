@@ -2,11 +2,15 @@ import copy
 import logging
 import os
 import time
+from collections import defaultdict
 from datetime import datetime
 from hashlib import sha1
 
 import newrelic.agent
-from django.core.exceptions import ObjectDoesNotExist
+from celery import group
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.db.utils import IntegrityError
 
 from treeherder.etl.common import get_guid_root
@@ -26,9 +30,44 @@ from treeherder.model.models import (
     ReferenceDataSignatures,
     TaskclusterMetadata,
 )
+from treeherder.services import queue_depth
+from treeherder.utils.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Reference data (platforms, job types, machines etc) is needed for every job
+# state change but almost never changes, so each process keeps its own cache
+# of it. The timeout bounds how long we hold on to rows removed by data cycling.
+REFERENCE_DATA_CACHE_SIZE = 10000
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 5
+
+reference_data_cache = LRUCache(REFERENCE_DATA_CACHE_SIZE, REFERENCE_DATA_CACHE_TIMEOUT)
+
+# Pulse redeliveries and retries mean many job datums repeat a state change
+# we've already stored, so the last stored state of each job is cached to
+# discard them without querying the jobs table.
+JOB_STATE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# The fields of an existing job that are updated when it changes state
+JOB_UPDATE_FIELDS = [
+    'guid',
+    'signature',
+    'build_platform',
+    'machine_platform',
+    'machine',
+    'option_collection_hash',
+    'job_type',
+    'job_group',
+    'product',
+    'result',
+    'state',
+    'tier',
+    'submit_time',
+    'start_time',
+    'end_time',
+    'push_id',
+]
+
 
 def _get_number(s):
     try:
@@ -37,16 +76,130 @@ def _get_number(s):
         return 0
 
 
+def _reference_data_key(model, **kwargs):
+    return (model.__name__,) + tuple(sorted(kwargs.items()))
+
+
+def _get_or_create_reference_data(model, defaults=None, **kwargs):
+    """
+    Cached equivalent of ``model.objects.get_or_create(**kwargs)[0]``
+    """
+    return reference_data_cache.get_or_set(
+        _reference_data_key(model, **kwargs),
+        lambda: model.objects.get_or_create(defaults=defaults, **kwargs)[0],
+    )
+
+
+def _load_option_collection(option_names):
+    """
+    Ensure an OptionCollection exists for the given options, returning its hash
+    """
+    option_collection_hash = OptionCollection.calculate_hash(option_names)
+    key = _reference_data_key(OptionCollection, option_collection_hash=option_collection_hash)
+    if reference_data_cache.get(key):
+        return option_collection_hash
+
+    if not OptionCollection.objects.filter(option_collection_hash=option_collection_hash).exists():
+        # in the unlikely event that we haven't seen this set of options
+        # before, add the appropriate database rows
+        options = []
+        for option_name in option_names:
+            options.append(_get_or_create_reference_data(Option, name=option_name))
+        for option in options:
+            OptionCollection.objects.create(
+                option_collection_hash=option_collection_hash, option=option
+            )
+    reference_data_cache.set(key, True)
+
+    return option_collection_hash
+
+
+def warm_reference_data_cache():
+    """
+    Preload the reference data cache from the smaller reference data tables.
+
+    Job types, machines and signatures are left to be cached on demand, since
+    there are too many of them for loading them all up front to pay off.
+    """
+    for model, fields in (
+        (BuildPlatform, ('os_name', 'platform', 'architecture')),
+        (MachinePlatform, ('os_name', 'platform', 'architecture')),
+        (JobGroup, ('name', 'symbol')),
+        (Product, ('name',)),
+        (FailureClassification, ('name',)),
+    ):
+        for obj in model.objects.all():
+            key = _reference_data_key(model, **{field: getattr(obj, field) for field in fields})
+            reference_data_cache.set(key, obj)
+
+    for option_collection_hash in OptionCollection.objects.values_list(
+        'option_collection_hash', flat=True
+    ).distinct():
+        key = _reference_data_key(OptionCollection, option_collection_hash=option_collection_hash)
+        reference_data_cache.set(key, True)
+
+
+def _job_state_cache_key(guid):
+    return "job-state-{}".format(guid)
+
+
+def _is_stale_state(current_state, state):
+    """
+    A job should not transition from running to pending, or from completed to
+    any other state.
+    """
+    return current_state == 'completed' or (state == 'pending' and current_state == 'running')
+
+
+def _cache_job_states(job_states):
+    """Record the state each job in ``job_states`` (guid -> state) was stored with"""
+    # a retry job takes over the row of its root job (see ``_store_jobs``),
+    # after which the root guid no longer refers to any job
+    freed_guids = {get_guid_root(guid) for guid in job_states} - set(job_states)
+    try:
+        cache.set_many(
+            {_job_state_cache_key(guid): state for (guid, state) in job_states.items()},
+            JOB_STATE_CACHE_TIMEOUT,
+        )
+        if freed_guids:
+            cache.delete_many([_job_state_cache_key(guid) for guid in freed_guids])
+    except Exception as e:
+        logger.error("Error caching the state of %s jobs: %s", len(job_states), e)
+
+
 def _remove_existing_jobs(data):
     """
     Remove jobs from data where we already have them in the same state.
 
     1. split the incoming jobs into pending, running and complete.
-    2. fetch the ``job_guids`` from the db that are in the same state as they
+    2. discard the jobs whose cached state (see ``_cache_job_states``) they
+       can't transition from.
+    3. fetch the ``job_guids`` from the db that are in the same state as they
        are in ``data``.
-    3. build a new list of jobs in ``new_data`` that are not already in
+    4. build a new list of jobs in ``new_data`` that are not already in
        the db and pass that back.  It could end up empty at that point.
+
+    The cache is only ever used to discard jobs, so the db remains the source
+    of truth for any job that is kept.
     """
+    guids = {datum['job']['job_guid'] for datum in data}
+    try:
+        cached_states = cache.get_many([_job_state_cache_key(guid) for guid in guids])
+    except Exception as e:
+        logger.error("Error fetching the cached state of %s jobs: %s", len(guids), e)
+        cached_states = {}
+
+    data = [
+        datum
+        for datum in data
+        if not _is_stale_state(
+            cached_states.get(_job_state_cache_key(datum['job']['job_guid'])),
+            datum['job'].get('state'),
+        )
+    ]
+    if not data:
+        return []
+
     new_data = []
 
     guids = [datum['job']['job_guid'] for datum in data]
@@ -57,65 +210,48 @@ def _remove_existing_jobs(data):
 
     for datum in data:
         job = datum['job']
-        if not state_map.get(job['job_guid']):
-            new_data.append(datum)
-        else:
-            # should not transition from running to pending,
-            # or completed to any other state
-            current_state = state_map[job['job_guid']]
-            if current_state == 'completed' or (
-                job['state'] == 'pending' and current_state == 'running'
-            ):
-                continue
-            new_data.append(datum)
+        if state_map.get(job['job_guid']) and _is_stale_state(
+            state_map[job['job_guid']], job.get('state')
+        ):
+            continue
+        new_data.append(datum)
+        # later datums for the same job are checked against this one
+        state_map[job['job_guid']] = job.get('state')
 
     return new_data
 
 
-def _load_job(repository, job_datum, push_id):
+def _get_job_fields(repository, job_datum, push_id):
     """
-    Load a job into the treeherder database
-
-    If the job is a ``retry`` the ``job_guid`` will have a special
-    suffix on it.  But the matching ``pending``/``running`` job will not.
-    So we append the suffixed ``job_guid`` to ``retry_job_guids``
-    so that we can update the job_id_lookup later with the non-suffixed
-    ``job_guid`` (root ``job_guid``). Then we can find the right
-    ``pending``/``running`` job and update it with this ``retry`` job.
+    Resolve the reference data for a job datum and return the field values of
+    the corresponding Job row.
     """
-    build_platform, _ = BuildPlatform.objects.get_or_create(
+    build_platform = _get_or_create_reference_data(
+        BuildPlatform,
         os_name=job_datum.get('build_platform', {}).get('os_name', 'unknown'),
         platform=job_datum.get('build_platform', {}).get('platform', 'unknown'),
         architecture=job_datum.get('build_platform', {}).get('architecture', 'unknown'),
     )
 
-    machine_platform, _ = MachinePlatform.objects.get_or_create(
+    machine_platform = _get_or_create_reference_data(
+        MachinePlatform,
         os_name=job_datum.get('machine_platform', {}).get('os_name', 'unknown'),
         platform=job_datum.get('machine_platform', {}).get('platform', 'unknown'),
         architecture=job_datum.get('machine_platform', {}).get('architecture', 'unknown'),
     )
 
-    option_names = job_datum.get('option_collection', [])
-    option_collection_hash = OptionCollection.calculate_hash(option_names)
-    if not OptionCollection.objects.filter(option_collection_hash=option_collection_hash).exists():
-        # in the unlikely event that we haven't seen this set of options
-        # before, add the appropriate database rows
-        options = []
-        for option_name in option_names:
-            option, _ = Option.objects.get_or_create(name=option_name)
-            options.append(option)
-        for option in options:
-            OptionCollection.objects.create(
-                option_collection_hash=option_collection_hash, option=option
-            )
+    option_collection_hash = _load_option_collection(job_datum.get('option_collection', []))
 
-    machine, _ = Machine.objects.get_or_create(name=job_datum.get('machine', 'unknown'))
+    machine = _get_or_create_reference_data(Machine, name=job_datum.get('machine', 'unknown'))
 
-    job_type, _ = JobType.objects.get_or_create(
-        symbol=job_datum.get('job_symbol') or 'unknown', name=job_datum.get('name') or 'unknown'
+    job_type = _get_or_create_reference_data(
+        JobType,
+        symbol=job_datum.get('job_symbol') or 'unknown',
+        name=job_datum.get('name') or 'unknown',
     )
 
-    job_group, _ = JobGroup.objects.get_or_create(
+    job_group = _get_or_create_reference_data(
+        JobGroup,
         name=job_datum.get('group_name') or 'unknown',
         symbol=job_datum.get('group_symbol') or 'unknown',
     )
@@ -123,7 +259,7 @@ def _load_job(repository, job_datum, push_id):
     product_name = job_datum.get('product_name', 'unknown')
     if not product_name.strip():
         product_name = 'unknown'
-    product, _ = Product.objects.get_or_create(name=product_name)
+    product = _get_or_create_reference_data(Product, name=product_name)
 
     job_guid = job_datum['job_guid']
     job_guid = job_guid[0:50]
@@ -141,8 +277,6 @@ def _load_job(repository, job_datum, push_id):
 
     reference_data_name = job_datum.get('reference_data_name', None)
 
-    default_failure_classification = FailureClassification.objects.get(name='not classified')
-
     sh = sha1()
     sh.update(
         ''.join(
@@ -174,7 +308,8 @@ def _load_job(repository, job_datum, push_id):
     if not reference_data_name:
         reference_data_name = signature_hash
 
-    signature, _ = ReferenceDataSignatures.objects.get_or_create(
+    signature = _get_or_create_reference_data(
+        ReferenceDataSignatures,
         name=reference_data_name,
         signature=signature_hash,
         build_system_type=build_system_type,
@@ -203,110 +338,270 @@ def _load_job(repository, job_datum, push_id):
     start_time = datetime.fromtimestamp(_get_number(job_datum.get('start_timestamp')))
     end_time = datetime.fromtimestamp(_get_number(job_datum.get('end_timestamp')))
 
-    # first, try to create the job with the given guid (if it doesn't
-    # exist yet)
-    job_guid_root = get_guid_root(job_guid)
-    if not Job.objects.filter(guid__in=[job_guid, job_guid_root]).exists():
-        # This could theoretically already have been created by another process
-        # that is running updates simultaneously.  So just attempt to create
-        # it, but allow it to skip if it's the same guid.  The odds are
-        # extremely high that this is a pending and running job that came in
-        # quick succession and are being processed by two different workers.
-        Job.objects.get_or_create(
-            guid=job_guid,
-            defaults={
-                "repository": repository,
-                "signature": signature,
-                "build_platform": build_platform,
-                "machine_platform": machine_platform,
-                "machine": machine,
-                "option_collection_hash": option_collection_hash,
-                "job_type": job_type,
-                "job_group": job_group,
-                "product": product,
-                "failure_classification": default_failure_classification,
-                "who": who,
-                "reason": reason,
-                "result": result,
-                "state": state,
-                "tier": tier,
-                "submit_time": submit_time,
-                "start_time": start_time,
-                "end_time": end_time,
-                "last_modified": datetime.now(),
-                "push_id": push_id,
-            },
+    return {
+        "guid": job_guid,
+        "repository": repository,
+        "signature": signature,
+        "build_platform": build_platform,
+        "machine_platform": machine_platform,
+        "machine": machine,
+        "option_collection_hash": option_collection_hash,
+        "job_type": job_type,
+        "job_group": job_group,
+        "product": product,
+        "who": who,
+        "reason": reason,
+        "result": result,
+        "state": state,
+        "tier": tier,
+        "submit_time": submit_time,
+        "start_time": start_time,
+        "end_time": end_time,
+        "push_id": push_id,
+    }
+
+
+def _get_push_ids(repository, data):
+    """
+    Look up the ids of the pushes of all the given job datums in one query.
+
+    Jobs referring to a push by a short revision aren't included, since those
+    have to be looked up individually.
+    """
+    revisions = {datum['revision'] for datum in data if len(datum['revision']) >= 40}
+    return dict(
+        Push.objects.filter(repository=repository, revision__in=revisions).values_list(
+            'revision', 'id'
         )
-    # Can't just use the ``job`` we would get from the ``get_or_create``
-    # because we need to try the job_guid_root instance first for update,
-    # rather than a possible retry job instance.
-    try:
-        job = Job.objects.get(guid=job_guid_root)
-    except ObjectDoesNotExist:
-        job = Job.objects.get(guid=job_guid)
+    )
 
-    # add taskcluster metadata if applicable
-    if all([k in job_datum for k in ['taskcluster_task_id', 'taskcluster_retry_id']]):
-        try:
-            TaskclusterMetadata.objects.create(
-                job=job,
-                task_id=job_datum['taskcluster_task_id'],
-                retry_id=job_datum['taskcluster_retry_id'],
-            )
-        except IntegrityError:
-            pass
-
-    # Update job with any data that would have changed
-    Job.objects.filter(id=job.id).update(
-        guid=job_guid,
-        signature=signature,
-        build_platform=build_platform,
-        machine_platform=machine_platform,
-        machine=machine,
-        option_collection_hash=option_collection_hash,
-        job_type=job_type,
-        job_group=job_group,
-        product=product,
-        result=result,
-        state=state,
-        tier=tier,
-        submit_time=submit_time,
-        start_time=start_time,
-        end_time=end_time,
-        last_modified=datetime.now(),
-        push_id=push_id,
+
+def _store_jobs(job_fields):
+    """
+    Create or update the Job rows for a list of job field values, in order.
+
+    If the job is a ``retry`` the ``job_guid`` will have a special
+    suffix on it.  But the matching ``pending``/``running`` job will not.
+    So we look up the existing jobs by the non-suffixed (root) ``job_guid``
+    as well, to find the right ``pending``/``running`` job and update it
+    with this ``retry`` job.
+
+    The jobs are applied to an in-memory copy of the existing rows, so that
+    several state changes of the same job can be written at once, with a
+    single insert for the new jobs and a single update for the existing ones.
+    """
+    guids = set()
+    for fields in job_fields:
+        guids.update([fields['guid'], get_guid_root(fields['guid'])])
+    jobs_by_guid = {job.guid: job for job in Job.objects.filter(guid__in=guids)}
+
+    default_failure_classification = reference_data_cache.get_or_set(
+        _reference_data_key(FailureClassification, name='not classified'),
+        lambda: FailureClassification.objects.get(name='not classified'),
     )
+    last_modified = datetime.now()
+
+    jobs = []
+    new_jobs = []
+    updated_jobs = {}
+    for fields in job_fields:
+        job_guid = fields['guid']
+        # Try the job_guid_root instance first for update, rather than a
+        # possible retry job instance.
+        job = jobs_by_guid.get(get_guid_root(job_guid)) or jobs_by_guid.get(job_guid)
+        if job is None:
+            job = Job(failure_classification=default_failure_classification, **fields)
+            new_jobs.append(job)
+        else:
+            # Update job with any data that would have changed
+            del jobs_by_guid[job.guid]
+            for name in JOB_UPDATE_FIELDS:
+                setattr(job, name, fields[name])
+            if job.id is not None:
+                updated_jobs[job.id] = job
+        job.last_modified = last_modified
+        jobs_by_guid[job_guid] = job
+        jobs.append(job)
+
+    # Existing jobs are updated first, since a retry moves the job to a new guid
+    # which frees the root guid for a new job in the same batch.
+    if updated_jobs:
+        Job.objects.bulk_update(updated_jobs.values(), JOB_UPDATE_FIELDS + ['last_modified'])
+
+    if new_jobs:
+        # A job created by another worker in the meantime makes this raise an
+        # IntegrityError, and the jobs are then stored again as updates.
+        Job.objects.bulk_create(new_jobs)
+        # not all databases return the ids of bulk inserted rows
+        job_ids = dict(
+            Job.objects.filter(guid__in=[job.guid for job in new_jobs]).values_list('guid', 'id')
+        )
+        for job in new_jobs:
+            job.id = job_ids[job.guid]
+
+    return jobs
+
 
-    log_refs = job_datum.get('log_references', [])
-    job_logs = []
-    if log_refs:
-        for log in log_refs:
+def _store_job_logs(jobs, job_data):
+    """
+    Get or create the JobLogs referenced by each job datum.
+
+    Returns the list of JobLog instances for each datum.
+    """
+    parse_status_map = dict([(k, v) for (v, k) in JobLog.STATUSES])
+    job_ids = {job.id for job in jobs}
+    job_logs_by_key = {
+        (job_log.job_id, job_log.name, job_log.url): job_log
+        for job_log in JobLog.objects.filter(job_id__in=job_ids)
+    }
+
+    keys = []
+    new_job_logs = []
+    for job, job_datum in zip(jobs, job_data):
+        datum_keys = []
+        for log in job_datum.get('log_references', []):
             name = log.get('name') or 'unknown'
             name = name[0:50]
 
             url = log.get('url') or 'unknown'
             url = url[0:255]
 
-            parse_status_map = dict([(k, v) for (v, k) in JobLog.STATUSES])
-            mapped_status = parse_status_map.get(log.get('parse_status'))
-            if mapped_status:
-                parse_status = mapped_status
-            else:
-                parse_status = JobLog.PENDING
+            key = (job.id, name, url)
+            if key not in job_logs_by_key:
+                parse_status = parse_status_map.get(log.get('parse_status'), JobLog.PENDING)
+                job_logs_by_key[key] = JobLog(job=job, name=name, url=url, status=parse_status)
+                new_job_logs.append(job_logs_by_key[key])
+            datum_keys.append(key)
+        keys.append(datum_keys)
 
-            jl, _ = JobLog.objects.get_or_create(
-                job=job, name=name, url=url, defaults={'status': parse_status}
-            )
+    if new_job_logs:
+        # logs stored by another worker in the meantime are left as they are
+        JobLog.objects.bulk_create(new_job_logs, ignore_conflicts=True)
+        job_logs_by_key = {
+            (job_log.job_id, job_log.name, job_log.url): job_log
+            for job_log in JobLog.objects.filter(job_id__in=job_ids)
+        }
+
+    return [[job_logs_by_key[key] for key in datum_keys] for datum_keys in keys]
+
+
+def _load_jobs(repository, data):
+    """
+    Load a list of job datums into the treeherder database
+
+    Returns the datums that were loaded, and the tasks parsing their logs to
+    schedule once they're committed.
+    """
+    push_ids = _get_push_ids(repository, data)
+
+    loaded_data = []
+    job_fields = []
+    for datum in data:
+        try:
+            # TODO: this might be a good place to check the datum against
+            # a JSON schema to ensure all the fields are valid.  Then
+            # the exception we caught would be much more informative.  That
+            # being said, if/when we transition to only using the pulse
+            # job consumer, then the data will always be vetted with a
+            # JSON schema before we get to this point.
+            job = datum['job']
+            revision = datum['revision']
+
+            push_id = push_ids.get(revision)
+            if push_id is None:
+                revision_field = 'revision__startswith' if len(revision) < 40 else 'revision'
+                filter_kwargs = {'repository': repository, revision_field: revision}
+                push_id = Push.objects.values_list('id', flat=True).get(**filter_kwargs)
+
+            job_fields.append(_get_job_fields(repository, job, push_id))
+            loaded_data.append(datum)
+        except Exception as e:
+            _report_job_error(datum, e)
+            # skip any jobs that hit errors in these stages.
+            continue
+
+    if not loaded_data:
+        return loaded_data, []
+
+    try:
+        with transaction.atomic():
+            log_parsing_tasks = _store_job_data(repository, loaded_data, job_fields)
+    except IntegrityError:
+        # left to `store_job_data` to retry
+        raise
+    except Exception:
+        if len(loaded_data) == 1:
+            raise
+
+        # A single bad job fails the whole batch, so store each on its own
+        # to only skip that one.
+        log_parsing_tasks = []
+        stored_data = []
+        for datum, fields in zip(loaded_data, job_fields):
+            try:
+                with transaction.atomic():
+                    log_parsing_tasks.extend(_store_job_data(repository, [datum], [fields]))
+            except IntegrityError:
+                raise
+            except Exception as e:
+                _report_job_error(datum, e)
+                continue
+            stored_data.append(datum)
+        loaded_data = stored_data
+
+    return loaded_data, log_parsing_tasks
+
+
+def _report_job_error(datum, e):
+    # Surface the error immediately unless running in production, where we'd
+    # rather report it on New Relic and not block storing the remaining jobs.
+    if 'DYNO' not in os.environ:
+        raise e
+
+    logger.exception(e)
+    # make more fields visible in new relic for the job
+    # where we encountered the error
+    datum.update(datum.get("job", {}))
+    newrelic.agent.record_exception(params=datum)
 
-            job_logs.append(jl)
 
-        _schedule_log_parsing(job, job_logs, result, repository)
+def _store_job_data(repository, loaded_data, job_fields):
+    """
+    Store the jobs of a list of datums, along with their metadata and logs.
 
-    return job_guid
+    Returns the tasks parsing their logs.
+    """
+    job_data = [datum['job'] for datum in loaded_data]
+    jobs = _store_jobs(job_fields)
 
+    # add taskcluster metadata if applicable
+    taskcluster_metadata = {
+        job.id: TaskclusterMetadata(
+            job=job,
+            task_id=job_datum['taskcluster_task_id'],
+            retry_id=job_datum['taskcluster_retry_id'],
+        )
+        for job, job_datum in zip(jobs, job_data)
+        if all([k in job_datum for k in ['taskcluster_task_id', 'taskcluster_retry_id']])
+    }
+    if taskcluster_metadata:
+        TaskclusterMetadata.objects.bulk_create(
+            taskcluster_metadata.values(), ignore_conflicts=True
+        )
+
+    log_parsing_tasks = []
+    for job, job_datum, job_logs in zip(jobs, job_data, _store_job_logs(jobs, job_data)):
+        if job_logs:
+            log_parsing_tasks.extend(
+                _get_log_parsing_tasks(
+                    job, job_logs, job_datum.get('result', 'unknown'), repository
+                )
+            )
+    return log_parsing_tasks
 
-def _schedule_log_parsing(job, job_logs, result, repository):
-    """Kick off the initial task that parses the log data.
+
+def _get_log_parsing_tasks(job, job_logs, result, repository):
+    """Get the initial tasks that parse the log data.
 
     log_data is a list of job log objects and the result for that job
     """
@@ -323,7 +618,10 @@ def _schedule_log_parsing(job, job_logs, result, repository):
         "mozilla-esr78",
     }
 
-    job_log_ids = []
+    # Logs that end up on the same queue are parsed by a single task, which
+    # downloads them concurrently.
+    job_log_ids_by_queue = defaultdict(list)
+    shed_job_logs = []
     for job_log in job_logs:
         # a log can be submitted already parsed.  So only schedule
         # a parsing task if it's ``pending``
@@ -336,8 +634,6 @@ def _schedule_log_parsing(job, job_logs, result, repository):
         if job_log.name not in task_types:
             continue
 
-        job_log_ids.append(job_log.id)
-
         # TODO: Replace the use of different queues for failures vs not with the
         # RabbitMQ priority feature (since the idea behind separate queues was
         # only to ensure failures are dealt with first if there is a backlog).
@@ -356,7 +652,27 @@ def _schedule_log_parsing(job, job_logs, result, repository):
             queue = 'log_parser'
             priority = "normal"
 
-        parse_logs.apply_async(queue=queue, args=[job.id, [job_log.id], priority])
+        # Tier 3 jobs aren't sheriffed, so their logs are the first to be left
+        # unparsed when the log parsers are behind.
+        if job.tier >= 3 and queue_depth.is_overloaded(queue, settings.LOG_PARSER_SHED_QUEUE_DEPTH):
+            newrelic.agent.record_custom_metric('Custom/LogParser/ShedLogs/%s' % queue, 1)
+            shed_job_logs.append(job_log)
+            continue
+
+        job_log_ids_by_queue[(queue, priority)].append(job_log.id)
+
+    if shed_job_logs:
+        # rather than have them show as being parsed forever
+        JobLog.objects.filter(id__in=[job_log.id for job_log in shed_job_logs]).update(
+            status=JobLog.SKIPPED_LOAD
+        )
+        for job_log in shed_job_logs:
+            job_log.status = JobLog.SKIPPED_LOAD
+
+    return [
+        parse_logs.signature(args=[job.id, job_log_ids, priority], queue=queue)
+        for (queue, priority), job_log_ids in job_log_ids_by_queue.items()
+    ]
 
 
 def store_job_data(repository, originalData):
@@ -419,53 +735,28 @@ def store_job_data(repository, originalData):
     if not data:
         return
 
-    superseded_job_guid_placeholders = []
-
-    # TODO: Refactor this now that store_job_data() is only over called with one job at a time.
-    for datum in data:
-        try:
-            # TODO: this might be a good place to check the datum against
-            # a JSON schema to ensure all the fields are valid.  Then
-            # the exception we caught would be much more informative.  That
-            # being said, if/when we transition to only using the pulse
-            # job consumer, then the data will always be vetted with a
-            # JSON schema before we get to this point.
-            job = datum['job']
-            revision = datum['revision']
-            superseded = datum.get('superseded', [])
-
-            revision_field = 'revision__startswith' if len(revision) < 40 else 'revision'
-            filter_kwargs = {'repository': repository, revision_field: revision}
-            push_id = Push.objects.values_list('id', flat=True).get(**filter_kwargs)
-
-            # load job
-            job_guid = _load_job(repository, job, push_id)
-
-            for superseded_guid in superseded:
-                superseded_job_guid_placeholders.append(
-                    # superseded by guid, superseded guid
-                    [job_guid, superseded_guid]
-                )
-        except Exception as e:
-            # Surface the error immediately unless running in production, where we'd
-            # rather report it on New Relic and not block storing the remaining jobs.
-            # TODO: Once buildbot support is removed, remove this as part of
-            # refactoring this method to process just one job at a time.
-            if 'DYNO' not in os.environ:
-                raise
+    try:
+        with transaction.atomic():
+            loaded_data, log_parsing_tasks = _load_jobs(repository, data)
+    except IntegrityError:
+        # A cached reference data row may have since been deleted by data
+        # cycling, or another worker may have stored some of these jobs in the
+        # meantime, so try once more without the cached data.
+        reference_data_cache.clear()
+        with transaction.atomic():
+            loaded_data, log_parsing_tasks = _load_jobs(repository, data)
 
-            logger.exception(e)
-            # make more fields visible in new relic for the job
-            # where we encountered the error
-            datum.update(datum.get("job", {}))
-            newrelic.agent.record_exception(params=datum)
+    # Update the result/state of any jobs that were superseded by those ingested above.
+    superseded_guids = [guid for datum in loaded_data for guid in datum.get('superseded', [])]
+    if superseded_guids:
+        Job.objects.filter(guid__in=superseded_guids).update(result='superseded', state='completed')
 
-            # skip any jobs that hit errors in these stages.
-            continue
+    # later datums take precedence, in the same way as when they were stored
+    job_states = {
+        datum['job']['job_guid']: datum['job'].get('state') or 'unknown' for datum in loaded_data
+    }
+    job_states.update({guid: 'completed' for guid in superseded_guids})
+    _cache_job_states(job_states)
 
-    # Update the result/state of any jobs that were superseded by those ingested above.
-    if superseded_job_guid_placeholders:
-        for (job_guid, superseded_by_guid) in superseded_job_guid_placeholders:
-            Job.objects.filter(guid=superseded_by_guid).update(
-                result='superseded', state='completed'
-            )
+    if log_parsing_tasks:
+        group(log_parsing_tasks).apply_async()
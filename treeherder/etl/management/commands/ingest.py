@@ -1,26 +1,36 @@
 import asyncio
+import copy
 import inspect
+import json
 import logging
 import os
+import time
 from concurrent.futures import ThreadPoolExecutor
 from threading import BoundedSemaphore
 
 import aiohttp
 import requests
+import slugid
 import taskcluster
 import taskcluster.aio
 import taskcluster_urls as liburls
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from treeherder.client.thclient import TreeherderClient
 from treeherder.config.settings import GITHUB_TOKEN
 from treeherder.etl.job_loader import JobLoader, MissingPushException
 from treeherder.etl.push_loader import PushLoader
 from treeherder.etl.pushlog import HgPushlogProcess, last_push_id_from_server
-from treeherder.etl.taskcluster_pulse.handler import EXCHANGE_EVENT_MAP, handleMessage
-from treeherder.model.models import Repository
+from treeherder.etl.taskcluster_pulse.handler import (
+    EXCHANGE_EVENT_MAP,
+    artifactNamesCacheKey,
+    handleMessage,
+)
+from treeherder.model.models import Push, Repository
 from treeherder.utils import github
 from treeherder.utils.github import fetch_json
 
@@ -44,6 +54,8 @@ for key, value in EXCHANGE_EVENT_MAP.items():
 # Semaphore to limit the number of threads opening DB connections when processing jobs
 conn_sem = BoundedSemaphore(50)
 
+DEFAULT_REPLAY_DIR = os.path.join('tests', 'sample_data', 'pulse_consumer')
+
 
 class Connection(object):
     def __enter__(self):
@@ -411,6 +423,144 @@ def ingest_git_pushes(project, dry_run=False):
             logger.warning("{} does not match {}".format(revision, th_pushes[index]["revision"]))
 
 
+def load_replay_data(replay_dir):
+    """
+    Load the pulse messages recorded in a directory, along with the definitions
+    of their tasks and, when recorded too, the artifact names of each run.
+
+    The directory holds the same files as ``DEFAULT_REPLAY_DIR``:
+    ``taskcluster_pulse_messages.json`` (a list of messages or a mapping of
+    them), ``taskcluster_tasks.json`` (a mapping of taskId to task definition)
+    and optionally ``taskcluster_artifacts.json`` (a mapping of "taskId/runId"
+    to the list of artifact names of that run).
+    """
+    with open(os.path.join(replay_dir, 'taskcluster_pulse_messages.json')) as f:
+        messages = json.load(f)
+    if isinstance(messages, dict):
+        messages = list(messages.values())
+
+    with open(os.path.join(replay_dir, 'taskcluster_tasks.json')) as f:
+        tasks = json.load(f)
+
+    artifacts = {}
+    artifacts_path = os.path.join(replay_dir, 'taskcluster_artifacts.json')
+    if os.path.exists(artifacts_path):
+        with open(artifacts_path) as f:
+            artifacts = json.load(f)
+
+    return messages, tasks, artifacts
+
+
+def replay_message(message, task, project, revision, scheduled):
+    """
+    Ingest a recorded pulse message into a push, like ``store_pulse_tasks`` would.
+
+    Returns the time since the message was scheduled for (or since it was
+    picked up, without a schedule), the number of queries made and the
+    exception raised, if any.
+    """
+    if scheduled is None:
+        scheduled = time.monotonic()
+    with Connection():
+        with CaptureQueriesContext(connection) as queries:
+            error = None
+            try:
+                # a new loop is needed in each thread, which is fine since the
+                # task definition and artifacts don't have to be fetched
+                runs = asyncio.run(handleMessage(message, task))
+                for run in runs:
+                    if run:
+                        run["origin"]["project"] = project
+                        run["origin"]["revision"] = revision
+                        JobLoader().process_job(run, message["root_url"])
+            except Exception as e:
+                error = e
+        num_queries = len(queries)
+    return time.monotonic() - scheduled, num_queries, error
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def replay_pulse_messages(options):
+    """
+    Replay recorded pulse messages as a reproducible ingestion benchmark.
+
+    The jobs are stored against a push of ``--project`` (the one for
+    ``--commit``, or else the latest), and nothing is fetched from Taskcluster.
+    Every repetition replays the messages as new tasks, so that they aren't
+    discarded as jobs we've already seen, and that the artifact names cached
+    for them don't stand in for those of the recorded tasks.
+    """
+    if not options["project"]:
+        raise CommandError('must specify the --project to store the replayed jobs into')
+    pushes = Push.objects.filter(repository__name=options["project"])
+    if options["commit"]:
+        pushes = pushes.filter(revision=options["commit"])
+    push = pushes.order_by('-time').first()
+    if push is None:
+        raise CommandError('no push to store the replayed jobs into, ingest one first')
+
+    messages, tasks, artifacts = load_replay_data(options["replay_dir"])
+    replayed = []
+    artifact_names = {}
+    for _ in range(options["repeat"]):
+        task_ids = {taskId: slugid.nice() for taskId in tasks}
+        for message in messages:
+            message = copy.deepcopy(message)
+            taskId = message["payload"]["status"]["taskId"]
+            message["payload"]["status"]["taskId"] = task_ids[taskId]
+            replayed.append((message, tasks[taskId]))
+            # reruns also handle the artifacts of the previous run
+            for runId in range(message["payload"]["runId"] + 1):
+                key = artifactNamesCacheKey(message["root_url"], task_ids[taskId], runId)
+                artifact_names[key] = artifacts.get("{}/{}".format(taskId, runId), [])
+    cache.set_many(artifact_names)
+
+    logger.info(
+        "Replaying %s messages into %s at %s",
+        len(replayed),
+        push,
+        "%s messages/sec" % options["rate"] if options["rate"] else "full speed",
+    )
+    replay_executor = ThreadPoolExecutor(max_workers=options["concurrency"])
+    interval = 1 / options["rate"] if options["rate"] else 0
+    start = time.monotonic()
+    futures = []
+    for index, (message, task) in enumerate(replayed):
+        scheduled = None
+        if interval:
+            # the latency includes waiting for a thread, as messages would in production
+            scheduled = start + index * interval
+            time.sleep(max(0, scheduled - time.monotonic()))
+        futures.append(
+            replay_executor.submit(
+                replay_message, message, task, options["project"], push.revision, scheduled
+            )
+        )
+    results = [future.result() for future in futures]
+    elapsed = time.monotonic() - start
+    replay_executor.shutdown()
+
+    latencies = [latency for (latency, _, _) in results]
+    errors = [error for (_, _, error) in results if error]
+    for error in errors[:10]:
+        logger.warning("Error replaying a message: %r", error)
+    logger.info("Messages: %s (%s errors) in %.2fs", len(results), len(errors), elapsed)
+    logger.info("Throughput: %.1f messages/sec", len(results) / elapsed)
+    logger.info(
+        "Latency: p50 %.1fms, p99 %.1fms",
+        percentile(latencies, 50) * 1000,
+        percentile(latencies, 99) * 1000,
+    )
+    logger.info(
+        "DB queries per message: %.1f",
+        sum(num_queries for (_, num_queries, _) in results) / len(results),
+    )
+
+
 class Command(BaseCommand):
     """Management command to ingest data from a single push."""
 
@@ -418,7 +568,9 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "ingestion_type", nargs=1, help="Type of ingestion to do: [task|hg-push|git-commit|pr]"
+            "ingestion_type",
+            nargs=1,
+            help="Type of ingestion to do: [task|hg-push|git-commit|pr|replay]",
         )
         parser.add_argument("-p", "--project", help="Hg repository to query (e.g. autoland)")
         parser.add_argument("-c", "--commit", "-r", "--revision", help="Commit/revision to import")
@@ -454,6 +606,31 @@ class Command(BaseCommand):
         parser.add_argument(
             "--last-n-pushes", type=int, help="fetch the last N pushes from the repository"
         )
+        parser.add_argument(
+            "--replay-dir",
+            dest="replay_dir",
+            default=DEFAULT_REPLAY_DIR,
+            help="Directory of recorded pulse messages to replay (default: %s)"
+            % DEFAULT_REPLAY_DIR,
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Number of messages to replay per second (default: as fast as possible)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=10,
+            help="Number of messages to replay at once",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Number of times to replay the recorded messages",
+        )
 
     def handle(self, *args, **options):
         typeOfIngestion = options["ingestion_type"][0]
@@ -476,5 +653,7 @@ class Command(BaseCommand):
                 ingest_git_pushes(options["project"], options["dryRun"])
         elif typeOfIngestion == "push":
             ingest_hg_push(options)
+        elif typeOfIngestion == "replay":
+            replay_pulse_messages(options)
         else:
             raise Exception('Please check the code for valid ingestion types.')
@@ -7,6 +7,7 @@ from typing import List, Tuple
 import simplejson as json
 
 from django.conf import settings
+from django.db import IntegrityError
 from treeherder.log_parser.utils import validate_perf_data
 from treeherder.model.models import Job, OptionCollection
 from treeherder.perf.models import (
@@ -15,7 +16,7 @@ from treeherder.perf.models import (
     PerformanceFramework,
     PerformanceSignature,
 )
-from treeherder.perf.tasks import generate_alerts
+from treeherder.perf.tasks import schedule_alerts
 
 logger = logging.getLogger(__name__)
 
@@ -47,25 +48,82 @@ def _order_and_concat(words: List) -> str:
     return ' '.join(sorted(words))
 
 
-def _create_or_update_signature(repository, signature_hash, framework, application, defaults):
-    signature, created = PerformanceSignature.objects.get_or_create(
-        repository=repository,
-        signature_hash=signature_hash,
-        framework=framework,
-        application=application,
-        defaults=defaults,
-    )
-    if not created:
-        if signature.last_updated > defaults['last_updated']:
-            defaults['last_updated'] = signature.last_updated
-        signature, _ = PerformanceSignature.objects.update_or_create(
+def _create_or_update_signatures(repository, framework, application, signatures):
+    """
+    Create or update the signatures of a repository, framework & application in
+    bulk, given the properties of each by hash.
+
+    The ``last_updated`` of an existing signature is never moved back.
+    Returns the signatures by hash.
+    """
+    existing = {
+        signature.signature_hash: signature
+        for signature in PerformanceSignature.objects.filter(
             repository=repository,
-            signature_hash=signature_hash,
             framework=framework,
             application=application,
-            defaults=defaults,
+            signature_hash__in=list(signatures),
         )
-    return signature
+    }
+
+    new_signatures = []
+    updated_signatures = []
+    updated_fields = set()
+    for signature_hash, defaults in signatures.items():
+        signature = existing.get(signature_hash)
+        if signature is None:
+            new_signatures.append(
+                PerformanceSignature(
+                    repository=repository,
+                    framework=framework,
+                    application=application,
+                    signature_hash=signature_hash,
+                    **defaults,
+                )
+            )
+            continue
+
+        if signature.last_updated > defaults['last_updated']:
+            defaults = dict(defaults, last_updated=signature.last_updated)
+        changed_fields = [
+            name for name, value in defaults.items() if _field_changed(signature, name, value)
+        ]
+        if changed_fields:
+            for name in changed_fields:
+                setattr(signature, name, defaults[name])
+            updated_signatures.append(signature)
+            updated_fields.update(changed_fields)
+
+    if updated_signatures:
+        PerformanceSignature.objects.bulk_update(updated_signatures, sorted(updated_fields))
+    if new_signatures:
+        # another job of the same kind may have created some of them meanwhile
+        PerformanceSignature.objects.bulk_create(new_signatures, ignore_conflicts=True)
+        # bulk_create doesn't set the ids on MySQL
+        existing.update(
+            (signature.signature_hash, signature)
+            for signature in PerformanceSignature.objects.filter(
+                repository=repository,
+                framework=framework,
+                application=application,
+                signature_hash__in=[signature.signature_hash for signature in new_signatures],
+            )
+        )
+        # as when a signature conflicts with another one on its public names
+        missing = [h for h in signatures if h not in existing]
+        if missing:
+            raise IntegrityError(
+                "Could not create the performance signatures %s" % ', '.join(missing)
+            )
+    return existing
+
+
+def _field_changed(signature, name, value):
+    field = PerformanceSignature._meta.get_field(name)
+    if field.is_relation:
+        # compare the ids, rather than fetching the related objects
+        return getattr(signature, field.attname) != (value.pk if value is not None else None)
+    return getattr(signature, name) != value
 
 
 def _deduce_push_timestamp(perf_datum: dict, job_push_time: datetime) -> Tuple[datetime, bool]:
@@ -82,8 +140,9 @@ def _deduce_push_timestamp(perf_datum: dict, job_push_time: datetime) -> Tuple[d
     return (multidata_timestamp or job_push_time), is_multi_commit
 
 
-def _load_perf_datum(job: Job, perf_datum: dict):
-    validate_perf_data(perf_datum)
+def _load_perf_datum(job: Job, perf_datum: dict, validated=False):
+    if not validated:
+        validate_perf_data(perf_datum)
 
     extra_properties = {}
     reference_data = {
@@ -111,10 +170,20 @@ def _load_perf_datum(job: Job, perf_datum: dict):
         )
         return
     application = _get_application_name(perf_datum)
+    deduced_timestamp, is_multi_commit = _deduce_push_timestamp(perf_datum, job.push.time)
+
+    # the properties of the summary & subtest signatures, by hash
+    summary_signatures = {}
+    subtest_signatures = {}
+    # the summary signature hash of each subtest signature which has one
+    parent_hashes = {}
+    # the value of the datum of each signature, and whether to generate alerts
+    # for it when the signature has no preference
+    values = {}
+    alert_by_default = {}
     for suite in perf_datum['suites']:
         suite_extra_properties = copy.copy(extra_properties)
         ordered_tags = _order_and_concat(suite.get('tags', []))
-        deduced_timestamp, is_multi_commit = _deduce_push_timestamp(perf_datum, job.push.time)
         suite_extra_options = ''
 
         if suite.get('extraOptions'):
@@ -130,139 +199,174 @@ def _load_perf_datum(job: Job, perf_datum: dict):
             summary_properties.update(reference_data)
             summary_properties.update(suite_extra_properties)
             summary_signature_hash = _get_signature_hash(summary_properties)
-            signature = _create_or_update_signature(
-                job.repository,
-                summary_signature_hash,
-                framework,
-                application,
-                {
-                    'test': '',
-                    'suite': suite['name'],
-                    'suite_public_name': suite.get('publicName'),
-                    'option_collection': option_collection,
-                    'platform': job.machine_platform,
-                    'tags': ordered_tags,
-                    'extra_options': suite_extra_options,
-                    'measurement_unit': suite.get('unit'),
-                    'lower_is_better': suite.get('lowerIsBetter', True),
-                    'has_subtests': True,
-                    # these properties below can be either True, False, or null
-                    # (None). Null indicates no preference has been set.
-                    'should_alert': suite.get('shouldAlert'),
-                    'alert_change_type': PerformanceSignature._get_alert_change_type(
-                        suite.get('alertChangeType')
-                    ),
-                    'alert_threshold': suite.get('alertThreshold'),
-                    'min_back_window': suite.get('minBackWindow'),
-                    'max_back_window': suite.get('maxBackWindow'),
-                    'fore_window': suite.get('foreWindow'),
-                    'last_updated': job.push.time,
-                },
-            )
-
-            (suite_datum, datum_created) = PerformanceDatum.objects.get_or_create(
-                repository=job.repository,
-                job=job,
-                push=job.push,
-                signature=signature,
-                push_timestamp=deduced_timestamp,
-                defaults={'value': suite['value']},
-            )
-            if suite_datum.should_mark_as_multi_commit(is_multi_commit, datum_created):
-                # keep a register with all multi commit perf data
-                MultiCommitDatum.objects.create(perf_datum=suite_datum)
-            if (
-                signature.should_alert is not False
-                and datum_created
-                and job.repository.performance_alerts_enabled
-            ):
-                generate_alerts.apply_async(args=[signature.id], queue='generate_perf_alerts')
+            summary_signatures[summary_signature_hash] = {
+                'test': '',
+                'suite': suite['name'],
+                'suite_public_name': suite.get('publicName'),
+                'option_collection': option_collection,
+                'platform': job.machine_platform,
+                'tags': ordered_tags,
+                'extra_options': suite_extra_options,
+                'measurement_unit': suite.get('unit'),
+                'lower_is_better': suite.get('lowerIsBetter', True),
+                'has_subtests': True,
+                # these properties below can be either True, False, or null
+                # (None). Null indicates no preference has been set.
+                'should_alert': suite.get('shouldAlert'),
+                'alert_change_type': PerformanceSignature._get_alert_change_type(
+                    suite.get('alertChangeType')
+                ),
+                'alert_threshold': suite.get('alertThreshold'),
+                'min_back_window': suite.get('minBackWindow'),
+                'max_back_window': suite.get('maxBackWindow'),
+                'fore_window': suite.get('foreWindow'),
+                'last_updated': job.push.time,
+            }
+            values.setdefault(summary_signature_hash, suite['value'])
+            alert_by_default.setdefault(summary_signature_hash, True)
 
         for subtest in suite['subtests']:
             subtest_properties = {'suite': suite['name'], 'test': subtest['name']}
             subtest_properties.update(reference_data)
             subtest_properties.update(suite_extra_properties)
 
-            summary_signature = None
             if summary_signature_hash is not None:
                 subtest_properties.update({'parent_signature': summary_signature_hash})
-                summary_signature = PerformanceSignature.objects.get(
-                    repository=job.repository,
-                    framework=framework,
-                    signature_hash=summary_signature_hash,
-                    application=application,
-                )
             subtest_signature_hash = _get_signature_hash(subtest_properties)
-            value = list(
-                subtest['value']
-                for subtest in suite['subtests']
-                if subtest['name'] == subtest_properties['test']
-            )
-            signature = _create_or_update_signature(
-                job.repository,
-                subtest_signature_hash,
-                framework,
-                application,
-                {
-                    'test': subtest_properties['test'],
-                    'suite': suite['name'],
-                    'test_public_name': subtest.get('publicName'),
-                    'suite_public_name': suite.get('publicName'),
-                    'option_collection': option_collection,
-                    'platform': job.machine_platform,
-                    'tags': ordered_tags,
-                    'extra_options': suite_extra_options,
-                    'measurement_unit': subtest.get('unit'),
-                    'lower_is_better': subtest.get('lowerIsBetter', True),
-                    'has_subtests': False,
-                    # these properties below can be either True, False, or
-                    # null (None). Null indicates no preference has been
-                    # set.
-                    'should_alert': subtest.get('shouldAlert'),
-                    'alert_change_type': PerformanceSignature._get_alert_change_type(
-                        subtest.get('alertChangeType')
-                    ),
-                    'alert_threshold': subtest.get('alertThreshold'),
-                    'min_back_window': subtest.get('minBackWindow'),
-                    'max_back_window': subtest.get('maxBackWindow'),
-                    'fore_window': subtest.get('foreWindow'),
-                    'parent_signature': summary_signature,
-                    'last_updated': job.push.time,
-                },
-            )
-            (subtest_datum, datum_created) = PerformanceDatum.objects.get_or_create(
+            subtest_signatures[subtest_signature_hash] = {
+                'test': subtest_properties['test'],
+                'suite': suite['name'],
+                'test_public_name': subtest.get('publicName'),
+                'suite_public_name': suite.get('publicName'),
+                'option_collection': option_collection,
+                'platform': job.machine_platform,
+                'tags': ordered_tags,
+                'extra_options': suite_extra_options,
+                'measurement_unit': subtest.get('unit'),
+                'lower_is_better': subtest.get('lowerIsBetter', True),
+                'has_subtests': False,
+                # these properties below can be either True, False, or
+                # null (None). Null indicates no preference has been
+                # set.
+                'should_alert': subtest.get('shouldAlert'),
+                'alert_change_type': PerformanceSignature._get_alert_change_type(
+                    subtest.get('alertChangeType')
+                ),
+                'alert_threshold': subtest.get('alertThreshold'),
+                'min_back_window': subtest.get('minBackWindow'),
+                'max_back_window': subtest.get('maxBackWindow'),
+                'fore_window': subtest.get('foreWindow'),
+                'last_updated': job.push.time,
+            }
+            if summary_signature_hash is not None:
+                parent_hashes[subtest_signature_hash] = summary_signature_hash
+            # by default if there is no summary, we should schedule a
+            # generate alerts task for the subtest, since we have new data
+            # (this can be over-ridden by the optional "should alert"
+            # property)
+            values.setdefault(subtest_signature_hash, subtest['value'])
+            alert_by_default.setdefault(subtest_signature_hash, suite.get('value') is None)
+
+    # the summary signatures are needed first, as the parents of the subtest ones
+    signatures = _create_or_update_signatures(
+        job.repository, framework, application, summary_signatures
+    )
+    for subtest_signature_hash, defaults in subtest_signatures.items():
+        parent_hash = parent_hashes.get(subtest_signature_hash)
+        defaults['parent_signature'] = signatures[parent_hash] if parent_hash else None
+    signatures.update(
+        _create_or_update_signatures(job.repository, framework, application, subtest_signatures)
+    )
+
+    created_signatures = _create_perf_data(
+        job, deduced_timestamp, is_multi_commit, [(signatures[h], v) for h, v in values.items()]
+    )
+
+    if job.repository.performance_alerts_enabled:
+        schedule_alerts(
+            [
+                signature.id
+                for signature in created_signatures
+                if signature.should_alert
+                or (signature.should_alert is None and alert_by_default[signature.signature_hash])
+            ]
+        )
+
+
+def _create_perf_data(job, push_timestamp, is_multi_commit, signature_values):
+    """
+    Create the datums of a job for each of the given signatures & values, in
+    bulk, unless they already exist.
+
+    Returns the signatures whose datum was created.
+    """
+    datums = PerformanceDatum.objects.filter(
+        repository=job.repository, job=job, push=job.push, push_timestamp=push_timestamp
+    )
+    existing_ids = set(
+        datums.filter(signature__in=[signature for signature, _ in signature_values]).values_list(
+            'signature_id', flat=True
+        )
+    )
+    signature_values = [
+        (signature, value)
+        for signature, value in signature_values
+        if signature.id not in existing_ids
+    ]
+    if not signature_values:
+        return []
+
+    # the job's data may be stored concurrently, when its artifact is submitted twice
+    PerformanceDatum.objects.bulk_create(
+        (
+            PerformanceDatum(
                 repository=job.repository,
                 job=job,
                 push=job.push,
                 signature=signature,
-                push_timestamp=deduced_timestamp,
-                defaults={'value': value[0]},
+                push_timestamp=push_timestamp,
+                value=value,
             )
-            if subtest_datum.should_mark_as_multi_commit(is_multi_commit, datum_created):
-                # keep a register with all multi commit perf data
-                MultiCommitDatum.objects.create(perf_datum=subtest_datum)
+            for signature, value in signature_values
+        ),
+        ignore_conflicts=True,
+    )
+    signatures = [signature for signature, _ in signature_values]
+
+    if is_multi_commit:
+        # keep a register with all multi commit perf data
+        MultiCommitDatum.objects.bulk_create(
+            (
+                MultiCommitDatum(perf_datum_id=datum_id)
+                for datum_id in datums.filter(signature__in=signatures).values_list('id', flat=True)
+            ),
+            ignore_conflicts=True,
+        )
+
+    # as `PerformanceDatum.save()` would have done
+    outdated = [signature for signature in signatures if signature.last_updated < push_timestamp]
+    if outdated:
+        PerformanceSignature.objects.filter(id__in=[s.id for s in outdated]).update(
+            last_updated=push_timestamp
+        )
+        for signature in outdated:
+            signature.last_updated = push_timestamp
+
+    return signatures
 
-            # by default if there is no summary, we should schedule a
-            # generate alerts task for the subtest, since we have new data
-            # (this can be over-ridden by the optional "should alert"
-            # property)
-            if (
-                (
-                    signature.should_alert
-                    or (signature.should_alert is None and suite.get('value') is None)
-                )
-                and datum_created
-                and job.repository.performance_alerts_enabled
-            ):
-                generate_alerts.apply_async(args=[signature.id], queue='generate_perf_alerts')
 
+def store_performance_artifact(job, artifact, validated=False):
+    """
+    Store the performance data of an artifact.
 
-def store_performance_artifact(job, artifact):
+    ``validated`` skips validating the data again, when the log parser has
+    already done so.
+    """
     blob = json.loads(artifact['blob'])
     performance_data = blob['performance_data']
 
     if isinstance(performance_data, list):
         for perfdatum in performance_data:
-            _load_perf_datum(job, perfdatum)
+            _load_perf_datum(job, perfdatum, validated)
     else:
-        _load_perf_datum(job, performance_data)
+        _load_perf_datum(job, performance_data, validated)
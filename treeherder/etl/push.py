@@ -7,6 +7,10 @@ from treeherder.model.models import Commit, Push
 
 logger = logging.getLogger(__name__)
 
+# How many rows are inserted or updated per query, so that backfilling many
+# pushes (with up to hundreds of commits each) doesn't make huge queries.
+BULK_BATCH_SIZE = 500
+
 
 def store_push(repository, push_dict):
     push_revision = push_dict.get('revision')
@@ -21,12 +25,97 @@ def store_push(repository, push_dict):
                 'time': datetime.utcfromtimestamp(push_dict['push_timestamp']),
             },
         )
-        for revision in push_dict['revisions']:
-            Commit.objects.update_or_create(
-                push=push,
+        _store_commits(
+            Commit(
+                push_id=push.id,
                 revision=revision['revision'],
-                defaults={'author': revision['author'], 'comments': revision['comment']},
+                author=revision['author'],
+                comments=revision['comment'],
             )
+            for revision in push_dict['revisions']
+        )
+
+
+def _store_commits(commits):
+    """
+    Insert or update ``Commit`` instances, matching them to the stored commits
+    by push and revision, with a constant number of queries.
+    """
+    # a commit listed twice is stored once, with its last values
+    commits = {(commit.push_id, commit.revision): commit for commit in commits}
+    if not commits:
+        return
+
+    updated_commits = []
+    for commit in Commit.objects.filter(push_id__in={push_id for (push_id, _) in commits}):
+        new_commit = commits.pop((commit.push_id, commit.revision), None)
+        if new_commit and (new_commit.author, new_commit.comments) != (
+            commit.author,
+            commit.comments,
+        ):
+            new_commit.id = commit.id
+            updated_commits.append(new_commit)
+
+    if updated_commits:
+        Commit.objects.bulk_update(
+            updated_commits, ['author', 'comments'], batch_size=BULK_BATCH_SIZE
+        )
+    if commits:
+        Commit.objects.bulk_create(commits.values(), batch_size=BULK_BATCH_SIZE)
+
+
+def store_pushes(repository, pushes):
+    """
+    Store several pushes in the format described by ``store_push_data``.
+
+    The pushes that aren't stored yet are inserted along with their commits
+    in bulk, while the ones that are get updated with ``store_push``. If any
+    of the pushes is stored by someone else in the meantime an IntegrityError
+    is raised and none of the new pushes are stored.
+    """
+    new_pushes = {}
+    for push_dict in pushes:
+        if not push_dict.get('revision'):
+            raise ValueError("Push must have a revision " "associated with it!")
+        new_pushes[push_dict['revision']] = push_dict
+
+    for revision in Push.objects.filter(repository=repository, revision__in=new_pushes).values_list(
+        'revision', flat=True
+    ):
+        store_push(repository, new_pushes.pop(revision))
+
+    if not new_pushes:
+        return
+
+    with transaction.atomic():
+        Push.objects.bulk_create(
+            [
+                Push(
+                    repository=repository,
+                    revision=revision,
+                    author=push_dict['author'],
+                    time=datetime.utcfromtimestamp(push_dict['push_timestamp']),
+                )
+                for (revision, push_dict) in new_pushes.items()
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        # not all databases return the ids of bulk inserted rows
+        push_ids = dict(
+            Push.objects.filter(repository=repository, revision__in=new_pushes).values_list(
+                'revision', 'id'
+            )
+        )
+        _store_commits(
+            Commit(
+                push_id=push_ids[revision],
+                revision=commit['revision'],
+                author=commit['author'],
+                comments=commit['comment'],
+            )
+            for (revision, push_dict) in new_pushes.items()
+            for commit in push_dict['revisions']
+        )
 
 
 def store_push_data(repository, pushes):
@@ -82,20 +82,11 @@ class GithubTransformer:
         return info
 
     def process_push(self, push_data):
-        commits = self.get_cleaned_commits(push_data)
-        head_commit = commits[-1]
-        push = {
-            "revision": head_commit["sha"],
-            # A push can be co-authored
-            # The author's date is when the code was committed locally by the author
-            # The committer's date is the info as to when the PR is merged (committed) into master
-            "push_timestamp": to_timestamp(head_commit["commit"]["committer"]["date"]),
-            # We want the original author's email to show up in the UI
-            "author": head_commit["commit"]["author"]["email"],
-        }
-
+        # The commits are transformed in a single pass, since pushes can have
+        # thousands of them, with the last one being the head of the push.
         revisions = []
-        for commit in commits:
+        head_commit = None
+        for commit in self.get_cleaned_commits(push_data):
             revisions.append(
                 {
                     "comment": commit["commit"]["message"],
@@ -105,12 +96,27 @@ class GithubTransformer:
                     "revision": commit["sha"],
                 }
             )
+            head_commit = commit
 
-        push["revisions"] = revisions
-        return push
+        if head_commit is None:
+            raise PulsePushError("Push has no commits")
+
+        return {
+            "revision": head_commit["sha"],
+            # A push can be co-authored
+            # The author's date is when the code was committed locally by the author
+            # The committer's date is the info as to when the PR is merged (committed) into master
+            "push_timestamp": to_timestamp(head_commit["commit"]["committer"]["date"]),
+            # We want the original author's email to show up in the UI
+            "author": head_commit["commit"]["author"]["email"],
+            "revisions": revisions,
+        }
 
     def get_cleaned_commits(self, commits):
-        """Allow a subclass to change the order of the commits"""
+        """
+        Allow a subclass to change the order of the commits, returning any
+        iterable of them (it's only iterated over once)
+        """
         return commits
 
 
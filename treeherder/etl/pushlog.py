@@ -1,17 +1,25 @@
+import asyncio
 import logging
 import traceback
 
+import aiohttp
 import newrelic.agent
 import requests
+from django.conf import settings
 from django.core.cache import cache
 
 from treeherder.etl.exceptions import CollectionNotStoredException
-from treeherder.etl.push import store_push
+from treeherder.etl.push import store_push, store_pushes
 from treeherder.model.models import Repository
 from treeherder.utils.github import fetch_json
 
 logger = logging.getLogger(__name__)
 ONE_WEEK_IN_SECONDS = 604800
+PUSHLOG_URL = '{}/json-pushes/?full=1&version=2'
+LAST_PUSH_ID_CACHE_KEY = '{}:last_push_id'
+PUSHLOG_VALIDATORS_CACHE_KEY = '{}:pushlog_validators'
+# The maximum number of pushlogs fetched at once by HgPushlogPoller
+PUSHLOG_FETCH_CONCURRENCY = 20
 
 
 def last_push_id_from_server(repo):
@@ -53,7 +61,7 @@ class HgPushlogProcess:
         }
 
     def run(self, source_url, repository_name, changeset=None, last_push_id=None):
-        cache_key = '{}:last_push_id'.format(repository_name)
+        cache_key = LAST_PUSH_ID_CACHE_KEY.format(repository_name)
         if not last_push_id:
             # get the last object seen from cache. this will
             # reduce the number of pushes processed every time
@@ -104,6 +112,16 @@ class HgPushlogProcess:
                 )
                 extracted_content = self.extract(source_url)
 
+        return self.load(
+            repository_name, extracted_content, cache_key=None if changeset else cache_key
+        )
+
+    def load(self, repository_name, extracted_content, cache_key=None):
+        """
+        Store the pushes of a json-pushes response, returning the top revision
+        of the last push. The id of the last push is cached under ``cache_key``
+        when given, so that the next run can fetch from that point onwards.
+        """
         pushes = extracted_content['pushes']
 
         # `pushes` could be empty if there are no new ones since we last fetched
@@ -114,17 +132,31 @@ class HgPushlogProcess:
         last_push = pushes[str(last_push_id)]
         top_revision = last_push["changesets"][-1]["node"]
 
-        errors = []
         repository = Repository.objects.get(name=repository_name)
 
-        for push in pushes.values():
-            if not push['changesets']:
-                # A push without commits means it was marked as obsolete (see bug 1286426).
-                # Without them it's not possible to calculate the push revision required for ingestion.
-                continue
+        # A push without commits means it was marked as obsolete (see bug 1286426).
+        # Without them it's not possible to calculate the push revision required for ingestion.
+        transformed_pushes = [
+            self.transform_push(push) for push in pushes.values() if push['changesets']
+        ]
+
+        try:
+            store_pushes(repository, transformed_pushes)
+        except Exception:
+            # store the pushes one at a time, to find the ones which can't be
+            logger.debug("Could not store the pushes of %s in bulk", repository_name, exc_info=True)
+            self.store_individually(repository, transformed_pushes)
 
+        if cache_key:
+            cache.set(cache_key, last_push_id, ONE_WEEK_IN_SECONDS)
+
+        return top_revision
+
+    def store_individually(self, repository, pushes):
+        errors = []
+        for push in pushes:
             try:
-                store_push(repository, self.transform_push(push))
+                store_push(repository, push)
             except Exception:
                 newrelic.agent.record_exception()
                 errors.append(
@@ -138,8 +170,158 @@ class HgPushlogProcess:
         if errors:
             raise CollectionNotStoredException(errors)
 
-        if not changeset:
-            # only cache the last push if we're not fetching a specific changeset
-            cache.set(cache_key, last_push_id, ONE_WEEK_IN_SECONDS)
 
-        return top_revision
+class HgPushlogPoller:
+    """
+    Fetch the pushlogs of several repositories concurrently and store their new pushes.
+
+    This does the same as running ``HgPushlogProcess`` for each repository,
+    sharing its cache of the last push id of each repository, but with all
+    the requests made at once over a pool of connections. The response of
+    each request is cached too, so that the following one can be made
+    conditional and doesn't transfer or parse anything until there are new
+    pushes.
+    """
+
+    def __init__(self, concurrency=PUSHLOG_FETCH_CONCURRENCY, timeout=30):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.process = HgPushlogProcess()
+
+    def run(self, repositories):
+        last_push_id_keys = {
+            repository.name: LAST_PUSH_ID_CACHE_KEY.format(repository.name)
+            for repository in repositories
+        }
+        validators_keys = {
+            repository.name: PUSHLOG_VALIDATORS_CACHE_KEY.format(repository.name)
+            for repository in repositories
+        }
+        cached = cache.get_many(list(last_push_id_keys.values()) + list(validators_keys.values()))
+
+        loop = asyncio.get_event_loop()
+        responses = loop.run_until_complete(
+            self.fetch_all(
+                [
+                    (
+                        repository,
+                        cached.get(last_push_id_keys[repository.name]),
+                        cached.get(validators_keys[repository.name]),
+                    )
+                    for repository in repositories
+                ]
+            )
+        )
+
+        errors = []
+        for repository, response in zip(repositories, responses):
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                if response is None:
+                    # not modified since the last request
+                    continue
+                extracted_content, validators, reset = response
+                if reset:
+                    cache.delete(last_push_id_keys[repository.name])
+                self.process.load(
+                    repository.name, extracted_content, cache_key=last_push_id_keys[repository.name]
+                )
+                # the response is only known to be stored once loaded
+                if validators:
+                    cache.set(validators_keys[repository.name], validators, ONE_WEEK_IN_SECONDS)
+            except CollectionNotStoredException as e:
+                errors.extend(e.error_list)
+            except Exception:
+                newrelic.agent.record_exception()
+                errors.append(
+                    {
+                        "project": repository,
+                        "collection": "result_set",
+                        "message": traceback.format_exc(),
+                    }
+                )
+
+        if errors:
+            raise CollectionNotStoredException(errors)
+
+    async def fetch_all(self, repositories):
+        """
+        Fetch the pushlog of each ``(repository, last_push_id, validators)``,
+        returning the results of ``fetch`` (or the exception it raised) in order.
+        """
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        headers = {
+            'Accept': 'application/json',
+            'User-Agent': 'treeherder/{}'.format(settings.SITE_HOSTNAME),
+        }
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(
+            connector=connector, headers=headers, timeout=timeout
+        ) as session:
+            return await asyncio.gather(
+                *[self.fetch(session, *args) for args in repositories], return_exceptions=True
+            )
+
+    async def fetch(self, session, repository, last_push_id, validators):
+        """
+        Fetch the pushes of a repository since ``last_push_id``.
+
+        Returns None if nothing changed since the request ``validators`` were
+        recorded for, otherwise a tuple of the json-pushes response, the
+        validators of that response and whether the repository was reset.
+        """
+        source_url = PUSHLOG_URL.format(repository.url)
+        if not last_push_id:
+            extracted_content, validators = await self.extract(session, source_url)
+            return extracted_content, validators, False
+
+        startid_url = "{}&startID={}".format(source_url, last_push_id)
+        extracted_content, validators = await self.extract(session, startid_url, validators)
+        if extracted_content is None:
+            return None
+
+        if extracted_content['lastpushid'] < last_push_id:
+            # see HgPushlogProcess.run
+            logger.warning(
+                "Got a ``lastpushid`` value of %s lower than the cached value of %s "
+                "due to Mercurial repo reset. Getting latest changes for '%s' instead",
+                extracted_content['lastpushid'],
+                last_push_id,
+                repository.name,
+            )
+            extracted_content, validators = await self.extract(session, source_url)
+            return extracted_content, validators, True
+
+        return extracted_content, validators, False
+
+    async def extract(self, session, url, validators=None):
+        """
+        Fetch a json-pushes url, conditionally if ``validators`` of an earlier
+        response for the same url are given.
+
+        Returns the response (None if it wasn't modified) and its validators.
+        """
+        headers = {}
+        if validators and validators['url'] == url:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return None, validators
+            if response.status >= 400:
+                logger.warning("HTTPError %s fetching: %s", response.status, url)
+            response.raise_for_status()
+            extracted_content = await response.json()
+            validators = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+
+        if not (validators['etag'] or validators['last_modified']):
+            validators = None
+        return extracted_content, validators
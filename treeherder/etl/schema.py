@@ -1,5 +1,7 @@
+import functools
 import os
 
+import jsonschema
 import yaml
 
 
@@ -12,3 +14,28 @@ def get_json_schema(filename):
     with open(file_path) as f:
         schema = yaml.load(f, Loader=yaml.FullLoader)
     return schema
+
+
+@functools.lru_cache(maxsize=None)
+def get_json_schema_validator(filename):
+    """
+    Get a validator for a JSON Schema by filename.
+
+    Reading and checking the schema is most of the cost of
+    ``jsonschema.validate()``, so it is only done once per process.
+    """
+    schema = get_json_schema(filename)
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+def validate(instance, filename):
+    """
+    Validate an instance against a JSON Schema by filename, raising the same
+    ``jsonschema.ValidationError`` as ``jsonschema.validate()`` would.
+    """
+    validator = get_json_schema_validator(filename)
+    error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+    if error is not None:
+        raise error
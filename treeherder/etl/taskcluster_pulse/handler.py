@@ -2,15 +2,18 @@
 import asyncio
 import logging
 import os
+import weakref
 
 import environ
 import jsonschema
+import newrelic.agent
 import slugid
 import taskcluster
 import taskcluster.aio
 import taskcluster_urls
+from django.core.cache import cache
 
-from treeherder.etl.schema import get_json_schema
+from treeherder.etl.schema import validate
 from treeherder.etl.taskcluster_pulse.parse_route import parseRoute
 
 env = environ.Env()
@@ -19,6 +22,19 @@ loop = asyncio.get_event_loop()
 projectsToIngest = env("PROJECTS_TO_INGEST", default=None)
 session = taskcluster.aio.createSession(loop=loop)
 
+# A task emits several messages (pending, running, completed...), so task
+# definitions are cached to avoid fetching them again for each one.
+TASK_DEFINITION_CACHE_TIMEOUT = 60 * 60 * 6
+# Messages from these exchanges always fetch the task definition from Taskcluster
+taskDefinitionCacheSkipExchanges = env.list("TASK_DEFINITION_CACHE_SKIP_EXCHANGES", default=[])
+
+ARTIFACTS_CACHE_TIMEOUT = 60 * 60
+# Listing artifacts is the slowest part of handling a resolved task, so the
+# number of concurrent requests made for a batch of messages is bounded.
+ARTIFACTS_FETCH_CONCURRENCY = env.int("ARTIFACTS_FETCH_CONCURRENCY", default=10)
+# the semaphore bounding them on each event loop
+artifactsSemaphores = weakref.WeakKeyDictionary()
+
 
 # Build a mapping from exchange name to task status
 EXCHANGE_EVENT_MAP = {
@@ -94,7 +110,7 @@ def validateTask(task):
         logger.debug("Task metadata is missing Treeherder job configuration.")
         return False
     try:
-        jsonschema.validate(treeherderMetadata, get_json_schema("task-treeherder-config.yml"))
+        validate(treeherderMetadata, "task-treeherder-config.yml")
     except (jsonschema.ValidationError, jsonschema.SchemaError) as e:
         logger.error("JSON Schema validation error during Taskcluser message ingestion: %s", e)
         return False
@@ -153,6 +169,44 @@ def ignore_task(task, taskId, rootUrl, project):
     return ignore
 
 
+# Only the parts of a task definition used during ingestion are cached
+def slimTaskDefinition(task):
+    return {
+        "created": task["created"],
+        "extra": {"treeherder": task.get("extra", {}).get("treeherder")},
+        "metadata": task["metadata"],
+        "payload": {"env": task.get("payload", {}).get("env", {})},
+        "routes": task.get("routes", []),
+        "taskGroupId": task["taskGroupId"],
+        "workerType": task["workerType"],
+    }
+
+
+async def fetchTaskDefinition(rootUrl, taskId, exchange=None):
+    if exchange in taskDefinitionCacheSkipExchanges:
+        asyncQueue = taskcluster.aio.Queue({"rootUrl": rootUrl}, session=session)
+        return await asyncQueue.task(taskId)
+
+    cacheKey = "task-definition-{}-{}".format(rootUrl, taskId)
+    try:
+        task = cache.get(cacheKey)
+    except Exception as e:
+        logger.error("Error fetching the cached definition of task %s: %s", taskId, e)
+        task = None
+    if task is not None:
+        newrelic.agent.record_custom_metric("Custom/TaskDefinitionCache/Hit", 1)
+        return task
+
+    newrelic.agent.record_custom_metric("Custom/TaskDefinitionCache/Miss", 1)
+    asyncQueue = taskcluster.aio.Queue({"rootUrl": rootUrl}, session=session)
+    task = slimTaskDefinition(await asyncQueue.task(taskId))
+    try:
+        cache.set(cacheKey, task, TASK_DEFINITION_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error("Error caching the definition of task %s: %s", taskId, e)
+    return task
+
+
 # Listens for Task event messages and invokes the appropriate handler
 # for the type of message received.
 # Only messages that contain the properly formatted routing key and contains
@@ -161,8 +215,9 @@ def ignore_task(task, taskId, rootUrl, project):
 async def handleMessage(message, taskDefinition=None):
     jobs = []
     taskId = message["payload"]["status"]["taskId"]
-    asyncQueue = taskcluster.aio.Queue({"rootUrl": message["root_url"]}, session=session)
-    task = (await asyncQueue.task(taskId)) if not taskDefinition else taskDefinition
+    task = taskDefinition
+    if not task:
+        task = await fetchTaskDefinition(message["root_url"], taskId, message["exchange"])
 
     try:
         parsedRoute = parseRouteInfo("tc-treeherder", taskId, task["routes"], task)
@@ -345,49 +400,83 @@ async def handleTaskException(pushInfo, task, message):
     return job
 
 
+def getArtifactsSemaphore():
+    # a semaphore can only be used on the event loop it was created on
+    loop = asyncio.get_event_loop()
+    if loop not in artifactsSemaphores:
+        artifactsSemaphores[loop] = asyncio.Semaphore(ARTIFACTS_FETCH_CONCURRENCY)
+    return artifactsSemaphores[loop]
+
+
 async def fetchArtifacts(root_url, taskId, runId):
     asyncQueue = taskcluster.aio.Queue({"rootUrl": root_url}, session=session)
-    res = await asyncQueue.listArtifacts(taskId, runId)
+    async with getArtifactsSemaphore():
+        res = await asyncQueue.listArtifacts(taskId, runId)
     artifacts = res["artifacts"]
 
     continuationToken = res.get("continuationToken")
     while continuationToken is not None:
-        continuation = {"continuationToken": res["continuationToken"]}
+        continuation = {"continuationToken": continuationToken}
 
         try:
-            res = await asyncQueue.listArtifacts(taskId, runId, continuation)
+            async with getArtifactsSemaphore():
+                res = await asyncQueue.listArtifacts(taskId, runId, query=continuation)
         except Exception:
             break
 
-        artifacts = artifacts.concat(res["artifacts"])
+        artifacts.extend(res["artifacts"])
         continuationToken = res.get("continuationToken")
 
     return artifacts
 
 
+def artifactNamesCacheKey(root_url, taskId, runId):
+    return "task-artifacts-{}-{}-{}".format(root_url, taskId, runId)
+
+
+# The artifacts of a run are listed once it has resolved, but a failed run is
+# also handled again when its rerun is, so the names are cached in between.
+async def fetchArtifactNames(root_url, taskId, runId):
+    cacheKey = artifactNamesCacheKey(root_url, taskId, runId)
+    try:
+        names = cache.get(cacheKey)
+    except Exception as e:
+        logger.error("Error fetching the cached artifacts of task %s run %s: %s", taskId, runId, e)
+        names = None
+    if names is not None:
+        return names
+
+    names = [artifact["name"] for artifact in await fetchArtifacts(root_url, taskId, runId)]
+    try:
+        cache.set(cacheKey, names, ARTIFACTS_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error("Error caching the artifacts of task %s run %s: %s", taskId, runId, e)
+    return names
+
+
 # we no longer store these in the job_detail table, but we still need to
 # fetch them in order to determine if there is an error_summary log;
 # TODO refactor this when there is a way to only retrieve the error_summary
 # artifact: https://bugzilla.mozilla.org/show_bug.cgi?id=1629716
 async def addArtifactUploadedLinks(root_url, taskId, runId, job):
-    artifacts = []
+    artifactNames = []
     try:
-        artifacts = await fetchArtifacts(root_url, taskId, runId)
+        artifactNames = await fetchArtifactNames(root_url, taskId, runId)
     except Exception:
         logger.debug("Artifacts could not be found for task: %s run: %s", taskId, runId)
         return job
 
     seen = {}
     links = []
-    for artifact in artifacts:
-        name = os.path.basename(artifact["name"])
+    for artifactName in artifactNames:
+        name = os.path.basename(artifactName)
         # Bug 1595902 - It seems that directories are showing up as artifacts; skip them
         if not name:
             continue
         if not seen.get(name):
-            seen[name] = [artifact["name"]]
+            seen[name] = [artifactName]
         else:
-            seen[name].append(artifact["name"])
+            seen[name].append(artifactName)
             name = "{name} ({length})".format(name=name, length=len(seen[name]) - 1)
 
         links.append(
@@ -399,7 +488,7 @@ async def addArtifactUploadedLinks(root_url, taskId, runId, job):
                     "queue",
                     "v1",
                     "task/{taskId}/runs/{runId}/artifacts/{artifact_name}".format(
-                        taskId=taskId, runId=runId, artifact_name=artifact["name"]
+                        taskId=taskId, runId=runId, artifact_name=artifactName
                     ),
                 ),
             }
@@ -2,14 +2,19 @@
 This module contains tasks related to pulse job ingestion
 """
 import asyncio
+import logging
+from collections import defaultdict
 
 import newrelic.agent
 
 from treeherder.etl.job_loader import JobLoader
+from treeherder.etl.jobs import store_job_data
 from treeherder.etl.push_loader import PushLoader
 from treeherder.etl.taskcluster_pulse.handler import handleMessage
 from treeherder.workers.task import retryable_task
 
+logger = logging.getLogger(__name__)
+
 # NOTE: default values for root_url parameters can be removed once all tasks that lack
 # that parameter have been processed
 
@@ -39,6 +44,67 @@ def store_pulse_tasks(
             JobLoader().process_job(run, root_url)
 
 
+@retryable_task(name='store-pulse-tasks-batch', max_retries=10)
+def store_pulse_tasks_batch(messages, root_url='https://firefox-ci-tc.services.mozilla.com'):
+    """
+    Fetches tasks from Taskcluster for a batch of pulse messages, each a list of
+    `[pulse_job, exchange, routing_key]`, and stores the resulting jobs together.
+
+    Messages that can't be stored as part of the batch (eg because their push
+    hasn't been ingested yet) are passed on to `store_pulse_tasks` one by one,
+    so that they are retried without holding up the rest of the batch.
+    """
+    loop = asyncio.get_event_loop()
+    newrelic.agent.add_custom_parameter("batch_size", len(messages))
+    # handleMessage expects messages in this format
+    message_runs = loop.run_until_complete(
+        asyncio.gather(
+            *[
+                handleMessage(
+                    {
+                        "exchange": exchange,
+                        "payload": pulse_job,
+                        "root_url": root_url,
+                    }
+                )
+                for (pulse_job, exchange, routing_key) in messages
+            ],
+            return_exceptions=True,
+        )
+    )
+
+    job_loader = JobLoader()
+    failed_messages = set()
+    jobs_by_repository = defaultdict(list)
+    messages_by_repository = defaultdict(set)
+    for index, runs in enumerate(message_runs):
+        try:
+            if isinstance(runs, Exception):
+                raise runs
+            prepared_jobs = [job_loader.prepare_job(run) for run in runs if run]
+        except Exception:
+            logger.debug("Could not prepare the jobs of pulse message %s", index, exc_info=True)
+            failed_messages.add(index)
+            continue
+        for repository, transformed_job in filter(None, prepared_jobs):
+            jobs_by_repository[repository].append(transformed_job)
+            messages_by_repository[repository].add(index)
+
+    for repository, jobs in jobs_by_repository.items():
+        try:
+            store_job_data(repository, jobs)
+        except Exception:
+            logger.debug("Could not store a batch of jobs for %s", repository, exc_info=True)
+            failed_messages.update(messages_by_repository[repository])
+
+    newrelic.agent.add_custom_parameter("failed_messages", len(failed_messages))
+    for index in sorted(failed_messages):
+        (pulse_job, exchange, routing_key) = messages[index]
+        store_pulse_tasks.apply_async(
+            args=[pulse_job, exchange, routing_key, root_url], queue='store_pulse_tasks'
+        )
+
+
 @retryable_task(name='store-pulse-pushes', max_retries=10)
 def store_pulse_pushes(
     body, exchange, routing_key, root_url='https://firefox-ci-tc.services.mozilla.com'
@@ -1,17 +1,18 @@
 import newrelic.agent
 from celery import task
 
-from treeherder.etl.pushlog import HgPushlogProcess
+from treeherder.etl.pushlog import PUSHLOG_URL, HgPushlogPoller, HgPushlogProcess
 from treeherder.model.models import Repository
 
 
-@task(name='fetch-push-logs')
+@task(name='fetch-push-logs', soft_time_limit=10 * 60)
 def fetch_push_logs():
     """
-    Run several fetch_hg_push_log subtasks, one per repository
+    Fetch the pushlogs of all the active hg repositories concurrently
     """
-    for repo in Repository.objects.filter(dvcs_type='hg', active_status="active"):
-        fetch_hg_push_log.apply_async(args=(repo.name, repo.url), queue='pushlog')
+    repositories = list(Repository.objects.filter(dvcs_type='hg', active_status="active"))
+    newrelic.agent.add_custom_parameter("repositories", len(repositories))
+    HgPushlogPoller().run(repositories)
 
 
 @task(name='fetch-hg-push-logs', soft_time_limit=10 * 60)
@@ -21,4 +22,4 @@ def fetch_hg_push_log(repo_name, repo_url):
     """
     newrelic.agent.add_custom_parameter("repo_name", repo_name)
     process = HgPushlogProcess()
-    process.run(repo_url + '/json-pushes/?full=1&version=2', repo_name)
+    process.run(PUSHLOG_URL.format(repo_url), repo_name)
@@ -1,15 +1,28 @@
 import logging
+import mmap
+import tempfile
 
+import billiard
 import newrelic.agent
+from django.conf import settings
 
 from treeherder.utils.http import make_request
 
 from .artifactbuilders import LogViewerArtifactBuilder, PerformanceDataArtifactBuilder
-from .parsers import EmptyPerformanceData
+from .parsers import EmptyPerformanceData, ErrorParser
 
 logger = logging.getLogger(__name__)
-# Max log size in bytes we will download (prior to decompression).
+# Max log size in bytes we will download (prior to decompression) and stream
+# through the parsers line by line.
 MAX_DOWNLOAD_SIZE_IN_BYTES = 5 * 1024 * 1024
+# Max log size in bytes we will download (prior to decompression) at all. Logs
+# larger than ``MAX_DOWNLOAD_SIZE_IN_BYTES`` are parsed in chunks in parallel.
+MAX_CHUNKED_DOWNLOAD_SIZE_IN_BYTES = 50 * 1024 * 1024
+# Max size in bytes of the decompressed logs parsed in chunks, which are
+# written to a temporary file on the way.
+MAX_CHUNKED_LOG_SIZE_IN_BYTES = 200 * 1024 * 1024
+# Approximate size of the (decompressed) chunks large logs are split into.
+CHUNK_SIZE_IN_BYTES = 16 * 1024 * 1024
 
 
 class ArtifactBuilderCollection:
@@ -91,23 +104,15 @@ class ArtifactBuilderCollection:
                 'unstructured_log_encoding', response.headers.get('Content-Encoding', 'None')
             )
 
-            if download_size_in_bytes > MAX_DOWNLOAD_SIZE_IN_BYTES:
+            if download_size_in_bytes > MAX_CHUNKED_DOWNLOAD_SIZE_IN_BYTES:
                 raise LogSizeException(
                     'Download size of %i bytes exceeds limit' % download_size_in_bytes
                 )
 
-            # Lines must be explicitly decoded since `iter_lines()`` returns bytes by default
-            # and we cannot use its `decode_unicode=True` mode, since otherwise Unicode newline
-            # characters such as `\u0085` (which can appear in test output) are treated the same
-            # as `\n` or `\r`, and so split into unwanted additional lines by `iter_lines()`.
-            for line in response.iter_lines():
-                for builder in self.builders:
-                    try:
-                        # Using `replace` to prevent malformed unicode (which might possibly exist
-                        # in test message output) from breaking parsing of the rest of the log.
-                        builder.parse_line(line.decode('utf-8', 'replace'))
-                    except EmptyPerformanceData:
-                        logger.warning("We have parsed an empty PERFHERDER_DATA for %s", self.url)
+            if download_size_in_bytes > MAX_DOWNLOAD_SIZE_IN_BYTES:
+                self.parse_chunked(response)
+            else:
+                self.parse_lines(response.iter_lines())
 
         # gather the artifacts from all builders
         for builder in self.builders:
@@ -120,6 +125,152 @@ class ArtifactBuilderCollection:
                 continue
             self.artifacts[name] = artifact
 
+    def parse_lines(self, lines):
+        """
+        Run each builder against an iterable of raw (undecoded) log lines.
+
+        Builders are first asked whether the raw line could be of interest to
+        them, and the line is only decoded (once, for all builders) if at least
+        one of them says so. For example once the error summary is full, the
+        rest of a huge failing log is only scanned for performance data at the
+        byte level.
+        """
+        # Lines must be explicitly decoded since `iter_lines()`` returns bytes by default
+        # and we cannot use its `decode_unicode=True` mode, since otherwise Unicode newline
+        # characters such as `\u0085` (which can appear in test output) are treated the same
+        # as `\n` or `\r`, and so split into unwanted additional lines by `iter_lines()`.
+        for line in lines:
+            decoded_line = None
+            for builder in self.builders:
+                if not builder.is_candidate(line):
+                    builder.skip_line()
+                    continue
+                if decoded_line is None:
+                    # Using `replace` to prevent malformed unicode (which might possibly exist
+                    # in test message output) from breaking parsing of the rest of the log.
+                    decoded_line = line.decode('utf-8', 'replace')
+                try:
+                    builder.parse_line(decoded_line)
+                except EmptyPerformanceData:
+                    logger.warning("We have parsed an empty PERFHERDER_DATA for %s", self.url)
+
+    def parse_chunked(self, response):
+        """
+        Parse a large log by splitting it into chunks parsed in parallel.
+
+        The decompressed log is streamed to a temporary file, which is then
+        split into line-aligned chunks that are each run through a fresh set
+        of builders, in separate processes if ``LOG_PARSER_CHUNK_PROCESSES``
+        allows it. The results are then stitched back
+        together, giving the same artifacts as parsing the log line by line.
+        """
+        with tempfile.NamedTemporaryFile() as f:
+            for content in response.iter_content(chunk_size=1024 * 1024):
+                if f.tell() + len(content) > MAX_CHUNKED_LOG_SIZE_IN_BYTES:
+                    raise LogSizeException(
+                        'Decompressed size exceeds limit of %i bytes'
+                        % MAX_CHUNKED_LOG_SIZE_IN_BYTES
+                    )
+                f.write(content)
+            f.flush()
+            response.close()
+
+            if f.tell() == 0:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+                chunks = _split_into_chunks(log, CHUNK_SIZE_IN_BYTES)
+                taskcluster_line_start = _find_line_start(log, b'[taskcluster ')
+
+            chunk_args = [
+                (
+                    f.name,
+                    start,
+                    end,
+                    # `ErrorParser` only strips TaskCluster prefixes once it has seen a
+                    # ``[taskcluster `` line, which may have been in an earlier chunk.
+                    taskcluster_line_start is not None and taskcluster_line_start < start,
+                    self.url,
+                    [type(builder) for builder in self.builders],
+                )
+                for start, end in chunks
+            ]
+
+            processes = min(settings.LOG_PARSER_CHUNK_PROCESSES, len(chunk_args))
+            if processes > 1:
+                # unlike multiprocessing's, billiard's pools can be started from
+                # the (daemonic) processes of Celery's prefork pool
+                with billiard.Pool(processes) as pool:
+                    results = pool.starmap(_parse_log_chunk, chunk_args)
+            else:
+                results = [_parse_log_chunk(*args) for args in chunk_args]
+
+        self._merge_chunk_results(results)
+
+    def _merge_chunk_results(self, results):
+        """Combine the per chunk results of ``parse_chunked`` into the builders."""
+        line_offset = 0
+        for num_lines, chunk_artifacts in results:
+            for builder, chunk_artifact in zip(self.builders, chunk_artifacts):
+                if isinstance(builder.parser, ErrorParser):
+                    for error in chunk_artifact:
+                        if builder.parser.complete:
+                            break
+                        # Consecutive duplicates are dropped within a chunk already, but
+                        # not across the boundary between two chunks.
+                        if builder.parser.artifact and (
+                            builder.parser.artifact[-1]["line"] == error["line"]
+                        ):
+                            continue
+                        builder.parser.add(error["line"], error["linenumber"] + line_offset)
+                else:
+                    builder.parser.artifact.extend(chunk_artifact)
+                builder.lineno = line_offset + num_lines
+            line_offset += num_lines
+
+
+def _split_into_chunks(log, chunk_size):
+    """Return (start, end) offsets of consecutive line-aligned chunks of ``log``."""
+    chunks = []
+    start = 0
+    while start < len(log):
+        newline = log.find(b'\n', start + chunk_size)
+        end = len(log) if newline == -1 else newline + 1
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def _find_line_start(log, prefix):
+    """Return the offset of the first line of ``log`` starting with ``prefix``, if any."""
+    if log[: len(prefix)] == prefix:
+        return 0
+    # `splitlines()` treats both `\n` and `\r` as line boundaries.
+    offsets = [log.find(separator + prefix) for separator in (b'\n', b'\r')]
+    offsets = [offset + 1 for offset in offsets if offset != -1]
+    return min(offsets) if offsets else None
+
+
+def _parse_log_chunk(path, start, end, is_taskcluster, url, builder_classes):
+    """
+    Run a fresh set of builders over the lines of one chunk of a log file.
+
+    Returns the number of lines in the chunk and the artifact of each builder's
+    parser, with line numbers relative to the start of the chunk.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        lines = log[start:end].splitlines()
+
+    artifact_bc = ArtifactBuilderCollection(
+        url, builders=[builder_class(url=url) for builder_class in builder_classes]
+    )
+    for builder in artifact_bc.builders:
+        if isinstance(builder.parser, ErrorParser):
+            builder.parser.is_taskcluster = is_taskcluster
+    artifact_bc.parse_lines(lines)
+
+    return len(lines), [builder.parser.get_artifact() for builder in artifact_bc.builders]
+
 
 class LogSizeException(Exception):
     pass
@@ -31,6 +31,15 @@ class ArtifactBuilderBase:
         self.parser = None
         self.name = "Generic Artifact"
 
+    def is_candidate(self, line):
+        """Whether the raw (undecoded) line needs to be decoded and parsed."""
+        return not self.parser.complete and self.parser.is_candidate(line)
+
+    def skip_line(self):
+        """Account for a line rejected by ``is_candidate`` without parsing it."""
+        if not self.parser.complete:
+            self.lineno += 1
+
     def parse_line(self, line):
         """Parse a single line of the log."""
         # The parser may only need to run until it has seen a specific line.
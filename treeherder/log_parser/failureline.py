@@ -11,21 +11,47 @@ from requests.exceptions import HTTPError
 
 from treeherder.etl.text import astral_filter
 from treeherder.model.models import FailureLine, Group, JobLog, GroupStatus
-from treeherder.utils.http import fetch_text
+from treeherder.utils.http import make_request
 
 logger = logging.getLogger(__name__)
 
 
-def store_failure_lines(job_log):
-    log_iter = fetch_log(job_log)
+def store_failure_lines(job_log, log_download=None):
+    log_iter = fetch_log(job_log, log_download)
     if not log_iter:
         return False
     return write_failure_lines(job_log, log_iter)
 
 
-def fetch_log(job_log):
+def download_log(url):
+    """
+    Download and decode the items of the errorsummary log.
+
+    The log is newline delimited JSON, which is streamed and decoded lazily.
+    Only the first ``FAILURE_LINES_CUTOFF + 1`` items are ever used (see
+    ``write_failure_lines``), so the download stops once those have been
+    read, keeping memory bounded however large the log is.
+
+    This only does network I/O (no database access), so can be run in a
+    background thread whilst other logs are being parsed.
+    """
+    with make_request(url, stream=True) as response:
+        lines = (line for line in response.iter_lines() if line)
+        return [json.loads(line) for line in islice(lines, settings.FAILURE_LINES_CUTOFF + 1)]
+
+
+def fetch_log(job_log, log_download=None):
+    """
+    Return an iterator over the items of the errorsummary log.
+
+    ``log_download`` is an optional future for a ``download_log()`` call that
+    was started earlier, in which case its result is used.
+    """
     try:
-        log_text = fetch_text(job_log.url)
+        if log_download is not None:
+            log_items = log_download.result()
+        else:
+            log_items = download_log(job_log.url)
     except HTTPError as e:
         job_log.update_status(JobLog.FAILED)
         if e.response is not None and e.response.status_code in (403, 404):
@@ -33,10 +59,10 @@ def fetch_log(job_log):
             return
         raise
 
-    if not log_text:
+    if not log_items:
         return
 
-    return (json.loads(item) for item in log_text.splitlines())
+    return iter(log_items)
 
 
 def write_failure_lines(job_log, log_iter):
@@ -104,18 +130,22 @@ def get_kwargs(failure_line):
     return {key: failure_line[key] for key in _failure_line_keys if key in failure_line}
 
 
-def create_failure_line(job_log, failure_line):
-    return FailureLine.objects.create(
-        repository=job_log.job.repository,
-        job_guid=job_log.job.guid,
-        job_log=job_log,
-        **get_kwargs(failure_line),
+def create_failure_lines(job_log, failure_lines):
+    """Insert the failure lines of a log in a single query."""
+    return FailureLine.objects.bulk_create(
+        [
+            FailureLine(
+                repository=job_log.job.repository,
+                job_guid=job_log.job.guid,
+                job_log=job_log,
+                **get_kwargs(failure_line),
+            )
+            for failure_line in failure_lines
+        ]
     )
 
 
-def create_group_result(job_log, line):
-    group_path = line["group"]
-
+def is_valid_group_path(job_log, group_path):
     # Log to New Relic if it's not in a form we like.  We can enter
     # Bugs to upstream to remedy them.
     if "\\" in group_path or ":" in group_path or len(group_path) > 255:
@@ -123,18 +153,60 @@ def create_group_result(job_log, line):
             "malformed_test_group",
             {
                 "message": "Group paths must be relative, with no backslashes and <255 chars",
-                "group": line["group"],
+                "group": group_path,
                 "group_path": group_path,
                 "length": len(group_path),
                 "repository": job_log.job.repository,
                 "job_guid": job_log.job.guid,
             },
         )
-    else:
-        group, _ = Group.objects.get_or_create(name=group_path[:255])
-        GroupStatus.objects.create(
-            job_log=job_log, group=group, status=GroupStatus.get_status(line['status'])
+        return False
+    return True
+
+
+def get_or_create_group_ids(names):
+    """
+    Return a mapping of group name to id, creating any missing groups.
+
+    The existing groups are fetched in one query, and the missing ones created
+    with a single insert that ignores rows created concurrently by another
+    task, which are then picked up by a final lookup.
+    """
+    group_ids = dict(Group.objects.filter(name__in=names).values_list("name", "id"))
+    missing_names = [name for name in names if name not in group_ids]
+    if missing_names:
+        Group.objects.bulk_create(
+            [Group(name=name) for name in missing_names], ignore_conflicts=True
         )
+        group_ids.update(Group.objects.filter(name__in=missing_names).values_list("name", "id"))
+    for name in names:
+        # The database collation may consider a name equal to a differently
+        # spelt existing one (e.g. by case), in which case reuse that group.
+        if name not in group_ids:
+            group_ids[name] = Group.objects.get(name=name).id
+    return group_ids
+
+
+def create_group_results(job_log, group_results):
+    """Insert the group results of a log, resolving all their groups at once."""
+    group_results = [line for line in group_results if is_valid_group_path(job_log, line["group"])]
+    if not group_results:
+        return []
+
+    # Preserve the order of the log, so that new groups are created in that order.
+    names = list(dict.fromkeys(line["group"] for line in group_results))
+    group_ids = get_or_create_group_ids(names)
+
+    return GroupStatus.objects.bulk_create(
+        [
+            GroupStatus(
+                job_log=job_log,
+                group_id=group_ids[line["group"]],
+                status=GroupStatus.get_status(line["status"]),
+            )
+            for line in group_results
+        ]
+    )
 
 
 def create(job_log, log_list):
@@ -156,12 +228,8 @@ def create(job_log, log_list):
         else:
             failure_lines.append(line)
 
-    for group in group_results:
-        create_group_result(job_log, group)
-
-    failure_line_results = [
-        create_failure_line(job_log, failure_line) for failure_line in failure_lines
-    ]
+    create_group_results(job_log, group_results)
+    failure_line_results = create_failure_lines(job_log, failure_lines)
     job_log.update_status(JobLog.PARSED)
     return failure_line_results
 
@@ -0,0 +1,62 @@
+import gzip
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from treeherder.log_parser.artifactbuildercollection import ArtifactBuilderCollection
+
+DEFAULT_LOG_DIR = os.path.join('tests', 'sample_data', 'logs')
+
+
+class Command(BaseCommand):
+    """Management command to benchmark the text log parsers"""
+
+    help = """
+    Runs the default artifact builders over every gzipped log in a local
+    directory (no network access involved) and reports the throughput in
+    lines per second.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log-dir',
+            action='store',
+            dest='log_dir',
+            default=DEFAULT_LOG_DIR,
+            help='Directory containing *.txt.gz logs (default: %s)' % DEFAULT_LOG_DIR,
+        )
+        parser.add_argument(
+            '--runs',
+            action='store',
+            dest='runs',
+            type=int,
+            default=3,
+            help='Number of times to parse the full set of logs',
+        )
+
+    def handle(self, *args, **options):
+        logs = []
+        for filename in sorted(os.listdir(options['log_dir'])):
+            if not filename.endswith('.txt.gz'):
+                continue
+            with gzip.open(os.path.join(options['log_dir'], filename)) as f:
+                # Mirror what `response.iter_lines()` yields during real parsing.
+                logs.append(f.read().splitlines())
+
+        num_lines = sum(len(lines) for lines in logs)
+        print("Parsing %i lines from %i logs" % (num_lines, len(logs)))
+
+        times = []
+        for _ in range(options['runs']):
+            start = time.time()
+            for lines in logs:
+                artifact_bc = ArtifactBuilderCollection(None)
+                artifact_bc.parse_lines(lines)
+                for builder in artifact_bc.builders:
+                    builder.finish_parse()
+            times.append(time.time() - start)
+
+        print("Timings: %s" % times)
+        print("Best: %i lines/sec" % (num_lines / min(times)))
+        print("Average: %i lines/sec" % (num_lines * len(times) / sum(times)))
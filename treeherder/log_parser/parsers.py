@@ -26,6 +26,14 @@ class ParserBase:
         self.artifact = []
         self.complete = False
 
+    def is_candidate(self, line):
+        """
+        Cheap check of a raw (undecoded) line, used to avoid decoding lines that
+        ``parse_line`` would ignore anyway. Must never reject a line that would
+        contribute to the artifact.
+        """
+        return True
+
     def parse_line(self, line, lineno):
         """Parse a single line of the log"""
         raise NotImplementedError  # pragma no cover
@@ -111,6 +119,22 @@ class ErrorParser(ParserBase):
 
     RE_MOZHARNESS_PREFIX = re.compile(r"^\d+:\d+:\d+ +(?:DEBUG|INFO|WARNING) - +")
 
+    # The remaining positive checks in ``is_error_line`` folded into a single
+    # anchored and a single unanchored expression. They accept a superset of
+    # the lines the full checks accept, but are evaluated against the raw line
+    # so that the vast majority of log lines (which match nothing) can be
+    # rejected without stripping the mozharness prefix or running each of the
+    # individual searches in turn.
+    RE_ERR_CANDIDATE_MATCH = re.compile(
+        r"(?:{})?(?:{})".format(
+            RE_MOZHARNESS_PREFIX.pattern.lstrip("^"), RE_ERR_MATCH.pattern.replace("|^", "|")[1:]
+        )
+    )
+
+    RE_ERR_CANDIDATE_SEARCH = re.compile(
+        "|".join(map(re.escape, IN_SEARCH_TERMS)) + "|" + RE_ERR_SEARCH.pattern
+    )
+
     def __init__(self):
         """A simple error detection sub-parser"""
         super().__init__("errors")
@@ -118,6 +142,13 @@ class ErrorParser(ParserBase):
 
     def add(self, line, lineno):
         self.artifact.append({"linenumber": lineno, "line": line.rstrip()})
+        # Once the artifact is full no further line can be added, so there is
+        # no need to see the rest of the log.
+        if len(self.artifact) >= settings.MAX_ERROR_LINES:
+            self.complete = True
+
+    def is_candidate(self, line):
+        return bool(line)
 
     def parse_line(self, line, lineno):
         """Check a single line for an error.  Keeps track of the linenumber"""
@@ -169,6 +200,11 @@ class ErrorParser(ParserBase):
         if self.RE_ERR_1_MATCH.match(line):
             return True
 
+        if not (
+            self.RE_ERR_CANDIDATE_MATCH.match(line) or self.RE_ERR_CANDIDATE_SEARCH.search(line)
+        ):
+            return False
+
         # Remove mozharness prefixes prior to matching
         trimline = re.sub(self.RE_MOZHARNESS_PREFIX, "", line).rstrip()
         if self.RE_EXCLUDE_2_SEARCH.search(trimline):
@@ -192,6 +228,9 @@ class PerformanceParser(ParserBase):
     def __init__(self):
         super().__init__("performance_data")
 
+    def is_candidate(self, line):
+        return b"PERFHERDER_DATA:" in line
+
     def parse_line(self, line, lineno):
         match = self.RE_PERFORMANCE.match(line)
         if match:
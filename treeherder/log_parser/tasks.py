@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import newrelic.agent
 import simplejson as json
@@ -26,18 +27,21 @@ def parse_logs(job_id, job_log_ids, priority):
     job_logs = JobLog.objects.filter(id__in=job_log_ids, job=job)
 
     if len(job_log_ids) != len(job_logs):
-        logger.warning("Failed to load all expected job ids: %s", ", ".join(job_log_ids))
+        logger.warning("Failed to load all expected job ids: %s", ", ".join(map(str, job_log_ids)))
 
     parser_tasks = {
         "errorsummary_json": store_failure_lines,
         "live_backing_log": post_log_artifacts,
     }
 
-    # We don't want to stop parsing logs for most Exceptions however we still
-    # need to know one occurred so we can skip further steps and reraise to
-    # trigger the retry decorator.
-    first_exception = None
-    completed_names = set()
+    # Logs that are downloaded in full before being parsed. Their downloads are
+    # started in the background up front, so that they overlap with the
+    # (streamed) parsing of the other logs of the job.
+    log_downloaders = {
+        "errorsummary_json": failureline.download_log,
+    }
+
+    logs_to_parse = []
     for job_log in job_logs:
         newrelic.agent.add_custom_parameter("job_log_%s_url" % job_log.name, job_log.url)
         logger.debug("parser_task for %s", job_log.id)
@@ -50,37 +54,57 @@ def parse_logs(job_id, job_log_ids, priority):
             )
             continue
 
-        parser = parser_tasks.get(job_log.name)
-        if not parser:
-            continue
-
-        try:
-            parser(job_log)
-        except Exception as e:
-            if isinstance(e, SoftTimeLimitExceeded):
-                # stop parsing further logs but raise so NewRelic and
-                # Papertrail will still show output
-                raise
+        if job_log.name in parser_tasks:
+            logs_to_parse.append(job_log)
 
-            if first_exception is None:
-                first_exception = e
+    # Parse the streamed logs first, whilst the others are being downloaded.
+    logs_to_parse.sort(key=lambda job_log: job_log.name in log_downloaders)
 
-            # track the exception on NewRelic but don't stop parsing future
-            # log lines.
-            newrelic.agent.record_exception()
-        else:
-            completed_names.add(job_log.name)
+    # We don't want to stop parsing logs for most Exceptions however we still
+    # need to know one occurred so we can skip further steps and reraise to
+    # trigger the retry decorator.
+    first_exception = None
+    completed_names = set()
+    logs_to_download = [job_log for job_log in logs_to_parse if job_log.name in log_downloaders]
+    with ThreadPoolExecutor(max_workers=max(len(logs_to_download), 1)) as executor:
+        log_downloads = {
+            job_log.id: executor.submit(log_downloaders[job_log.name], job_log.url)
+            for job_log in logs_to_download
+        }
+
+        for job_log in logs_to_parse:
+            parser = parser_tasks[job_log.name]
+            parser_args = [job_log]
+            if job_log.id in log_downloads:
+                parser_args.append(log_downloads[job_log.id])
+
+            try:
+                parser(*parser_args)
+            except Exception as e:
+                if isinstance(e, SoftTimeLimitExceeded):
+                    # stop parsing further logs but raise so NewRelic and
+                    # Papertrail will still show output
+                    raise
+
+                if first_exception is None:
+                    first_exception = e
+
+                # track the exception on NewRelic but don't stop parsing future
+                # log lines.
+                newrelic.agent.record_exception()
+            else:
+                completed_names.add(job_log.name)
 
     # Raise so we trigger the retry decorator.
     if first_exception:
         raise first_exception
 
 
-def store_failure_lines(job_log):
+def store_failure_lines(job_log, log_download=None):
     """Store the failure lines from a log corresponding to the structured
     errorsummary file."""
     logger.debug('Running store_failure_lines for job %s', job_log.job.id)
-    failureline.store_failure_lines(job_log)
+    failureline.store_failure_lines(job_log, log_download)
 
 
 def post_log_artifacts(job_log):
@@ -109,7 +133,8 @@ def post_log_artifacts(job_log):
 
     try:
         serialized_artifacts = serialize_artifact_json_blobs(artifact_list)
-        store_job_artifacts(serialized_artifacts)
+        # the log parser only keeps the performance data that is valid
+        store_job_artifacts(serialized_artifacts, validated=True)
         job_log.update_status(JobLog.PARSED)
         logger.debug("Stored artifact for %s %s", job_log.job.repository.name, job_log.job.id)
     except Exception as e:
@@ -1,7 +1,9 @@
 import os
 
 import simplejson as json
-from jsonschema import ValidationError, validate
+from jsonschema import ValidationError
+
+from treeherder.etl.schema import validate
 
 
 def _lookup_extra_options_max(schema):
@@ -15,7 +17,7 @@ with open(os.path.join('schemas', 'performance-artifact.json')) as f:
 
 
 def validate_perf_data(performance_data: dict):
-    validate(performance_data, PERFHERDER_SCHEMA)
+    validate(performance_data, 'performance-artifact.json')
 
     expected_range = (SECOND_MAX_LENGTH, MAX_LENGTH)
     for suite in performance_data["suites"]:
@@ -20,10 +20,13 @@ PROCESS_ID_RE = re.compile(r"(?:PID \d+|GECKO\(\d+\)) \| +")
 REFTEST_RE = re.compile(r'\s+[=!]=\s+.*')
 
 
-def get_error_summary(job):
+def get_error_summary(job, errors=None):
     """
     Create a list of bug suggestions for a job.
 
+    If the job's TextLogErrors are already at hand they can be passed in as
+    `errors` to avoid querying for them again.
+
     Caches the results if there are any.
     """
     cache_key = 'error-summary-{}'.format(job.id)
@@ -33,7 +36,8 @@ def get_error_summary(job):
 
     # don't cache or do anything if we have no text log errors to get
     # results for
-    errors = TextLogError.objects.filter(job=job)
+    if errors is None:
+        errors = TextLogError.objects.filter(job=job)
     if not errors:
         return []
 
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('model', '0022_support_group_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='joblog',
+            name='status',
+            field=models.IntegerField(
+                choices=[
+                    (0, 'pending'),
+                    (1, 'parsed'),
+                    (2, 'failed'),
+                    (3, 'skipped-size'),
+                    (4, 'skipped-load'),
+                ],
+                default=0,
+            ),
+        ),
+    ]
@@ -644,12 +644,14 @@ class JobLog(models.Model):
     PARSED = 1
     FAILED = 2
     SKIPPED_SIZE = 3
+    SKIPPED_LOAD = 4
 
     STATUSES = (
         (PENDING, 'pending'),
         (PARSED, 'parsed'),
         (FAILED, 'failed'),
         (SKIPPED_SIZE, 'skipped-size'),
+        (SKIPPED_LOAD, 'skipped-load'),
     )
 
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="job_log")
@@ -1,14 +1,19 @@
+import bisect
+import functools
 import logging
+import multiprocessing
 import time
 from collections import namedtuple
 from datetime import datetime, timedelta
-from itertools import zip_longest
+from itertools import groupby, zip_longest
+from operator import attrgetter, or_
 from typing import List, Tuple
 
 import simplejson as json
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import F, Q
+from django.db.models import F, Max, Min, Q
 from django.db.models.query import QuerySet
 
 from treeherder.perf.exceptions import MissingRecords
@@ -23,6 +28,19 @@ from treeherder.perf.models import (
 from treeherder.perfalert.perfalert import RevisionDatum, detect_changes
 from treeherder.utils import default_serializer
 
+# The analysis of the latest revisions of each series, from which
+# `generate_new_alerts_in_series` carries on when the series gets new data.
+ALERTS_STATE_CACHE_KEY = 'perf-alerts-state-{}'
+# How many series `generate_new_alerts_in_signatures` loads, analyzes and
+# stores the alerts of at a time.
+ALERTS_BATCH_SIZE = 100
+
+_SeriesToAnalyze = namedtuple(
+    '_SeriesToAnalyze',
+    'signature series_key alert_threshold analyzed_revisions revision_data push_times '
+    'last_datum_id start',
+)
+
 
 def get_alert_properties(prev_value, new_value, lower_is_better):
     AlertProperties = namedtuple(
@@ -51,19 +69,227 @@ def generate_new_alerts_in_series(signature):
         PerformanceAlert.objects.filter(series_signature=signature)
         .select_related('summary__push__time')
         .order_by('-summary__push__time')
-        .values_list('summary__push__time', flat=True)[:1]
+        .values_list('summary__push__time', flat=True)
+        .first()
     )
     if latest_alert_timestamp:
-        series = series.filter(push_timestamp__gt=latest_alert_timestamp[0])
+        series = series.filter(push_timestamp__gt=latest_alert_timestamp)
+
+    min_back_window, max_back_window, fore_window, alert_threshold = _get_alert_settings(signature)
+
+    # carry on from the previous analysis of the series, unless it started
+    # from somewhere else or with other windows
+    series_key = (latest_alert_timestamp, min_back_window, max_back_window, fore_window)
+    state = cache.get(ALERTS_STATE_CACHE_KEY.format(signature.id))
+    resumed = None
+    if state is not None and state['series'] == series_key:
+        new_data = series.filter(id__gt=state['last_datum_id']).aggregate(
+            Min('push_timestamp'), Max('id')
+        )
+        if new_data['id__max'] is None:
+            # nothing has changed since
+            return
+        window = _get_resume_window(
+            state['revisions'], new_data['push_timestamp__min'], max_back_window, fore_window
+        )
+        if window is not None:
+            (first, start) = window
+            resumed = _resume_series_analysis(
+                series.filter(push_timestamp__gte=state['revisions'][first][0]),
+                state['revisions'],
+                first,
+                start,
+            )
 
-    revision_data = {}
-    for d in series:
-        if not revision_data.get(d.push_id):
-            revision_data[d.push_id] = RevisionDatum(
-                int(time.mktime(d.push_timestamp.timetuple())), d.push_id, []
+    if resumed is not None:
+        analyzed_revisions, revision_data, push_times, start = resumed
+        last_datum_id = new_data['id__max']
+    else:
+        analyzed_revisions = []
+        revision_data, push_times, last_datum_id = _get_revision_data(series)
+        start = 1
+
+    analyzed_series = detect_changes(
+        revision_data,
+        min_back_window=min_back_window,
+        max_back_window=max_back_window,
+        fore_window=fore_window,
+        start=start,
+    )
+
+    with transaction.atomic():
+        _store_alerts(signature, analyzed_series, start, alert_threshold)
+
+    cache.set(
+        ALERTS_STATE_CACHE_KEY.format(signature.id),
+        _get_series_state(
+            series_key, last_datum_id, analyzed_revisions, analyzed_series, push_times
+        ),
+        _get_series_state_timeout(),
+    )
+
+
+def generate_new_alerts_in_signatures(signatures, processes=1):
+    """
+    Generate the alerts of many series at once, carrying on from their
+    previous analysis where possible, as `generate_new_alerts_in_series` does.
+
+    The series are handled `ALERTS_BATCH_SIZE` at a time: the data of a batch
+    is loaded in a few queries, their changes are detected by a pool of
+    `processes` worker processes, and their alerts are stored in one
+    transaction.
+    """
+    signatures = list(signatures)
+    batches = [
+        signatures[i : i + ALERTS_BATCH_SIZE] for i in range(0, len(signatures), ALERTS_BATCH_SIZE)
+    ]
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            for batch in batches:
+                _generate_new_alerts_in_batch(batch, pool.map)
+    else:
+        for batch in batches:
+            _generate_new_alerts_in_batch(batch, map)
+
+
+def _generate_new_alerts_in_batch(signatures, map_fn):
+    signatures = {signature.id: signature for signature in signatures}
+    max_alert_age = datetime.now() - settings.PERFHERDER_ALERTS_MAX_AGE
+    latest_alert_timestamps = dict(
+        PerformanceAlert.objects.filter(series_signature_id__in=list(signatures))
+        .values_list('series_signature_id')
+        .annotate(Max('summary__push__time'))
+    )
+    states = cache.get_many([ALERTS_STATE_CACHE_KEY.format(id) for id in signatures])
+    data = PerformanceDatum.objects.filter(push_timestamp__gte=max_alert_age)
+
+    def series_filter(signature_id, **kwargs):
+        latest_alert_timestamp = latest_alert_timestamps.get(signature_id)
+        if latest_alert_timestamp:
+            kwargs['push_timestamp__gt'] = latest_alert_timestamp
+        return Q(signature_id=signature_id, **kwargs)
+
+    alert_settings = {}
+    resumable = {}
+    for (signature_id, signature) in signatures.items():
+        min_back_window, max_back_window, fore_window, alert_threshold = _get_alert_settings(
+            signature
+        )
+        series_key = (
+            latest_alert_timestamps.get(signature_id),
+            min_back_window,
+            max_back_window,
+            fore_window,
+        )
+        alert_settings[signature_id] = (series_key, alert_threshold)
+        state = states.get(ALERTS_STATE_CACHE_KEY.format(signature_id))
+        if state is not None and state['series'] == series_key:
+            resumable[signature_id] = state
+
+    # carry on from the previous analysis of the series which have one, with
+    # only the data their latest revisions need
+    new_data = {}
+    if resumable:
+        new_data = {
+            row['signature_id']: row
+            for row in data.filter(
+                functools.reduce(
+                    or_,
+                    (
+                        series_filter(signature_id, id__gt=state['last_datum_id'])
+                        for (signature_id, state) in resumable.items()
+                    ),
+                )
             )
-        revision_data[d.push_id].values.append(d.value)
+            .values('signature_id')
+            .annotate(Min('push_timestamp'), Max('id'))
+            .order_by()
+        }
+    windows = {}
+    loaded = {}
+    for signature_id in signatures:
+        if signature_id not in resumable:
+            loaded[signature_id] = series_filter(signature_id)
+        elif signature_id in new_data:
+            ((_, _, max_back_window, fore_window), _) = alert_settings[signature_id]
+            revisions = resumable[signature_id]['revisions']
+            window = _get_resume_window(
+                revisions,
+                new_data[signature_id]['push_timestamp__min'],
+                max_back_window,
+                fore_window,
+            )
+            if window is None:
+                loaded[signature_id] = series_filter(signature_id)
+            else:
+                windows[signature_id] = window
+                loaded[signature_id] = series_filter(
+                    signature_id, push_timestamp__gte=revisions[window[0]][0]
+                )
+        # otherwise nothing has changed since
+
+    series = []
+    while loaded:
+        reloaded = {}
+        for (signature_id, signature_data) in groupby(
+            data.filter(functools.reduce(or_, loaded.values()))
+            .only('id', 'signature', 'push', 'push_timestamp', 'value')
+            .order_by('signature_id', 'push_timestamp')
+            .iterator(),
+            attrgetter('signature_id'),
+        ):
+            (series_key, alert_threshold) = alert_settings[signature_id]
+            if signature_id in windows:
+                (first, start) = windows.pop(signature_id)
+                resumed = _resume_series_analysis(
+                    signature_data, resumable[signature_id]['revisions'], first, start
+                )
+                if resumed is None:
+                    reloaded[signature_id] = series_filter(signature_id)
+                    continue
+                analyzed_revisions, revision_data, push_times, start = resumed
+                last_datum_id = new_data[signature_id]['id__max']
+            else:
+                analyzed_revisions = []
+                revision_data, push_times, last_datum_id = _get_revision_data(signature_data)
+                start = 1
+            series.append(
+                _SeriesToAnalyze(
+                    signatures[signature_id],
+                    series_key,
+                    alert_threshold,
+                    analyzed_revisions,
+                    revision_data,
+                    push_times,
+                    last_datum_id,
+                    start,
+                )
+            )
+        loaded = reloaded
+
+    analyzed = list(
+        map_fn(_detect_changes, [(s.revision_data, s.series_key, s.start) for s in series])
+    )
+    with transaction.atomic():
+        for (s, analyzed_series) in zip(series, analyzed):
+            _store_alerts(s.signature, analyzed_series, s.start, s.alert_threshold)
+
+    cache.set_many(
+        {
+            ALERTS_STATE_CACHE_KEY.format(s.signature.id): _get_series_state(
+                s.series_key, s.last_datum_id, s.analyzed_revisions, analyzed_series, s.push_times
+            )
+            for (s, analyzed_series) in zip(series, analyzed)
+        },
+        _get_series_state_timeout(),
+    )
+
 
+def _get_alert_settings(signature):
+    """
+    The windows which the changes in the series of a signature are detected
+    over, and the threshold above which they're alerted on.
+    """
     min_back_window = signature.min_back_window
     if min_back_window is None:
         min_back_window = settings.PERFHERDER_ALERTS_MIN_BACK_WINDOW
@@ -76,66 +302,168 @@ def generate_new_alerts_in_series(signature):
     alert_threshold = signature.alert_threshold
     if alert_threshold is None:
         alert_threshold = settings.PERFHERDER_REGRESSION_THRESHOLD
+    return min_back_window, max_back_window, fore_window, alert_threshold
 
-    analyzed_series = detect_changes(
-        revision_data.values(),
+
+def _detect_changes(detection):
+    (revision_data, (_, min_back_window, max_back_window, fore_window), start) = detection
+    return detect_changes(
+        revision_data,
         min_back_window=min_back_window,
         max_back_window=max_back_window,
         fore_window=fore_window,
+        start=start,
     )
 
-    with transaction.atomic():
-        for (prev, cur) in zip(analyzed_series, analyzed_series[1:]):
-            if cur.change_detected:
-                prev_value = cur.historical_stats['avg']
-                new_value = cur.forward_stats['avg']
-                alert_properties = get_alert_properties(
-                    prev_value, new_value, signature.lower_is_better
-                )
 
-                # ignore regressions below the configured regression
-                # threshold
-                if (
-                    (
-                        signature.alert_change_type is None
-                        or signature.alert_change_type == PerformanceSignature.ALERT_PCT
-                    )
-                    and alert_properties.pct_change < alert_threshold
-                ) or (
-                    signature.alert_change_type == PerformanceSignature.ALERT_ABS
-                    and alert_properties.delta < alert_threshold
-                ):
-                    continue
+def _store_alerts(signature, analyzed_series, start, alert_threshold):
+    for (prev, cur) in zip(analyzed_series[start - 1 :], analyzed_series[start:]):
+        if cur.change_detected:
+            prev_value = cur.historical_stats['avg']
+            new_value = cur.forward_stats['avg']
+            alert_properties = get_alert_properties(
+                prev_value, new_value, signature.lower_is_better
+            )
 
-                summary, _ = PerformanceAlertSummary.objects.get_or_create(
-                    repository=signature.repository,
-                    framework=signature.framework,
-                    push_id=cur.push_id,
-                    prev_push_id=prev.push_id,
-                    defaults={
-                        'manually_created': False,
-                        'created': datetime.utcfromtimestamp(cur.push_timestamp),
-                    },
+            # ignore regressions below the configured regression
+            # threshold
+            if (
+                (
+                    signature.alert_change_type is None
+                    or signature.alert_change_type == PerformanceSignature.ALERT_PCT
                 )
+                and alert_properties.pct_change < alert_threshold
+            ) or (
+                signature.alert_change_type == PerformanceSignature.ALERT_ABS
+                and alert_properties.delta < alert_threshold
+            ):
+                continue
 
-                # django/mysql doesn't understand "inf", so just use some
-                # arbitrarily high value for that case
-                t_value = cur.t
-                if t_value == float('inf'):
-                    t_value = 1000
-
-                PerformanceAlert.objects.update_or_create(
-                    summary=summary,
-                    series_signature=signature,
-                    defaults={
-                        'is_regression': alert_properties.is_regression,
-                        'amount_pct': alert_properties.pct_change,
-                        'amount_abs': alert_properties.delta,
-                        'prev_value': prev_value,
-                        'new_value': new_value,
-                        't_value': t_value,
-                    },
-                )
+            summary, _ = PerformanceAlertSummary.objects.get_or_create(
+                repository_id=signature.repository_id,
+                framework_id=signature.framework_id,
+                push_id=cur.push_id,
+                prev_push_id=prev.push_id,
+                defaults={
+                    'manually_created': False,
+                    'created': datetime.utcfromtimestamp(cur.push_timestamp),
+                },
+            )
+
+            # django/mysql doesn't understand "inf", so just use some
+            # arbitrarily high value for that case
+            t_value = cur.t
+            if t_value == float('inf'):
+                t_value = 1000
+
+            PerformanceAlert.objects.update_or_create(
+                summary=summary,
+                series_signature=signature,
+                defaults={
+                    'is_regression': alert_properties.is_regression,
+                    'amount_pct': alert_properties.pct_change,
+                    'amount_abs': alert_properties.delta,
+                    'prev_value': prev_value,
+                    'new_value': new_value,
+                    't_value': t_value,
+                },
+            )
+
+
+def _get_series_state(series_key, last_datum_id, analyzed_revisions, analyzed_series, push_times):
+    """
+    The analysis of the latest revisions of a series to carry on from, which
+    are enough to reanalyze the ones getting new data (mostly new pushes and
+    retriggers of recent ones) on their own.
+    """
+    analyzed_revisions = analyzed_revisions + [
+        (
+            push_times[d.push_id],
+            d.push_id,
+            d.t,
+            d.amount_prev_data,
+            d.amount_next_data,
+            d.last_seen_regression,
+        )
+        for d in analyzed_series
+    ]
+    (_, _, max_back_window, fore_window) = series_key
+    return {
+        'series': series_key,
+        'last_datum_id': last_datum_id,
+        'revisions': analyzed_revisions[-2 * (max_back_window + fore_window) :],
+    }
+
+
+def _get_series_state_timeout():
+    return int(settings.PERFHERDER_ALERTS_MAX_AGE.total_seconds())
+
+
+def _get_revision_data(series):
+    """
+    The `RevisionDatum` of each push in a series, along with their push times
+    and the id of the latest datum among them.
+    """
+    revision_data = {}
+    push_times = {}
+    last_datum_id = 0
+    for d in series:
+        if not revision_data.get(d.push_id):
+            revision_data[d.push_id] = RevisionDatum(
+                int(time.mktime(d.push_timestamp.timetuple())), d.push_id, []
+            )
+            push_times[d.push_id] = d.push_timestamp
+        revision_data[d.push_id].values.append(d.value)
+        last_datum_id = max(last_datum_id, d.id)
+    return list(revision_data.values()), push_times, last_datum_id
+
+
+def _get_resume_window(analyzed_revisions, since, max_back_window, fore_window):
+    """
+    Where to carry on the analysis of a series from, given its analyzed
+    revisions and when the earliest of the data it got since was pushed.
+
+    Returns the index of the first of these revisions whose values are needed,
+    and of the first one to reanalyze; or None if the series has to be
+    analyzed from scratch.
+    """
+    # the first revision with new data, the first one whose forward window
+    # may include it and whether a change is detected at the one before that
+    # depends on, and the first one which the back windows of these may include
+    changed = bisect.bisect_left([r[0] for r in analyzed_revisions], since)
+    start = changed - max(fore_window, 1)
+    first = start - max(max_back_window, 0)
+    if first < 0 or start < 1:
+        return None
+    return first, start
+
+
+def _resume_series_analysis(series, analyzed_revisions, first, start):
+    """
+    Restore the analysis of a series up to the revision at index `start` of
+    its analyzed revisions, given its data since the one at index `first`
+    (see `_get_resume_window`).
+
+    Returns the analyzed revisions to keep, the revisions to pass to
+    `detect_changes` along with their push times, and the index of the first
+    one to analyze; or None if the series has to be analyzed from scratch.
+    """
+    revision_data, push_times, _ = _get_revision_data(series)
+    revision_data.sort()
+    previous = analyzed_revisions[first:start]
+    if [d.push_id for d in revision_data[: len(previous)]] != [r[1] for r in previous]:
+        # some of them are gone or older than the alerts max age by now
+        return None
+
+    for (d, (_, _, t, amount_prev_data, amount_next_data, last_seen_regression)) in zip(
+        revision_data, previous
+    ):
+        d.t = t
+        d.amount_prev_data = amount_prev_data
+        d.amount_next_data = amount_next_data
+        d.last_seen_regression = last_seen_regression
+
+    return analyzed_revisions[:first], revision_data, push_times, start - first
 
 
 class AlertsPicker:
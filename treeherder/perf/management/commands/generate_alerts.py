@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 
 from treeherder.model import models
-from treeherder.perf.alerts import generate_new_alerts_in_series
+from treeherder.perf.alerts import generate_new_alerts_in_signatures
 from treeherder.perf.models import PerformanceSignature
 
 
@@ -23,6 +23,12 @@ class Command(BaseCommand):
             action='append',
             help='Signature hashes to process, defaults to all non-subtests',
         )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Number of processes to detect changes in the series with',
+        )
 
     def handle(self, *args, **options):
         if not options['project']:
@@ -50,5 +56,4 @@ class Command(BaseCommand):
                     if signature.signature_hash not in hashes_to_ignore
                 ]
 
-            for signature in signatures_to_process:
-                generate_new_alerts_in_series(signature)
+            generate_new_alerts_in_signatures(signatures_to_process, processes=options['processes'])
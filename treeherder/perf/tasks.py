@@ -1,12 +1,116 @@
+import logging
+import time
+
 import newrelic.agent
+from celery import task
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
 
-from treeherder.perf.alerts import generate_new_alerts_in_series
+from treeherder.perf.alerts import (
+    ALERTS_BATCH_SIZE,
+    generate_new_alerts_in_series,
+    generate_new_alerts_in_signatures,
+)
 from treeherder.perf.models import PerformanceSignature
 from treeherder.workers.task import retryable_task
 
+logger = logging.getLogger(__name__)
+
+# A sorted set of the ids of the signatures waiting for their alerts to be
+# generated, scored by when they first got new data.
+PENDING_ALERTS_KEY = 'perf-alerts-pending'
+# How many times alerts were requested for a signature already waiting for them.
+COALESCED_ALERTS_KEY = 'perf-alerts-coalesced'
+
 
 @retryable_task(name='generate-alerts', max_retries=10)
 def generate_alerts(signature_id):
     newrelic.agent.add_custom_parameter("signature_id", str(signature_id))
     signature = PerformanceSignature.objects.get(id=signature_id)
     generate_new_alerts_in_series(signature)
+
+
+@retryable_task(name='generate-alerts-in-batch', max_retries=10)
+def generate_alerts_in_batch(signature_ids):
+    newrelic.agent.add_custom_parameter("signatures", len(signature_ids))
+    generate_new_alerts_in_signatures(PerformanceSignature.objects.filter(id__in=signature_ids))
+
+
+def schedule_alerts(signature_ids):
+    """
+    Generate the alerts of signatures which have new data.
+
+    Retriggers and suites with many subtests add data to the same signatures
+    within seconds, so rather than straight away, each signature waits for
+    ``PERFHERDER_ALERTS_SCHEDULING_WINDOW`` seconds to be picked up by
+    ``generate_pending_alerts``, once, however much data it got meanwhile.
+    """
+    if not signature_ids:
+        return
+    if settings.PERFHERDER_ALERTS_SCHEDULING_WINDOW:
+        try:
+            _add_pending_alerts(signature_ids)
+            return
+        except Exception as e:
+            logger.warning("Could not defer the generation of alerts: %s", e)
+
+    for signature_id in signature_ids:
+        generate_alerts.apply_async(args=[signature_id], queue='generate_perf_alerts')
+
+
+def _add_pending_alerts(signature_ids):
+    redis = get_redis_connection()
+    now = time.time()
+    pipeline = redis.pipeline()
+    for signature_id in signature_ids:
+        pipeline.zadd(cache.make_key(PENDING_ALERTS_KEY), {signature_id: now}, nx=True)
+    coalesced = len(signature_ids) - sum(pipeline.execute())
+    if coalesced:
+        redis.incrby(cache.make_key(COALESCED_ALERTS_KEY), coalesced)
+
+
+@task(name='generate-pending-alerts')
+def generate_pending_alerts():
+    """
+    Generate the alerts of the signatures which have been waiting for them
+    for at least ``PERFHERDER_ALERTS_SCHEDULING_WINDOW`` seconds.
+    """
+    cutoff = time.time() - settings.PERFHERDER_ALERTS_SCHEDULING_WINDOW
+    redis = get_redis_connection()
+    pipeline = redis.pipeline()
+    pipeline.zrangebyscore(cache.make_key(PENDING_ALERTS_KEY), '-inf', cutoff, withscores=True)
+    pipeline.zremrangebyscore(cache.make_key(PENDING_ALERTS_KEY), '-inf', cutoff)
+    pipeline.getset(cache.make_key(COALESCED_ALERTS_KEY), 0)
+    pending, _, coalesced = pipeline.execute()
+
+    signature_ids = [int(signature_id) for signature_id, _ in pending]
+    if len(signature_ids) > ALERTS_BATCH_SIZE:
+        # catching up on a backlog, which is quicker done in bulk
+        generations = [
+            (i, generate_alerts_in_batch, signature_ids[i : i + ALERTS_BATCH_SIZE])
+            for i in range(0, len(signature_ids), ALERTS_BATCH_SIZE)
+        ]
+    else:
+        generations = [
+            (i, generate_alerts, signature_id) for i, signature_id in enumerate(signature_ids)
+        ]
+    for i, generate, arg in generations:
+        try:
+            generate.apply_async(args=[arg], queue='generate_perf_alerts')
+        except Exception:
+            # leave the signatures which weren't enqueued for the next run, with
+            # the time they first got new data (rather than only removing each
+            # one once enqueued, which would drop any data it got meanwhile)
+            redis.zadd(cache.make_key(PENDING_ALERTS_KEY), dict(pending[i:]))
+            raise
+
+    # the number of alert generations saved by waiting
+    coalesced = int(coalesced or 0)
+    newrelic.agent.add_custom_parameter("signatures", len(signature_ids))
+    newrelic.agent.record_custom_metric('Custom/Perfherder/CoalescedAlertGenerations', coalesced)
+    logger.info(
+        "Generating alerts for %s signatures, %s duplicate generations saved",
+        len(signature_ids),
+        coalesced,
+    )
@@ -1,5 +1,7 @@
+import bisect
 import copy
 import functools
+import math
 
 
 def analyze(revision_data, weight_fn=None):
@@ -94,9 +96,17 @@ class RevisionDatum:
         # data values associated with this revision
         self.values = copy.copy(values)
 
+        # amounts of data in the windows compared by the t-test
+        self.amount_prev_data = 0
+        self.amount_next_data = 0
+
         # t-test score
         self.t = 0
 
+        # how many revisions in a row, up to this one, had a t-test score
+        # below the threshold
+        self.last_seen_regression = 0
+
         # Whether a perf regression or improvement was found
         self.change_detected = False
 
@@ -117,13 +127,171 @@ class RevisionDatum:
         )
 
 
-def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7):
+class _SeriesSums:
+    """
+    Prefix sums over the values of a sorted series of `RevisionDatum`, from
+    which `analyze` and `calc_t` can be computed for any range of it in
+    constant time.
+
+    The values are scaled to integers by the largest of their (power of two)
+    denominators, so that the sums are exact and only the final divisions are
+    rounded.
+    """
+
+    def __init__(self, data):
+        ratios = [[float(value).as_integer_ratio() for value in datum.values] for datum in data]
+        self.shift = max(
+            (denominator.bit_length() - 1 for revision in ratios for _, denominator in revision),
+            default=0,
+        )
+
+        # the number of values, their sum and sum of squares, and the former
+        # two multiplied by the index of their revision
+        self.counts = [0]
+        self.sums = [0]
+        self.squares = [0]
+        self.index_counts = [0]
+        self.index_sums = [0]
+        for index, revision in enumerate(ratios):
+            scaled = [
+                numerator << (self.shift - denominator.bit_length() + 1)
+                for numerator, denominator in revision
+            ]
+            revision_sum = sum(scaled)
+            self.counts.append(self.counts[-1] + len(scaled))
+            self.sums.append(self.sums[-1] + revision_sum)
+            self.squares.append(self.squares[-1] + sum(value * value for value in scaled))
+            self.index_counts.append(self.index_counts[-1] + index * len(scaled))
+            self.index_sums.append(self.index_sums[-1] + index * revision_sum)
+
+    def analyze(self, start, end, a=1, b=0):
+        """
+        The same as `analyze(data[start:end], weight_fn)`, for a `weight_fn`
+        weighting the revision at index r proportionally to `a + b * r`.
+        """
+        n = self.counts[end] - self.counts[start]
+        if n == 0:
+            return {"avg": 0.0, "n": 0, "variance": 0.0}
+
+        total = self.sums[end] - self.sums[start]
+        weighted_sum = a * total + b * (self.index_sums[end] - self.index_sums[start])
+        sum_of_weights = a * n + b * (self.index_counts[end] - self.index_counts[start])
+        avg = weighted_sum / (sum_of_weights << self.shift)
+
+        variance = 0.0
+        if n > 1:
+            # sum((value - avg) ** 2), for avg = p / q
+            p, q = avg.as_integer_ratio()
+            squared_deviations = (
+                q * q * (self.squares[end] - self.squares[start])
+                - ((2 * p * q * total) << self.shift)
+                + ((n * p * p) << (2 * self.shift))
+            )
+            variance = squared_deviations / ((q * q * (n - 1)) << (2 * self.shift))
+
+        return {"avg": avg, "n": n, "variance": variance}
+
+    def calc_t(self, back_start, index, fore_end):
+        """
+        The same as `calc_t(data[back_start:index][::-1], data[index:fore_end],
+        linear_weights)`, ie with the weights decreasing away from `index`.
+        """
+        if back_start == index or fore_end == index:
+            return 0
+
+        s1 = self.analyze(back_start, index, 1 - back_start, 1)
+        s2 = self.analyze(index, fore_end, fore_end, -1)
+        delta_s = s2['avg'] - s1['avg']
+
+        if delta_s == 0:
+            return 0
+        if s1['variance'] == 0 and s2['variance'] == 0:
+            return float('inf')
+
+        return delta_s / (((s1['variance'] / s1['n']) + (s2['variance'] / s2['n'])) ** 0.5)
+
+
+def detect_changes(
+    data, min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7, start=1
+):
+    """
+    Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k].
+
+    Only the revisions from `start` on are analyzed, so that a series can be
+    analyzed as it grows: the ones before are expected to have been analyzed
+    already (as far as their t-test score, amounts of data and
+    `last_seen_regression` go), and are only used for their values.
+
+    This computes the statistics of each window from prefix sums over the
+    whole series rather than from the values in it, which gives the same
+    t-test scores as analyzing each window's values up to floating point
+    rounding.  Its results intentionally differ from the latter's in that:
+
+    * the sums are exact, so windows whose values are all the same get a
+      t-test score of 0 (or inf against another such window), where the
+      values may get an arbitrary score from rounding errors;
+    * windows of revisions without any values are given an average and a
+      variance of 0, where analyzing their values raises a ZeroDivisionError;
+    * scores are rounded differently, so neighbours whose scores are equal (or
+      scores equal to the threshold) may be compared differently.
+    """
+    data = sorted(data)
+    if not all(math.isfinite(value) for datum in data for value in datum.values):
+        return _detect_changes_in_values(
+            data, min_back_window, max_back_window, fore_window, t_threshold, start
+        )
+
+    sums = _SeriesSums(data)
+    counts = sums.counts
+    last_seen_regression = data[start - 1].last_seen_regression if start < len(data) else 0
+    for i in range(start, len(data)):
+        di = data[i]
+
+        # go back over previous data until we've either got at least
+        # max_back_window data points *or* we've hit the back window, which
+        # grows while we haven't detected a likely regression
+        back_window = min(max(last_seen_regression, min_back_window), max_back_window)
+        back_start = max(
+            min(i, max(i - back_window, 0)),
+            # the last revision before which there are max_back_window points
+            bisect.bisect_right(counts, counts[i] - max_back_window, 0, i) - 1,
+        )
+
+        # accumulate present + future data until we've got at least
+        # fore_window values
+        fore_end = i
+        if fore_window > 0:
+            fore_end = min(bisect.bisect_left(counts, counts[i] + fore_window, i + 1), len(data))
+
+        di.amount_prev_data = counts[i] - counts[back_start]
+        di.amount_next_data = counts[fore_end] - counts[i]
+        di.historical_stats = sums.analyze(back_start, i)
+        di.forward_stats = sums.analyze(i, fore_end)
+
+        di.t = abs(sums.calc_t(back_start, i, fore_end))
+        if di.t > t_threshold:
+            last_seen_regression = 0
+        else:
+            last_seen_regression += 1
+        di.last_seen_regression = last_seen_regression
+
+    _mark_changes(data, min_back_window, fore_window, t_threshold)
+    return data
+
+
+def _detect_changes_in_values(
+    data, min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7, start=1
+):
+    """
+    The same as `detect_changes`, analyzing each window from its values, for
+    series with non-finite values which can't be summed exactly.
+    """
     # Use T-Tests
     # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
     data = sorted(data)
 
-    last_seen_regression = 0
-    for i in range(1, len(data)):
+    last_seen_regression = data[start - 1].last_seen_regression if start < len(data) else 0
+    for i in range(start, len(data)):
         di = data[i]
 
         # keep on getting previous data until we've either got at least 12
@@ -162,7 +330,13 @@ def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12,
             last_seen_regression = 0
         else:
             last_seen_regression += 1
+        di.last_seen_regression = last_seen_regression
 
+    _mark_changes(data, min_back_window, fore_window, t_threshold)
+    return data
+
+
+def _mark_changes(data, min_back_window, fore_window, t_threshold):
     # Now that the t-test scores are calculated, go back through the data to
     # find where changes most likely happened.
     for i in range(1, len(data)):
@@ -189,5 +363,3 @@ def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12,
         # This datapoint has a t value higher than the threshold and higher
         # than either neighbor.  Mark it as the cause of a regression.
         di.change_detected = True
-
-    return data
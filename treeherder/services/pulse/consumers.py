@@ -1,14 +1,19 @@
+import asyncio
+import functools
 import logging
 import threading
 import socket
+import time
 
 import environ
 import newrelic.agent
 from django.conf import settings
-from kombu import Connection, Exchange, Queue
+from kombu import Connection, Consumer, Exchange, Queue
+from kombu.exceptions import OperationalError
 from kombu.mixins import ConsumerMixin
 
-from treeherder.etl.tasks.pulse_tasks import store_pulse_pushes, store_pulse_tasks
+from treeherder.etl.tasks.pulse_tasks import store_pulse_pushes, store_pulse_tasks_batch
+from treeherder.services import queue_depth
 from treeherder.utils.http import fetch_json
 
 from .exchange import get_exchange
@@ -38,6 +43,10 @@ HGMO_PUSH_BINDINGS = [
     "exchange/hgpushes/v1.#",
 ]
 
+# How long `AsyncConsumers` wait for more messages once they have handled those
+# which had arrived.
+DRAIN_EVENTS_TIMEOUT = 0.1
+
 
 class PulseConsumer(ConsumerMixin):
     """
@@ -52,10 +61,26 @@ class PulseConsumer(ConsumerMixin):
         self.root_url = source['root_url']
         self.source = source
         self.build_routing_key = build_routing_key
+        # task messages waiting to be passed on as a batch, and when the first arrived
+        self.task_messages = []
+        self.task_messages_since = None
+        # set while the workers are behind, to hold on to the task messages
+        self.paused = False
 
     def get_consumers(self, Consumer, channel):
+        if settings.PULSE_ASYNC_CONSUMERS or (
+            self.batches_task_messages() and settings.PULSE_TASKS_BATCH_SIZE > 1
+        ):
+            # Pulse stops delivering once this many messages are unacknowledged
+            return [
+                Consumer(prefetch_count=settings.PULSE_PREFETCH_COUNT, **c) for c in self.consumers
+            ]
         return [Consumer(**c) for c in self.consumers]
 
+    def batches_task_messages(self):
+        """Whether task messages are received, to be acknowledged a batch at a time."""
+        return False
+
     def bindings(self):
         """Get the bindings for this consumer, each of the form `<exchange>.<routing_keys>`,
         with `<routing_keys>` being `:`-separated."""
@@ -109,6 +134,94 @@ class PulseConsumer(ConsumerMixin):
     def close(self):
         self.connection.release()
 
+    def store_task_message(self, body, message):
+        """Queue up a Taskcluster task message to be stored as part of a batch."""
+        if not self.task_messages:
+            self.task_messages_since = time.monotonic()
+        self.task_messages.append((body, message))
+        if len(self.task_messages) >= settings.PULSE_TASKS_BATCH_SIZE:
+            self.check_backpressure()
+            if not self.paused:
+                self.flush_task_messages()
+
+    def flush_task_messages(self):
+        """
+        Pass the queued task messages on to the workers, in batches.
+
+        The messages are only acknowledged once their batch has been handed
+        over, so that Pulse redelivers them should the listener go away before
+        then. Acknowledging the last message of a batch acknowledges all of it.
+        """
+        while self.task_messages:
+            batch = self.task_messages[: settings.PULSE_TASKS_BATCH_SIZE]
+            store_pulse_tasks_batch.apply_async(
+                args=[
+                    [
+                        [
+                            body,
+                            message.delivery_info['exchange'],
+                            message.delivery_info['routing_key'],
+                        ]
+                        for (body, message) in batch
+                    ],
+                    self.root_url,
+                ],
+                queue='store_pulse_tasks',
+            )
+            batch[-1][1].ack(multiple=True)
+            del self.task_messages[: len(batch)]
+
+    def on_iteration(self):
+        # called by ConsumerMixin after each message, or every second when idle
+        if self.task_messages:
+            self.check_backpressure()
+        if (
+            self.task_messages
+            and not self.paused
+            and time.monotonic() - self.task_messages_since >= settings.PULSE_TASKS_BATCH_INTERVAL
+        ):
+            self.flush_task_messages()
+
+    def check_backpressure(self):
+        """
+        Hold on to the task messages while too many are waiting to be stored.
+
+        Pulse stops delivering once ``PULSE_PREFETCH_COUNT`` of them are
+        unacknowledged, so the backlog stays on Pulse rather than moving to
+        our broker.
+        """
+        paused = queue_depth.is_overloaded(
+            'store_pulse_tasks', settings.PULSE_BACKPRESSURE_QUEUE_DEPTH
+        )
+        if paused != self.paused:
+            logger.warning(
+                "%s passing task messages on, %s messages are waiting to be stored",
+                "Stopped" if paused else "Resumed",
+                queue_depth.get_queue_depth('store_pulse_tasks'),
+            )
+        self.paused = paused
+
+    def on_consume_end(self, connection, channel):
+        self.flush_task_messages()
+
+    def on_connection_revived(self):
+        # called on connecting, including after the connection was lost
+        self.drop_task_messages()
+
+    def on_connection_error(self, exc, interval):
+        super().on_connection_error(exc, interval)
+        self.drop_task_messages()
+
+    def drop_task_messages(self):
+        """
+        Forget the task messages of a lost connection.
+
+        They can't be acknowledged on its channel any more, and Pulse delivers
+        them again anyway.
+        """
+        self.task_messages = []
+        self.task_messages_since = None
+
     def prune_bindings(self, new_bindings):
         # get the existing bindings for the queue
         bindings = []
@@ -148,15 +261,15 @@ class TaskConsumer(PulseConsumer):
     def bindings(self):
         return TASKCLUSTER_TASK_BINDINGS
 
+    def batches_task_messages(self):
+        return True
+
     @newrelic.agent.background_task(name='pulse-listener-tasks.on_message', group='Pulse Listener')
     def on_message(self, body, message):
         exchange = message.delivery_info['exchange']
         routing_key = message.delivery_info['routing_key']
         logger.debug('received job message from %s#%s', exchange, routing_key)
-        store_pulse_tasks.apply_async(
-            args=[body, exchange, routing_key, self.root_url], queue='store_pulse_tasks'
-        )
-        message.ack()
+        self.store_task_message(body, message)
 
 
 class PushConsumer(PulseConsumer):
@@ -201,20 +314,21 @@ class JointConsumer(PulseConsumer):
             rv += TASKCLUSTER_TASK_BINDINGS
         return rv
 
+    def batches_task_messages(self):
+        return bool(self.source.get('tasks'))
+
     @newrelic.agent.background_task(name='pulse-joint-listener.on_message', group='Pulse Listener')
     def on_message(self, body, message):
         exchange = message.delivery_info['exchange']
         routing_key = message.delivery_info['routing_key']
         logger.debug('received job message from %s#%s', exchange, routing_key)
         if exchange.startswith('exchange/taskcluster-queue/v1/'):
-            store_pulse_tasks.apply_async(
-                args=[body, exchange, routing_key, self.root_url], queue='store_pulse_tasks'
-            )
+            self.store_task_message(body, message)
         else:
             store_pulse_pushes.apply_async(
                 args=[body, exchange, routing_key, self.root_url], queue='store_pulse_pushes'
             )
-        message.ack()
+            message.ack()
 
 
 class Consumers:
@@ -233,8 +347,101 @@ class Consumers:
             t.join()
 
 
+class AsyncConsumers:
+    """
+    Run a collection of consumers on a single asyncio event loop.
+
+    This is an alternative to ``Consumers``, which runs each consumer in its
+    own thread.  The connection of each consumer is read from whenever its
+    socket is readable, and at least every second to send heartbeats and pass
+    on the task messages that are waiting to be.
+    """
+
+    def __init__(self, consumers):
+        self.consumers = consumers
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(
+                asyncio.gather(*[self.consume(consumer) for consumer in self.consumers])
+            )
+        finally:
+            loop.close()
+
+    async def consume(self, consumer):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, consumer.prepare)
+        while True:
+            try:
+                await self.consume_connection(consumer)
+            except (OperationalError,) + tuple(consumer.connection.connection_errors) as e:
+                logger.warning("Connection to Pulse lost, reconnecting: %s", e)
+                consumer.drop_task_messages()
+                await asyncio.sleep(1)
+
+    async def consume_connection(self, consumer):
+        """
+        Consume from the connection of ``consumer`` until it is lost.
+
+        Everything that talks to a broker or to Redis blocks, so it is run in
+        the default executor, one call at a time for each connection.
+        """
+        loop = asyncio.get_event_loop()
+        connection = consumer.connection
+        await loop.run_in_executor(
+            None, functools.partial(connection.ensure_connection, max_retries=3)
+        )
+        channel = await loop.run_in_executor(None, connection.channel)
+        # the kombu consumers declare their queues as they are created
+        kombu_consumers = await loop.run_in_executor(
+            None, consumer.get_consumers, partial_consumer(channel), channel
+        )
+        for kombu_consumer in kombu_consumers:
+            await loop.run_in_executor(None, kombu_consumer.consume)
+
+        sock = connection.connection.sock
+        readable = asyncio.Event()
+        loop.add_reader(sock, readable.set)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(readable.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                readable.clear()
+                await loop.run_in_executor(None, self.iterate, consumer)
+        finally:
+            loop.remove_reader(sock)
+            connection.collect()
+
+    def iterate(self, consumer):
+        """Handle the messages which have arrived, and pass on the task messages"""
+        connection = consumer.connection
+        self.drain_events(connection)
+        connection.heartbeat_check()
+        consumer.on_iteration()
+
+    def drain_events(self, connection):
+        """Handle all the messages which have arrived, waiting briefly for more"""
+        while True:
+            try:
+                connection.drain_events(timeout=DRAIN_EVENTS_TIMEOUT)
+            except socket.timeout:
+                return
+
+
+def partial_consumer(channel):
+    """Bind kombu Consumers to a channel, as ConsumerMixin does"""
+
+    def _consumer(**kwargs):
+        return Consumer(channel, **kwargs)
+
+    return _consumer
+
+
 def prepare_consumers(consumer_cls, sources, build_routing_key=None):
-    return Consumers([consumer_cls(source, build_routing_key) for source in sources])
+    return get_consumers_class()([consumer_cls(source, build_routing_key) for source in sources])
 
 
 def prepare_joint_consumers(listening_params):
@@ -242,4 +449,10 @@ def prepare_joint_consumers(listening_params):
         return x, y, z
 
     consumer_class, sources, keys = unpacker(*listening_params)
-    return Consumers([consumer_class(source, key) for source, key in zip(sources, keys)])
+    return get_consumers_class()(
+        [consumer_class(source, key) for source, key in zip(sources, keys)]
+    )
+
+
+def get_consumers_class():
+    return AsyncConsumers if settings.PULSE_ASYNC_CONSUMERS else Consumers
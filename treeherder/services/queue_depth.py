@@ -0,0 +1,71 @@
+import logging
+
+import newrelic.agent
+from django.conf import settings
+from django.core.cache import cache
+
+from treeherder import celery_app
+
+logger = logging.getLogger(__name__)
+
+# The depths of all the queues are fetched from the broker together, and
+# shared by every process through the cache for this many seconds.
+QUEUE_DEPTHS_CACHE_KEY = 'celery-queue-depths'
+QUEUE_DEPTHS_CACHE_TIMEOUT = 10
+
+
+def get_queue_depths():
+    """
+    The number of messages waiting in each of the queues of the Celery broker.
+
+    Queues whose depth couldn't be fetched are left out, so callers should
+    treat a missing queue as not being behind.
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        # tasks run straight away, so nothing is ever waiting
+        return {}
+
+    try:
+        depths = cache.get(QUEUE_DEPTHS_CACHE_KEY)
+        if depths is None:
+            depths = fetch_queue_depths([queue.name for queue in settings.CELERY_TASK_QUEUES])
+            cache.set(QUEUE_DEPTHS_CACHE_KEY, depths, QUEUE_DEPTHS_CACHE_TIMEOUT)
+            for queue_name, depth in depths.items():
+                newrelic.agent.record_custom_metric(
+                    'Custom/Celery/QueueDepth/%s' % queue_name, depth
+                )
+    except Exception as e:
+        # throttling ingestion isn't worth failing it over
+        logger.warning("Could not get the depths of the Celery queues: %s", e)
+        return {}
+    return depths
+
+
+def get_queue_depth(queue_name):
+    return get_queue_depths().get(queue_name)
+
+
+def is_overloaded(queue_name, limit):
+    """Whether more than `limit` messages are waiting in a queue of the Celery broker"""
+    depth = get_queue_depth(queue_name)
+    return depth is not None and depth > limit
+
+
+def fetch_queue_depths(queue_names):
+    depths = {}
+    try:
+        with celery_app.connection_for_read() as connection:
+            channel = connection.channel()
+            for queue_name in queue_names:
+                try:
+                    depths[queue_name] = channel.queue_declare(
+                        queue=queue_name, passive=True
+                    ).message_count
+                except connection.channel_errors as e:
+                    # the queue doesn't exist (yet), which closes the channel
+                    logger.warning("Could not get the depth of the %s queue: %s", queue_name, e)
+                    channel = connection.channel()
+            channel.close()
+    except Exception as e:
+        logger.warning("Could not get the depths of the Celery queues: %s", e)
+    return depths
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread-safe, process-local LRU cache whose entries expire after `ttl` seconds.
+
+    Meant for small and rarely changing lookups (eg reference data) where even
+    a round trip to the shared cache would cost more than the lookup itself.
+
+    Usage:
+
+        >>> cache = LRUCache(maxsize=2, ttl=60)
+        >>> cache.get_or_set('foo', lambda: 'bar')
+        'bar'
+        >>> cache.get('foo')
+        'bar'
+
+    """
+
+    def __init__(self, maxsize, ttl, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                return default
+            if expires <= self.timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self.timer() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, default):
+        """
+        Return the value cached for `key`, calling `default()` to compute and
+        cache it on a miss.
+
+        `default` is called without holding the lock, so concurrent misses for
+        the same key may each compute it; it must therefore be idempotent.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default()
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -73,6 +73,7 @@ class ActionBar extends React.PureComponent {
         notify('Log parsing has failed, log viewer is unavailable', 'warning');
         break;
       case 'skipped-size':
+      case 'skipped-load':
         notify('Log parsing was skipped, log viewer is unavailable', 'warning');
         break;
       case 'unavailable':
@@ -33,6 +33,7 @@ function getLogUrlProps(logKey, logUrl, logViewerUrl, logViewerFullUrl) {
         title: 'Log parsing has failed',
       };
     case 'skipped-size':
+    case 'skipped-load':
       return {
         className: 'disabled',
         title: 'Log parsing was skipped',
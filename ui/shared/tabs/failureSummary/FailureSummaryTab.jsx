@@ -227,6 +227,10 @@ class FailureSummaryTab extends React.Component {
             <ListItem text="Log parsing was skipped since the log exceeds the size limit." />
           )}
 
+          {!bugSuggestionsLoading && logParseStatus === 'skipped-load' && (
+            <ListItem text="Log parsing was skipped since the log parsers were overloaded." />
+          )}
+
           {!bugSuggestionsLoading && !logs.length && (
             <ListItem
               text={`No logs yet available for this ${getResultState(